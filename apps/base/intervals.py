@@ -0,0 +1,163 @@
+from bisect import bisect_left, bisect_right
+import datetime
+from operator import attrgetter, itemgetter
+
+from pytz import utc
+
+# конец незаконченного периода
+MAX_DATETIME = datetime.datetime.max.replace(tzinfo=utc)
+
+
+class IntervalIndex(object):
+    """
+    Индекс интервалов для поиска интервалов, содержащих момент времени или пересекающихся
+    с периодом, за O(log n + k). Интервалы возвращаются в порядке списка, то есть так же,
+    как при линейном переборе (границы включаются).
+    Интервалы должны быть упорядочены по началу, иначе поиск выполняется перебором
+    """
+
+    def __init__(self, items, start=itemgetter('time_in'), end=itemgetter('time_out')):
+        self.items = list(items)
+        self.starts = [start(x) for x in self.items]
+        self.ends = [end(x) for x in self.items]
+        self.is_sorted = all(a <= b for a, b in zip(self.starts, self.starts[1:]))
+
+        # максимум концов на префиксе не убывает, поэтому первый интервал,
+        # заканчивающийся не раньше момента, ищется бинарным поиском
+        self.max_ends = []
+        max_end = None
+        for x in self.ends:
+            max_end = x if max_end is None or x > max_end else max_end
+            self.max_ends.append(max_end)
+
+    def get_candidates(self, dt_from, dt_to):
+        """Индексы интервалов, которые могут пересекаться с периодом"""
+        if not self.is_sorted:
+            return range(len(self.items))
+        return range(bisect_left(self.max_ends, dt_from), bisect_right(self.starts, dt_to))
+
+    def find(self, moment, default=None):
+        """Первый интервал, содержащий момент"""
+        for i in self.get_candidates(moment, moment):
+            if self.starts[i] <= moment <= self.ends[i]:
+                return self.items[i]
+        return default
+
+    def find_all(self, moment):
+        """Все интервалы, содержащие момент"""
+        return [
+            self.items[i] for i in self.get_candidates(moment, moment)
+            if self.starts[i] <= moment <= self.ends[i]
+        ]
+
+    def overlaps(self, dt_from, dt_to, strict=False):
+        """
+        Интервалы, пересекающиеся с периодом, и границы пересечения: (интервал, начало, конец).
+        :param strict: пропускать пересечения нулевой длины (касание границами)
+        """
+        for i in self.get_candidates(dt_from, dt_to):
+            start, end = max(dt_from, self.starts[i]), min(dt_to, self.ends[i])
+            if start < end or (not strict and start == end):
+                yield self.items[i], start, end
+
+
+def join_periods(sources, index, get_period, strict=True):
+    """
+    Соединение периодов источника с интервалами индекса.
+    :param get_period: функция, возвращающая (начало, конец) строки источника
+    :return: генератор (строка источника, интервал, начало пересечения, конец пересечения)
+    """
+    for row in sources:
+        dt_from, dt_to = get_period(row)
+        for item, start, end in index.overlaps(dt_from, dt_to, strict=strict):
+            yield row, item, start, end
+
+
+def join_moments(sources, index, get_moment, first_only=True):
+    """
+    Соединение моментов источника с содержащими их интервалами индекса.
+    :param first_only: момент относится только к первому подходящему интервалу
+    :return: генератор (строка источника, интервал)
+    """
+    for row in sources:
+        moment = get_moment(row)
+        if first_only:
+            item = index.find(moment)
+            if item is not None:
+                yield row, item
+        else:
+            for item in index.find_all(moment):
+                yield row, item
+
+
+class IntervalSet(object):
+    """
+    Множество непересекающихся интервалов в виде параллельных массивов начал и концов,
+    упорядоченных по времени. Пересекающиеся и смежные интервалы при создании сливаются,
+    пустые отбрасываются. Операции над множествами выполняются одним проходом
+    """
+
+    def __init__(self, intervals=()):
+        self.starts, self.ends = [], []
+        for start, end in sorted(x for x in intervals if x[0] < x[1]):
+            if self.ends and start <= self.ends[-1]:
+                if end > self.ends[-1]:
+                    self.ends[-1] = end
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    @classmethod
+    def from_objects(cls, objects, start=attrgetter('dt_from'), end=attrgetter('dt_to')):
+        return cls((start(x), end(x)) for x in objects)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __repr__(self):
+        return 'IntervalSet(%s)' % list(self)
+
+    def union(self, other):
+        return IntervalSet(list(self) + list(other))
+
+    def intersection(self, other):
+        result, i, j = IntervalSet(), 0, 0
+        while i < len(self.starts) and j < len(other.starts):
+            start = max(self.starts[i], other.starts[j])
+            end = min(self.ends[i], other.ends[j])
+            if start < end:
+                result.starts.append(start)
+                result.ends.append(end)
+
+            if self.ends[i] < other.ends[j]:
+                i += 1
+            else:
+                j += 1
+        return result
+
+    def difference(self, other):
+        result, j = IntervalSet(), 0
+        for start, end in self:
+            # пропускаем вычитаемые интервалы, закончившиеся до начала текущего
+            while j < len(other.starts) and other.ends[j] <= start:
+                j += 1
+
+            k = j
+            while k < len(other.starts) and other.starts[k] < end:
+                if other.starts[k] > start:
+                    result.starts.append(start)
+                    result.ends.append(other.starts[k])
+                start = max(start, other.ends[k])
+                k += 1
+
+            if start < end:
+                result.starts.append(start)
+                result.ends.append(end)
+        return result
+
+    def total_seconds(self):
+        """Суммарная продолжительность интервалов (для интервалов datetime)"""
+        return sum((end - start).total_seconds() for start, end in self)
@@ -0,0 +1,42 @@
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+
+class TimeSeries(object):
+    """
+    Временной ряд значений датчика (например, уровня топлива) в виде параллельных
+    отсортированных массивов моментов и значений. Поиск по моменту - бинарный.
+    Моменты могут быть как timestamp, так и datetime
+    """
+
+    def __init__(self, items=()):
+        items = sorted(items, key=itemgetter(0))
+        self.times = [x[0] for x in items]
+        self.values = [x[1] for x in items]
+
+    def __len__(self):
+        return len(self.times)
+
+    def get(self, moment, default=.0, interpolate=False):
+        """
+        Значение на момент времени.
+        Без интерполяции берется первое значение не раньше момента (после конца ряда -
+        последнее известное), с интерполяцией - линейно между соседними значениями
+        """
+        if not self.times:
+            return default
+
+        i = bisect_left(self.times, moment)
+        if i == len(self.times):
+            return self.values[-1]
+
+        if not interpolate or i == 0 or self.times[i] == moment:
+            return self.values[i]
+
+        t0, t1 = self.times[i - 1], self.times[i]
+        v0, v1 = self.values[i - 1], self.values[i]
+        return v0 + (v1 - v0) * ((moment - t0) / (t1 - t0))
+
+    def get_range(self, dt_from, dt_to):
+        """Границы среза [start, end) значений, попадающих в интервал (включительно)"""
+        return bisect_left(self.times, dt_from), bisect_right(self.times, dt_to)
@@ -0,0 +1,46 @@
+from django.test import SimpleTestCase
+
+from base.track import Track
+
+
+class TrackTestCase(SimpleTestCase):
+    """Накопленный пробег трека и пробег за интервал"""
+
+    def setUp(self):
+        self.messages = [
+            {'t': 100, 'pos': {'x': 39.60, 'y': 52.60}},
+            {'t': 110, 'pos': {'x': 39.61, 'y': 52.60}},
+            {'t': 120, 'pos': None},
+            {'t': 130, 'pos': {'x': 39.62, 'y': 52.61}},
+            {'t': 140, 'pos': {'x': 39.63, 'y': 52.61}},
+        ]
+        self.track = Track(self.messages)
+
+    def test_odometers(self):
+        self.assertEqual(len(self.track), 5)
+        self.assertEqual(self.track.odometers[0], .0)
+        # отрезки до и после точки без координат не учитываются
+        self.assertIn(2, self.track.errors)
+        self.assertIn(3, self.track.errors)
+        self.assertEqual(self.track.distances[1:3], [.0, .0])
+        self.assertAlmostEqual(self.track.distances[0], .675, places=3)
+
+    def test_get_distance(self):
+        for start in range(len(self.track)):
+            for end in range(start, len(self.track)):
+                self.assertAlmostEqual(
+                    self.track.get_distance(start, end), sum(self.track.distances[start:end])
+                )
+
+        self.assertEqual(self.track.get_distance(3, 1), .0)
+
+    def test_get_range(self):
+        # границы интервала включаются
+        self.assertEqual(self.track.get_range(110, 130), (1, 4))
+        self.assertEqual(self.track.get_range(111, 129), (2, 3))
+        self.assertEqual(self.track.get_range(0, 50), (0, 0))
+
+        start, end = self.track.get_range(100, 140)
+        self.assertAlmostEqual(
+            self.track.get_distance(start, end - 1), sum(self.track.distances)
+        )
@@ -0,0 +1,223 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger('timing')
+
+_local = threading.local()
+
+
+class Span(object):
+    """Фаза выполнения: время и счетчики (вызовы Wialon, строки, байты и т.п.)"""
+    __slots__ = ('name', 'parent', 'tags', 'counters', 'started', 'duration')
+
+    def __init__(self, name, parent=None, **tags):
+        self.name = name
+        self.parent = parent
+        self.tags = tags
+        self.counters = {}
+        self.started = time.perf_counter()
+        self.duration = .0
+
+    def add(self, **counters):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def as_dict(self):
+        data = OrderedDict([
+            ('event', 'span'),
+            ('span', self.name),
+            ('parent', self.parent),
+            ('ms', round(self.duration * 1000, 2))
+        ])
+        data.update(self.tags)
+        data.update(self.counters)
+        return data
+
+
+class Profiler(object):
+    """
+    Замеры фаз отчета или запроса.
+    Каждая законченная фаза пишется в журнал timing строкой JSON, по завершении
+    пишется сводная запись: суммарное время и счетчики по фазам.
+    Счетчики (count) относятся к текущей фазе потока, в котором они посчитаны.
+    Выключенный профайлер ничего не замеряет, поэтому его можно вызывать безусловно
+    """
+
+    def __init__(self, name, enabled=True, **tags):
+        self.name = name
+        self.enabled = enabled
+        self.tags = tags
+        self.started = time.perf_counter()
+        self.phases = OrderedDict()
+        self.counters = {}
+        self.finished = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get_stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def make_span(self, name, **tags):
+        stack = self.get_stack()
+        return Span(name, stack[-1].name if stack else None, **tags)
+
+    @contextmanager
+    def activate(self):
+        """Делает профайлер текущим для потока (см. get_profiler)"""
+        previous = getattr(_local, 'profiler', None)
+        _local.profiler = self
+        try:
+            yield self
+        finally:
+            _local.profiler = previous
+
+    @contextmanager
+    def span(self, name, log=True, **tags):
+        """
+        Замер фазы.
+        :param log: писать фазу в журнал отдельной строкой (иначе только в сводную запись)
+        """
+        if not self.enabled:
+            yield Span(name)
+            return
+
+        span = self.make_span(name, **tags)
+        stack = self.get_stack()
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+            span.duration = time.perf_counter() - span.started
+            self.record(span, log=log)
+
+    def iterate(self, name, iterable, log=True, **tags):
+        """
+        Перебор, в котором время получения элементов (например, страниц строк Wialon)
+        замеряется отдельной фазой, а обработка элементов в нее не входит
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+
+        span = self.make_span(name, **tags)
+        stack = self.get_stack()
+        iterator = iter(iterable)
+        try:
+            while True:
+                started = time.perf_counter()
+                stack.append(span)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    stack.pop()
+                    span.duration += time.perf_counter() - started
+
+                span.add(items=1)
+                yield item
+        finally:
+            self.record(span, log=log)
+
+    def count(self, **counters):
+        """Увеличивает счетчики текущей фазы потока"""
+        if not self.enabled:
+            return
+
+        stack = self.get_stack()
+        if stack:
+            stack[-1].add(**counters)
+        else:
+            with self.lock:
+                for key, value in counters.items():
+                    self.counters[key] = self.counters.get(key, 0) + value
+
+    def record(self, span, log=True):
+        with self.lock:
+            phase = self.phases.get(span.name)
+            if phase is None:
+                phase = self.phases[span.name] = OrderedDict([('count', 0), ('ms', .0)])
+            phase['count'] += 1
+            phase['ms'] += span.duration * 1000
+            for key, value in span.counters.items():
+                phase[key] = phase.get(key, 0) + value
+                self.counters[key] = self.counters.get(key, 0) + value
+
+        if log:
+            self.log(span.as_dict())
+
+    def log(self, data):
+        record = OrderedDict([('report', self.name)])
+        record.update(data)
+        record.update(self.tags)
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    def get_summary(self):
+        """Сводная запись: общее время, время и счетчики по фазам"""
+        with self.lock:
+            phases = OrderedDict(
+                (name, dict(phase, ms=round(phase['ms'], 2)))
+                for name, phase in self.phases.items()
+            )
+            counters = dict(self.counters)
+
+        return OrderedDict([
+            ('event', 'summary'),
+            ('ms', round((time.perf_counter() - self.started) * 1000, 2)),
+            ('phases', phases),
+            ('counters', counters)
+        ])
+
+    def finish(self):
+        if not self.enabled or self.finished:
+            return
+        self.finished = True
+        self.log(self.get_summary())
+
+
+# выключенный профайлер по умолчанию, когда замеры не запрошены
+DISABLED_PROFILER = Profiler('', enabled=False)
+
+
+def get_profiler():
+    """Текущий профайлер потока"""
+    return getattr(_local, 'profiler', None) or DISABLED_PROFILER
+
+
+def count(**counters):
+    get_profiler().count(**counters)
+
+
+def is_timing_requested(request):
+    if settings.TIMING_ENABLED:
+        return True
+
+    param = settings.TIMING_REQUEST_PARAM
+    if not param:
+        return False
+
+    header = 'HTTP_X_%s' % param.upper().replace('-', '_')
+    return bool(request.GET.get(param) or request.META.get(header))
+
+
+def get_request_profiler(request, name):
+    """Профайлер запроса: включается настройкой TIMING_ENABLED или параметром запроса"""
+    if not is_timing_requested(request):
+        return DISABLED_PROFILER
+
+    user = getattr(request, 'user', None)
+    return Profiler(
+        name,
+        path=request.path_info,
+        user=str(user) if user is not None and user.is_authenticated else None
+    )
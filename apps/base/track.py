@@ -0,0 +1,71 @@
+from bisect import bisect_left, bisect_right
+from math import sin, cos, sqrt, atan2, radians
+
+# approximate radius of earth in km
+EARTH_RADIUS = 6371.0
+
+POINT_ERRORS = (ValueError, IndexError, KeyError, AttributeError, TypeError)
+
+
+class Track(object):
+    """
+    Трек объекта по сообщениям Wialon.
+    Координаты переводятся в радианы один раз на точку, расстояния между соседними
+    точками (по формуле гаверсинусов) и накопленный пробег считаются за один проход.
+    Пробег за интервал (визит, участок маршрута) - разность накопленного пробега,
+    без повторного обхода сообщений
+    """
+
+    def __init__(self, messages):
+        self.times = [x['t'] for x in messages]
+        # distances[i] - расстояние от точки i до точки i + 1, км
+        self.distances = []
+        # odometers[i] - пробег от начала трека до точки i, км
+        self.odometers = []
+        # ошибки в координатах: {индекс точки: исключение}, отрезок до этой точки равен 0
+        self.errors = {}
+
+        prev_point, prev_error, total = None, None, .0
+        for i, message in enumerate(messages):
+            point, error = None, None
+            try:
+                lat = radians(message['pos']['y'])
+                point = (lat, radians(message['pos']['x']), cos(lat))
+            except POINT_ERRORS as e:
+                error = e
+
+            if i:
+                distance = .0
+                if point and prev_point:
+                    distance = self.get_segment_distance(prev_point, point)
+                else:
+                    self.errors[i] = error or prev_error
+                self.distances.append(distance)
+                total += distance
+
+            self.odometers.append(total)
+            prev_point, prev_error = point, error
+
+        if self.odometers:
+            self.distances.append(.0)
+
+    @staticmethod
+    def get_segment_distance(point1, point2):
+        lat1, lon1, cos_lat1 = point1
+        lat2, lon2, cos_lat2 = point2
+
+        a = sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * cos_lat2 * sin((lon2 - lon1) / 2) ** 2
+        return EARTH_RADIUS * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    def __len__(self):
+        return len(self.odometers)
+
+    def get_range(self, t_from, t_to):
+        """Границы среза [start, end) точек, попадающих в интервал времени (включительно)"""
+        return bisect_left(self.times, t_from), bisect_right(self.times, t_to)
+
+    def get_distance(self, start, end):
+        """Пробег от точки start до точки end (индексы точек), км"""
+        if end <= start:
+            return .0
+        return self.odometers[end] - self.odometers[start]
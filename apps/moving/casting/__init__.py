@@ -1,9 +1,13 @@
 class BaseCastingObject(object):
+    __slots__ = ()
+
     def __str__(self):
         return self.__repr__()
 
 
 class IntersectionPeriod(BaseCastingObject):
+    __slots__ = ('row', 'dt_from', 'dt_to')
+
     def __init__(self, row, dt_from, dt_to):
         self.row = row
         self.dt_from = dt_from
@@ -14,6 +18,8 @@ class IntersectionPeriod(BaseCastingObject):
 
 
 class IntersectionMoment(BaseCastingObject):
+    __slots__ = ('row', 'dt', 'volume')
+
     def __init__(self, row, dt, volume):
         self.row = row
         self.dt = dt
@@ -1,12 +1,14 @@
 from moving.casting import BaseCastingObject
-from reports.utils import local_to_utc_time, parse_wialon_report_datetime
+from reports.utils import parse_wialon_cell_datetime
 
 
 class AngleSensorRow(BaseCastingObject):
+    __slots__ = ('dt_from', 'dt_to')
+
     def __init__(self, dt_from, dt_to, *args, **kwargs):
         tz = kwargs.pop('tz')
-        self.dt_from = local_to_utc_time(parse_wialon_report_datetime(dt_from), tz)
-        self.dt_to = local_to_utc_time(parse_wialon_report_datetime(dt_to), tz)
+        self.dt_from = parse_wialon_cell_datetime(dt_from, tz)
+        self.dt_to = parse_wialon_cell_datetime(dt_to, tz)
 
     def __repr__(self):
         return '%s - %s' % (self.dt_from, self.dt_to)
@@ -1,12 +1,14 @@
 from base.utils import parse_float
 from moving.casting import BaseCastingObject
-from reports.utils import local_to_utc_time, parse_wialon_report_datetime
+from reports.utils import parse_wialon_cell_datetime
 
 
 class DischargesRow(BaseCastingObject):
+    __slots__ = ('dt', 'volume')
+
     def __init__(self, dt, volume, *args, **kwargs):
         tz = kwargs.pop('tz')
-        self.dt = local_to_utc_time(parse_wialon_report_datetime(dt), tz)
+        self.dt = parse_wialon_cell_datetime(dt, tz)
         self.volume = parse_float(volume)
 
     def __repr__(self):
@@ -1,13 +1,14 @@
 from moving.casting import BaseCastingObject
-from reports.utils import local_to_utc_time, parse_wialon_report_datetime, parse_address, \
-    parse_coords
+from reports.utils import parse_address, parse_coords, parse_wialon_cell_datetime
 
 
 class LastDataRow(BaseCastingObject):
+    __slots__ = ('last_message', 'last_coords', 'address', 'coords')
+
     def __init__(self, last_message, last_coords, place, *args, **kwargs):
         tz = kwargs.pop('tz')
-        self.last_message = local_to_utc_time(parse_wialon_report_datetime(last_message), tz)
-        self.last_coords = local_to_utc_time(parse_wialon_report_datetime(last_coords), tz)
+        self.last_message = parse_wialon_cell_datetime(last_message, tz)
+        self.last_coords = parse_wialon_cell_datetime(last_coords, tz)
         self.address = parse_address(place)
         self.coords = parse_coords(place)
 
@@ -2,6 +2,8 @@ from moving.casting import BaseCastingObject
 
 
 class OdometerRow(BaseCastingObject):
+    __slots__ = ('dt', 'value')
+
     def __init__(self, dt, value, *args, **kwargs):
         self.dt = dt
         self.value = value
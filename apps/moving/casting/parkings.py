@@ -1,13 +1,14 @@
 from moving.casting import BaseCastingObject
-from reports.utils import local_to_utc_time, parse_wialon_report_datetime, parse_address, \
-    parse_coords
+from reports.utils import parse_address, parse_coords, parse_wialon_cell_datetime
 
 
 class ParkingsRow(BaseCastingObject):
+    __slots__ = ('dt_from', 'dt_to', 'address', 'coords')
+
     def __init__(self, dt_from, dt_to, place, *args, **kwargs):
         tz = kwargs.pop('tz')
-        self.dt_from = local_to_utc_time(parse_wialon_report_datetime(dt_from), tz)
-        self.dt_to = local_to_utc_time(parse_wialon_report_datetime(dt_to), tz)
+        self.dt_from = parse_wialon_cell_datetime(dt_from, tz)
+        self.dt_to = parse_wialon_cell_datetime(dt_to, tz)
         self.address = parse_address(place)
         self.coords = parse_coords(place)
 
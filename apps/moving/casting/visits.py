@@ -2,6 +2,17 @@ from moving.casting import BaseCastingObject
 
 
 class Visit(BaseCastingObject):
+    # поля анализа заполняются MovingService и до расчета не заданы (читаются через getattr)
+    __slots__ = (
+        'geozone', 'dt_from', 'dt_to', 'geozone_full',
+        'motohours', 'motohours_delta', 'trips', 'trips_delta',
+        'parkings', 'parkings_delta', 'angle_sensor', 'angle_sensor_delta',
+        'refillings', 'refillings_volume', 'discharges', 'discharges_volume',
+        'fuel_levels', 'start_fuel_level', 'end_fuel_level',
+        'idle_times', 'idle_delta',
+        'odometers', 'start_odometer', 'end_odometer', 'total_distance'
+    )
+
     def __init__(self, geozone, dt_from, dt_to, geozone_full=None):
         self.geozone = geozone
         self.dt_from = dt_from
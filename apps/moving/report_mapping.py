@@ -1,13 +1,25 @@
-from moving.casting.angle_sensor import angle_sensor_renderer
-from moving.casting.discharges import discharges_renderer
-from moving.casting.fuel_levels import fuel_level_renderer
+from array import array
+from collections.abc import Sequence
+import datetime
+import math
+
+from pytz import utc
+
+from moving.casting.angle_sensor import AngleSensorRow, angle_sensor_renderer
+from moving.casting.discharges import DischargesRow, discharges_renderer
+from moving.casting.fuel_levels import FuelLevelRow, fuel_level_renderer
 from moving.casting.geozones import geozones_renderer
 from moving.casting.last_data import last_data_renderer
-from moving.casting.motohours import motohours_renderer
-from moving.casting.odometer import odometer_renderer
+from moving.casting.motohours import MotohoursRow, motohours_renderer
+from moving.casting.odometer import OdometerRow, odometer_renderer
 from moving.casting.parkings import parkings_renderer
-from moving.casting.refillings import refillings_renderer
-from moving.casting.trips import trips_renderer
+from moving.casting.refillings import RefillingsRow, refillings_renderer
+from moving.casting.trips import TripsRow, trips_renderer
+
+# типы колонок таблиц, хранимых по колонкам
+DATETIME, FLOAT = 'datetime', 'float'
+PERIOD_COLUMNS = (('dt_from', DATETIME), ('dt_to', DATETIME))
+MOMENT_COLUMNS = (('dt', DATETIME), ('volume', FLOAT))
 
 
 MOVING_SERVICE_MAPPING = {
@@ -19,22 +31,30 @@ MOVING_SERVICE_MAPPING = {
     'моточасы': {
         'name': 'motohours',
         'level': 2,
-        'renderer': motohours_renderer
+        'renderer': motohours_renderer,
+        'row': MotohoursRow,
+        'columns': PERIOD_COLUMNS
     },
     'заправки': {
         'name': 'refillings',
         'level': 2,
-        'renderer': refillings_renderer
+        'renderer': refillings_renderer,
+        'row': RefillingsRow,
+        'columns': MOMENT_COLUMNS
     },
     'сливы': {
         'name': 'discharges',
         'level': 2,
-        'renderer': discharges_renderer
+        'renderer': discharges_renderer,
+        'row': DischargesRow,
+        'columns': MOMENT_COLUMNS
     },
     'поездки': {
         'name': 'trips',
         'level': 2,
-        'renderer': trips_renderer
+        'renderer': trips_renderer,
+        'row': TripsRow,
+        'columns': PERIOD_COLUMNS
     },
     'стоянки': {
         'name': 'parkings',
@@ -44,7 +64,9 @@ MOVING_SERVICE_MAPPING = {
     'уровень топлива': {
         'name': 'fuel_level',
         'level': 2,
-        'renderer': fuel_level_renderer
+        'renderer': fuel_level_renderer,
+        'row': FuelLevelRow,
+        'columns': MOMENT_COLUMNS
     },
     'последние данные': {
         'name': 'last_data',
@@ -54,12 +76,16 @@ MOVING_SERVICE_MAPPING = {
     'дун': {
         'name': 'angle_sensor',
         'level': 2,
-        'renderer': angle_sensor_renderer
+        'renderer': angle_sensor_renderer,
+        'row': AngleSensorRow,
+        'columns': PERIOD_COLUMNS
     },
     'пробег': {
         'name': 'odometer',
         'level': 0,
-        'renderer': odometer_renderer
+        'renderer': odometer_renderer,
+        'row': OdometerRow,
+        'columns': (('dt', DATETIME), ('value', FLOAT))
     }
 }
 
@@ -84,6 +110,10 @@ class ReportTable(object):
     def length(self):
         return len(self.source)
 
+    def last(self):
+        """Последняя строка первичного слоя или None"""
+        return self.source[-1] if self.source else None
+
     def __str__(self):
         return '%s (%s)' % (self.name, self.length())
 
@@ -91,12 +121,103 @@ class ReportTable(object):
         return self.__str__()
 
 
+class ColumnarRows(Sequence):
+    """
+    Строки колоночной таблицы только для чтения: строка собирается при обращении к ней
+    и не хранится, поэтому изменения строк в таблицу не попадают
+    """
+    __slots__ = ('table',)
+
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return self.table.length()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('row index out of range')
+        return self.table.make_row([column[index] for column in self.table.data])
+
+    def __iter__(self):
+        return map(self.table.make_row, zip(*self.table.data))
+
+
+class ColumnarReportTable(ReportTable):
+    """
+    Таблица отчета, первичный слой которой хранится по колонкам в типизированных массивах:
+    моменты - как timestamp, числа - как float, пустые значения - как NaN.
+    source - представление строк только для чтения, строки собираются при переборе;
+    строки, на которые ссылаются периоды и моменты визитов, остаются в памяти
+    """
+    def __init__(self, name, row_class, columns):
+        self.row_class = row_class
+        self.columns = columns
+        self.data = [array('d') for _ in columns]
+        super(ColumnarReportTable, self).__init__(name)
+
+    @property
+    def source(self):
+        return ColumnarRows(self)
+
+    @source.setter
+    def source(self, values):
+        self.data = [array('d') for _ in self.columns]
+        self.extend_source(values)
+
+    @staticmethod
+    def to_number(value, column_type):
+        if value is None or value == '':
+            return math.nan
+        if column_type == DATETIME:
+            return value.timestamp()
+        return float(value)
+
+    @staticmethod
+    def from_number(value, column_type):
+        if math.isnan(value):
+            return None
+        if column_type == DATETIME:
+            return datetime.datetime.fromtimestamp(value, utc)
+        return value
+
+    def make_row(self, values):
+        # конструкторы строк разбирают ячейки Wialon, поэтому поля задаем напрямую
+        row = self.row_class.__new__(self.row_class)
+        for (field, column_type), value in zip(self.columns, values):
+            setattr(row, field, self.from_number(value, column_type))
+        return row
+
+    def append_source(self, value):
+        for (field, column_type), column in zip(self.columns, self.data):
+            column.append(self.to_number(getattr(value, field), column_type))
+
+    def extend_source(self, values):
+        for value in values:
+            self.append_source(value)
+
+    def length(self):
+        return len(self.data[0])
+
+    def last(self):
+        return self.source[-1] if self.length() else None
+
+
 class ReportUnit(object):
     """Объект в отчете"""
-    def __init__(self, unit):
+    def __init__(self, unit, columnar=False):
         self.unit = unit
         for field in MOVING_SERVICE_MAPPING.values():
-            setattr(self, field['name'], ReportTable(field['name']))
+            if columnar and 'columns' in field:
+                table = ColumnarReportTable(field['name'], field['row'], field['columns'])
+            else:
+                table = ReportTable(field['name'])
+            setattr(self, field['name'], table)
 
     def __str__(self):
         return '%s (%s)' % (
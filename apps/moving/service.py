@@ -1,20 +1,31 @@
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import datetime
+import math
+from operator import attrgetter
 import re
+import threading
 import time
 
+from django.conf import settings
 from pytz import utc
 
-from base.utils import get_distance
+from base.intervals import IntervalIndex, IntervalSet, join_periods, join_moments
+from base.series import TimeSeries
+from base.timing import get_profiler
+from base.track import Track
 from moving.casting import IntersectionPeriod, IntersectionMoment
 from moving.casting.motohours import Motohours
 from moving.casting.odometer import OdometerRow
 from moving.report_mapping import MOVING_SERVICE_MAPPING, ReportUnit
 from moving.casting.visits import Visit
 from reports.utils import get_wialon_report_template_id, local_to_utc_time, \
-    cleanup_and_request_report, exec_report, get_report_rows
+    cleanup_and_request_report, exec_report, iter_report_tables, get_wialon_report_object_id, \
+    get_wialon_report_resource_id
 from ura.models import Job
 from wialon.api import get_units, get_routes, get_messages
+from wialon.auth import get_wialon_session_key, logout_session
+from wialon.batch import WialonBatch
 
 
 class MovingService(object):
@@ -23,8 +34,10 @@ class MovingService(object):
     def __init__(self, user, local_dt_from, local_dt_to, sess_id, object_id=None,
                  units_dict=None, tables=None, calc_odometer=True, calc_idle=True,
                  first_visit_allowance=60 * 3, last_visit_allowance=60 * 3,
-                 devide_last_parking_by_motohours=False):
+                 devide_last_parking_by_motohours=False, profiler=None):
         self.user = user
+        # замеры фаз; по умолчанию - профайлер текущего запроса
+        self.profiler = profiler or get_profiler()
         self.local_dt_from = local_dt_from
         self.local_dt_to = local_dt_to
         self.utc_dt_from = local_to_utc_time(local_dt_from, self.user.timezone)
@@ -51,98 +64,110 @@ class MovingService(object):
         else:
             self.tables = all_tables
 
+        # все справочные данные запрашиваем одним пакетом core/batch
+        with WialonBatch(sess_id) as batch:
+            units_call = get_units(sess_id, batch=batch) if units_dict is None else None
+            self.routes_call = get_routes(sess_id, with_points=True, batch=batch)
+            self.template_call = get_wialon_report_template_id(
+                'taxiing', self.user, sess_id, batch=batch
+            )
+            self.resource_call = get_wialon_report_resource_id(self.user, sess_id, batch=batch)
+            self.object_call = get_wialon_report_object_id(self.user, sess_id, batch=batch) \
+                if object_id is None else None
+
         if units_dict is None:
-            units_list = get_units(sess_id)
-            self.units_dict = {u['name']: u for u in units_list}
+            self.units_dict = {u['name']: u for u in units_call.result}
         else:
             self.units_dict = units_dict
 
         self.report_data = OrderedDict()
         for unit in self.units_dict.values():
-            self.report_data[unit['name']] = ReportUnit(unit)
+            self.report_data[unit['name']] = ReportUnit(
+                unit, columnar=settings.MOVING_SERVICE_COLUMNAR_TABLES
+            )
 
         if self.user.wialon_mobile_vehicle_types:
             self.mobile_vehicle_types = set(
                 x.strip() for x in self.user.wialon_mobile_vehicle_types.lower().split(',')
             )
 
-        self.script_time_from = datetime.datetime.now()
-
         self.jobs_cache = {}
         self.routes_cache = {}
         self.init_caches()
 
     def init_caches(self):
-        ura_user = self.user.ura_user if self.user.ura_user_id else self.user
-        jobs = Job.objects.filter(
-            user=ura_user,
-            date_begin__gte=self.utc_dt_from,
-            date_end__lte=self.utc_dt_to
-        )
+        with self.profiler.span('init_caches') as span:
+            ura_user = self.user.ura_user if self.user.ura_user_id else self.user
+            jobs = Job.objects.filter(
+                user=ura_user,
+                date_begin__gte=self.utc_dt_from,
+                date_end__lte=self.utc_dt_to
+            )
 
-        if len(self.units_dict) < 10:
-            jobs = jobs.filter(unit_id__in=[str(x['id']) for x in self.units_dict.values()])
+            if len(self.units_dict) < 10:
+                jobs = jobs.filter(unit_id__in=[str(x['id']) for x in self.units_dict.values()])
 
-        self.jobs_cache = {int(j.unit_id): j for j in jobs}
-        self.routes_cache = {
-            x['id']: x for x in get_routes(self.sess_id, with_points=True)
-        }
-        self.print_time_needed('Init caches')
-
-    def print_time_needed(self, message=''):
-        print(
-            '%s: %.2f' % (
-                message,
-                ((datetime.datetime.now() - self.script_time_from).total_seconds() * 1000)
-            )
-        )
-        self.script_time_from = datetime.datetime.now()
+            self.jobs_cache = {int(j.unit_id): j for j in jobs}
+            self.routes_cache = {
+                x['id']: x for x in self.routes_call.result
+            }
+            span.add(jobs=len(self.jobs_cache), routes=len(self.routes_cache))
 
     def exec_report(self):
-        template_id = get_wialon_report_template_id('taxiing', self.user, self.sess_id)
-
-        cleanup_and_request_report(self.user, template_id, self.sess_id)
-        report = exec_report(
-            self.user, template_id, self.sess_id, self.utc_timestamp_from, self.utc_timestamp_to,
-            object_id=self.object_id
-        )
-        self.print_time_needed('Exec report')
+        with self.profiler.span('exec_report'):
+            template_id = self.template_call.result
+            # при ошибке exec_report повторит запрос ID и сообщит о ней
+            report_resource_id = self.resource_call.get()
+            if self.object_id is None:
+                self.object_id = self.object_call.get()
+
+            cleanup_and_request_report(
+                self.user, template_id, self.sess_id, item_id=report_resource_id
+            )
+            report = exec_report(
+                self.user, template_id, self.sess_id, self.utc_timestamp_from,
+                self.utc_timestamp_to, report_resource_id=report_resource_id,
+                object_id=self.object_id
+            )
 
+        # отбираем только нужные таблицы и получаем их строки пакетными запросами
+        tables, mappings = {}, {}
         for table_index, table_info in enumerate(report['reportResult']['tables']):
             label = table_info['label'].lower()
             if label not in MOVING_SERVICE_MAPPING:
                 continue
 
             mapping = MOVING_SERVICE_MAPPING[label]
-
-            name = mapping['name']
-            if name not in self.tables:
+            if mapping['name'] not in self.tables:
                 continue
 
+            tables[table_index] = (table_index, table_info['rows'], mapping['level'])
+            mappings[table_index] = mapping
+
+        params = {
+            'tz': self.user.timezone
+        }
+        # время получения строк из Wialon и время их разбора замеряются раздельно
+        pages = self.profiler.iterate('fetch_tables', iter_report_tables(self.sess_id, tables))
+        for table_index, rows in pages:
+            mapping = mappings[table_index]
+            name = mapping['name']
             level = mapping['level']
             renderer = mapping['renderer']
 
-            rows = get_report_rows(
-                self.sess_id,
-                table_index,
-                table_info['rows'],
-                level=level
-            )
-
-            for row in rows:
-                unit_key = row['c'][0].strip()
-                if unit_key not in self.units_dict:
-                    continue
-
-                unit_obj = self.report_data[unit_key]
+            with self.profiler.span('parse', log=False) as span:
+                span.add(rows=len(rows))
+                for row in rows:
+                    unit_key = row['c'][0].strip()
+                    if unit_key not in self.units_dict:
+                        continue
 
-                params = {
-                    'tz': self.user.timezone
-                }
-                data = renderer([row['c']] if level < 2 else [x['c'] for x in row['r']], **params)
-                getattr(unit_obj, name).extend_source(data)
+                    unit_obj = self.report_data[unit_key]
 
-        self.print_time_needed('Parse report')
+                    data = renderer(
+                        [row['c']] if level < 2 else [x['c'] for x in row['r']], **params
+                    )
+                    getattr(unit_obj, name).extend_source(data)
 
     @staticmethod
     def prepare_geozone_name(geozone_name):
@@ -272,11 +297,7 @@ class MovingService(object):
 
                 # если включен режим разбивки последней стоянке по последним моточасам:
                 if self.devide_last_parking_by_motohours:
-                    motohours = None
-                    try:
-                        motohours = getattr(self.report_data[unit_name], 'motohours').source[-1]
-                    except (IndexError, AttributeError):
-                        pass
+                    motohours = getattr(self.report_data[unit_name], 'motohours').last()
 
                     if motohours:
                         if last_visit.dt_from < motohours.dt_to < last_visit.dt_to:
@@ -331,38 +352,22 @@ class MovingService(object):
         найденного периода
         :return: None
         """
-        for row in source:
-            dt_from, dt_to = row.dt_from, row.dt_to
-            if not dt_to:
-                dt_to = self.utc_dt_to
-
-            for col in target:
-                if target_field and not hasattr(col, target_field):
-                    setattr(col, target_field, [])
+        for col in target:
+            if target_field and not hasattr(col, target_field):
+                setattr(col, target_field, [])
 
-                if delta_field and not hasattr(col, delta_field):
-                    setattr(col, delta_field, .0)
+            if delta_field and not hasattr(col, delta_field):
+                setattr(col, delta_field, .0)
 
-                if col.dt_from > dt_to:
-                    # дальнейшие строки точно не совпадут (виалон все сортирует по дате)
-                    break
+        index = IntervalIndex(target, start=attrgetter('dt_from'), end=attrgetter('dt_to'))
+        periods = join_periods(source, index, lambda x: (x.dt_from, x.dt_to or self.utc_dt_to))
+        for row, col, max_from, min_to in periods:
+            if target_field:
+                getattr(col, target_field).append(IntersectionPeriod(row, max_from, min_to))
 
-                # если интервал точки меньше даты начала хронологии, значит еще не дошли
-                if col.dt_to < dt_from:
-                    continue
-
-                min_to, max_from = min(dt_to, col.dt_to), max(dt_from, col.dt_from)
+            if delta_field:
                 delta = (min_to - max_from).total_seconds()
-
-                # не пересекаются:
-                if delta <= 0:
-                    continue
-
-                if target_field:
-                    getattr(col, target_field).append(IntersectionPeriod(row, max_from, min_to))
-
-                if delta_field:
-                    setattr(col, delta_field, getattr(col, delta_field) + delta)
+                setattr(col, delta_field, getattr(col, delta_field) + delta)
 
     @staticmethod
     def set_intersection_moments(source, target, target_field=None, volume_source_field=None,
@@ -377,37 +382,27 @@ class MovingService(object):
         :param break_on_suitable: прерывает поиск при нахождении искомого интервала визита
         :return: None
         """
-        for row in source:
-            for col in target:
-                if target_field and not hasattr(col, target_field):
-                    setattr(col, target_field, [])
-
-                if volume_target_field and volume_source_field \
-                        and not hasattr(col, volume_target_field):
-                    setattr(col, volume_target_field, .0)
-
-                if col.dt_from > row.dt:
-                    # дальнейшие строки точно не совпадут (виалон все сортирует по дате)
-                    break
-
-                if col.dt_from <= row.dt <= col.dt_to:
-
-                    volume = .0
-                    if volume_source_field:
-                        volume = getattr(row, volume_source_field)
-
-                    if target_field:
-                        getattr(col, target_field).append(IntersectionMoment(row, row.dt, volume))
-
-                    if volume_target_field:
-                        setattr(
-                            col,
-                            volume_target_field,
-                            getattr(col, volume_target_field) + volume
-                        )
-                    # одно событие не может попасть в 2 интервала
-                    if break_on_suitable:
-                        break
+        for col in target:
+            if target_field and not hasattr(col, target_field):
+                setattr(col, target_field, [])
+
+            if volume_target_field and volume_source_field \
+                    and not hasattr(col, volume_target_field):
+                setattr(col, volume_target_field, .0)
+
+        index = IntervalIndex(target, start=attrgetter('dt_from'), end=attrgetter('dt_to'))
+        # одно событие не может попасть в 2 интервала, если не указано иное
+        moments = join_moments(source, index, attrgetter('dt'), first_only=break_on_suitable)
+        for row, col in moments:
+            volume = .0
+            if volume_source_field:
+                volume = getattr(row, volume_source_field)
+
+            if target_field:
+                getattr(col, target_field).append(IntersectionMoment(row, row.dt, volume))
+
+            if volume_target_field:
+                setattr(col, volume_target_field, getattr(col, volume_target_field) + volume)
 
     def get_periods(self, unit):
         unit_name = unit['name']
@@ -432,17 +427,23 @@ class MovingService(object):
 
         if 'fuel_level' in self.tables:
             source = getattr(self.report_data[unit_name], 'fuel_level').source
-            self.set_intersection_moments(
-                source, visits, target_field='fuel_levels', volume_source_field='volume'
-            )
+            fuel_levels = TimeSeries((row.dt, row) for row in source)
 
+            # замер на границе соседних визитов относится к первому из них
+            claimed = 0
             for visit in visits:
+                start, end = fuel_levels.get_range(visit.dt_from, visit.dt_to)
+                start = max(start, claimed)
+                claimed = max(claimed, end)
+
+                visit.fuel_levels = [
+                    IntersectionMoment(row, row.dt, row.volume)
+                    for row in fuel_levels.values[start:end]
+                ]
                 visit.start_fuel_level, visit.end_fuel_level = None, None
-                if hasattr(visit, 'fuel_levels') and visit.fuel_levels:
+                if visit.fuel_levels:
                     visit.start_fuel_level = visit.fuel_levels[0].volume
                     visit.end_fuel_level = visit.fuel_levels[-1].volume
-                else:
-                    visit.fuel_levels = []
 
         if self.calc_idle:
             # XX - это включенный двигатель на стоянках за вычетом работы ГПН
@@ -450,117 +451,187 @@ class MovingService(object):
             for visit in visits:
                 visit.idle_times = []
                 # сначала объединяем периоды поездок и работы ГПН
-                work_times = getattr(visit, 'trips', []) + getattr(visit, 'angle_sensor', [])
-                motohours = getattr(visit, 'motohours', [])
+                work_times = IntervalSet.from_objects(
+                    getattr(visit, 'trips', []) + getattr(visit, 'angle_sensor', [])
+                )
 
                 # затем вычитаем эти периоды из периодов моточасов
-                for motohour in motohours:
-                    motohour_periods = [Motohours(motohour.dt_from, motohour.dt_to)]
-
-                    for work in work_times:
-                        to_delete, to_append = [], []
-                        for i, mh in enumerate(motohour_periods):
-                            delta = (
-                                min(work.dt_to, mh.dt_to) - max(work.dt_from, mh.dt_from)
-                            ).total_seconds()
-
-                            if delta > 0:
-                                if work.dt_from <= mh.dt_from and work.dt_to >= mh.dt_to:
-                                    # если исключаемый период равен или накрывает целиком моточасы
-                                    to_delete.append(i)
-                                    # если равен, то можно не продолжать
-                                    if work.dt_from == mh.dt_from and work.dt_to == mh.dt_to:
-                                        break
-
-                                elif work.dt_from >= mh.dt_from and work.dt_to <= mh.dt_to:
-                                    # если исключаемый объект полностью внутри моточасов
-                                    # если концы пересекаются:
-                                    if work.dt_from == mh.dt_from:
-                                        mh.dt_from = work.dt_to
-                                    elif work.dt_to == mh.dt_to:
-                                        mh.dt_to = work.dt_from
-                                    else:
-                                        # если полностью внутри, то разрезаем период на два
-                                        to_delete.append(i)
-                                        to_append.extend([
-                                            Motohours(mh.dt_from, work.dt_from),
-                                            Motohours(work.dt_to, mh.dt_to)
-                                        ])
-                                else:
-                                    if work.dt_to < mh.dt_to:
-                                        mh.dt_from = work.dt_to
-                                    if work.dt_from > mh.dt_from:
-                                        mh.dt_to = work.dt_from
-
-                        if to_delete:
-                            motohour_periods = list(map(lambda x: x[1], filter(
-                                lambda x: x[0] not in to_delete,
-                                enumerate(motohour_periods)
-                            )))
-                        motohour_periods.extend(to_append)
-                    visit.idle_times.extend(motohour_periods)
+                for motohour in getattr(visit, 'motohours', []):
+                    idle_times = IntervalSet.from_objects([motohour]).difference(work_times)
+                    visit.idle_times.extend(
+                        Motohours(dt_from, dt_to) for dt_from, dt_to in idle_times
+                    )
                 visit.idle_delta = sum([
                     (x.dt_to - x.dt_from).total_seconds() for x in visit.idle_times
                 ])
 
-    def get_object_messages(self, unit):
-        return list(filter(
-            lambda x: x['pos'] is not None,
-            get_messages(
-                unit['id'], self.utc_timestamp_from, self.utc_timestamp_to, self.sess_id
-            )['messages']
-        ))
+    def get_object_messages(self, unit, sess_id=None):
+        with self.profiler.span('fetch_messages', unit=unit['name']) as span:
+            messages = list(filter(
+                lambda x: x['pos'] is not None,
+                get_messages(
+                    unit['id'], self.utc_timestamp_from, self.utc_timestamp_to,
+                    sess_id or self.sess_id
+                )['messages']
+            ))
+            span.add(messages=len(messages))
+        return messages
 
-    def get_odometer(self, unit):
+    def get_odometer(self, unit, messages=None):
         unit_name = unit['name']
         visits = self.report_data[unit_name].geozones.target
         odometer_table = self.report_data[unit_name].odometer
-        messages = self.get_object_messages(unit)
-        # сделаем обычную таблицу моментов (dt / volume), и потом внедрим ее в таблицу визитов
-        prev_message = None
-        total_odometer = .0
-
-        for i, message in enumerate(messages):
-            distance = .0
-            if prev_message:
-                # получаем пройденное расстояние для предыдущей точки
-                # TODO: попробовать через geopy
-                distance = get_distance(
-                    prev_message['pos']['x'],
-                    prev_message['pos']['y'],
-                    message['pos']['x'],
-                    message['pos']['y']
+        if messages is None:
+            messages = self.get_object_messages(unit)
+
+        with self.profiler.span('odometer', log=False) as span:
+            span.add(messages=len(messages))
+            # сделаем обычную таблицу моментов (dt / volume), и потом внедрим ее в таблицу визитов
+            track = Track(messages)
+            rows = [
+                OdometerRow(
+                    datetime.datetime.fromtimestamp(message['t']).replace(tzinfo=utc),
+                    total_odometer
                 )
-            dt = datetime.datetime.fromtimestamp(message['t']).replace(tzinfo=utc)
-            total_odometer += distance
-            odometer_table.append_source(OdometerRow(dt, total_odometer))
-            prev_message = message
-
-        # а затем рассчитаем показатель на вход и на выход из геозоны
-        self.set_intersection_moments(
-            odometer_table.source, visits, target_field='odometers', volume_source_field='value',
-            break_on_suitable=False
-        )
-        for visit in visits:
-            visit.start_odometer, visit.end_odometer, visit.total_distance = None, None, .0
-            if hasattr(visit, 'odometers') and visit.odometers:
-                visit.start_odometer = visit.odometers[0].volume
-                visit.end_odometer = visit.odometers[-1].volume
-                visit.total_distance = visit.end_odometer - visit.start_odometer
-            else:
-                visit.odometers = []
-
-    def analyze(self):
-        total = len(self.units_dict)
-        for i, unit in enumerate(self.units_dict.values(), start=1):
-            unit_name = unit['name']
-            if not self.report_data.get(unit_name):
-                continue
+                for message, total_odometer in zip(messages, track.odometers)
+            ]
+            odometer_table.extend_source(rows)
 
-            print('%s/%s) Unit %s started' % (i, total, unit['name']))
+            # а затем рассчитаем показатель на вход и на выход из геозоны
+            for visit in visits:
+                start, end = track.get_range(visit.dt_from.timestamp(), visit.dt_to.timestamp())
+                visit.odometers = [
+                    IntersectionMoment(row, row.dt, row.value) for row in rows[start:end]
+                ]
+                visit.start_odometer, visit.end_odometer = None, None
+                visit.total_distance = track.get_distance(start, end - 1)
+                if visit.odometers:
+                    visit.start_odometer = visit.odometers[0].volume
+                    visit.end_odometer = visit.odometers[-1].volume
+
+    def analyze_unit(self, unit, messages=None):
+        with self.profiler.span('analyze_unit', unit=unit['name']) as span:
             self.get_visits(unit)
             self.get_periods(unit)
             if self.calc_odometer:
-                self.get_odometer(unit)
+                self.get_odometer(unit, messages=messages)
+            span.add(visits=len(self.report_data[unit['name']].geozones.target))
+
+    def analyze(self, threads=None, processes=None):
+        """
+        :param threads: потоков загрузки сообщений объектов
+        :param processes: процессов для расчета визитов, периодов и пробега (0 - в текущем)
+        """
+        threads = settings.MOVING_SERVICE_THREADS if threads is None else threads
+        processes = settings.MOVING_SERVICE_PROCESSES if processes is None else processes
+
+        units = [x for x in self.units_dict.values() if self.report_data.get(x['name'])]
+        with self.profiler.span('analyze', threads=threads, processes=processes) as span:
+            span.add(units=len(units))
+            if threads > 1 or processes > 0:
+                return self.analyze_parallel(units, threads, processes)
+
+            for unit in units:
+                self.analyze_unit(unit)
+
+    def analyze_parallel(self, units, threads, processes):
+        """
+        Объекты независимы друг от друга, поэтому сообщения следующей пачки объектов
+        загружаются в потоках (у каждого потока своя сессия Wialon), пока считается текущая.
+        Результаты возвращаются в report_data в исходном порядке объектов
+        """
+        local, sessions, lock = threading.local(), [], threading.Lock()
+
+        def fetch_messages(unit):
+            if not self.calc_odometer:
+                return None
+
+            # замеры и вызовы Wialon в потоках относятся к профайлеру сервиса
+            with self.profiler.activate():
+                # сообщения грузятся в сессию, поэтому одну сессию нельзя делить между потоками
+                sess_id = getattr(local, 'sess_id', None)
+                if sess_id is None:
+                    sess_id = local.sess_id = get_wialon_session_key(self.user)
+                    with lock:
+                        sessions.append(sess_id)
+                return self.get_object_messages(unit, sess_id=sess_id)
+
+        chunk_size = max(threads, processes, 1) * 2
+        chunks = [units[i:i + chunk_size] for i in range(0, len(units), chunk_size)]
+        pool = self.make_process_pool(processes) if processes > 0 else None
+        try:
+            with ThreadPoolExecutor(max_workers=max(threads, 1)) as downloads:
+                pending = [downloads.submit(fetch_messages, x) for x in chunks[0]] \
+                    if chunks else []
+
+                for i, chunk in enumerate(chunks):
+                    # простой расчета в ожидании загрузки сообщений
+                    with self.profiler.span('wait_messages', log=False):
+                        messages = [x.result() for x in pending]
+                    pending = [downloads.submit(fetch_messages, x) for x in chunks[i + 1]] \
+                        if i + 1 < len(chunks) else []
+
+                    if pool is not None:
+                        # замеры по объектам в процессах расчета не собираются
+                        with self.profiler.span('analyze_units', log=False) as span:
+                            span.add(units=len(chunk))
+                            results = pool.map(
+                                analyze_unit,
+                                chunk,
+                                [self.report_data[x['name']] for x in chunk],
+                                messages,
+                                chunksize=int(math.ceil(len(chunk) / processes))
+                            )
+                            for unit, report_unit in zip(chunk, results):
+                                self.report_data[unit['name']] = report_unit
+                    else:
+                        for unit, unit_messages in zip(chunk, messages):
+                            self.analyze_unit(unit, messages=unit_messages)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            for sess_id in sessions:
+                logout_session(self.user, sess_id)
+
+    def get_worker_state(self):
+        """Справочные данные для расчета объектов в процессах (без данных объектов и Wialon)"""
+        return {name: getattr(self, name) for name in WORKER_FIELDS}
+
+    def make_process_pool(self, processes):
+        """
+        Пул процессов расчета. Справочные данные передаются в каждый процесс один раз
+        при его запуске, а процессы запускаются сразу, до старта потоков загрузки сообщений
+        """
+        pool = ProcessPoolExecutor(
+            max_workers=processes, initializer=init_worker, initargs=(self.get_worker_state(),)
+        )
+        # первое задание запускает все процессы пула
+        pool.submit(int).result()
+        return pool
+
+
+# поля MovingService, нужные для расчета визитов, периодов и пробега объекта
+WORKER_FIELDS = (
+    'tables', 'jobs_cache', 'routes_cache', 'utc_dt_from', 'utc_dt_to', 'calc_odometer',
+    'calc_idle', 'first_visit_allowance', 'last_visit_allowance',
+    'devide_last_parking_by_motohours'
+)
+
+# сервис процесса расчета, заполняется справочными данными при запуске процесса
+_worker_service = None
+
+
+def init_worker(state):
+    global _worker_service
+    _worker_service = MovingService.__new__(MovingService)
+    _worker_service.__dict__.update(state)
+    _worker_service.report_data = OrderedDict()
+
 
-            self.print_time_needed('%s/%s) Unit %s processed' % (i, total, unit['name']))
+def analyze_unit(unit, report_unit, messages):
+    """Расчет одного объекта в процессе пула"""
+    service = _worker_service
+    service.profiler = get_profiler()
+    service.report_data[unit['name']] = report_unit
+    service.analyze_unit(unit, messages=messages)
+    return service.report_data.pop(unit['name'])
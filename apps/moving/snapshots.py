@@ -0,0 +1,472 @@
+from collections import OrderedDict
+import copy
+import datetime
+import hashlib
+import json
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from pytz import utc
+
+from base.timing import get_profiler
+from moving.casting import IntersectionPeriod, IntersectionMoment
+from moving.casting.angle_sensor import AngleSensorRow
+from moving.casting.discharges import DischargesRow
+from moving.casting.fuel_levels import FuelLevelRow
+from moving.casting.motohours import Motohours, MotohoursRow
+from moving.casting.odometer import OdometerRow
+from moving.casting.parkings import ParkingsRow
+from moving.casting.refillings import RefillingsRow
+from moving.casting.trips import TripsRow
+from moving.casting.visits import Visit
+from moving.report_mapping import ReportUnit
+from moving.service import MovingService
+from reports.utils import local_to_utc_time
+from ura.models import Job
+from wialon.api import get_routes, get_units
+
+# версия формата снимков: при изменении расчета визитов старые снимки перестают читаться
+SNAPSHOT_VERSION = 2
+
+SNAPSHOT_CLASSES = {
+    cls.__name__: cls for cls in (
+        Visit, IntersectionPeriod, IntersectionMoment, Motohours, MotohoursRow, TripsRow,
+        ParkingsRow, AngleSensorRow, RefillingsRow, DischargesRow, FuelLevelRow, OdometerRow
+    )
+}
+
+# периоды визита (продолжительность пишется в поле *_delta)
+VISIT_PERIOD_FIELDS = ('motohours', 'trips', 'parkings', 'angle_sensor', 'idle_times')
+# моменты визита (объем пишется в поле *_volume)
+VISIT_MOMENT_FIELDS = ('refillings', 'discharges', 'fuel_levels', 'odometers')
+
+# соседние части визита из разных расчетов разделены не более чем на (конец суток - 23:59:59)
+VISIT_JOIN_GAP = 1
+
+
+def encode_snapshot_value(value):
+    """Визиты и строки отчета в JSON: объекты - словари с именем класса, моменты - timestamp"""
+    if isinstance(value, datetime.datetime):
+        return {'$t': value.timestamp()}
+
+    if isinstance(value, (list, tuple)):
+        return [encode_snapshot_value(x) for x in value]
+
+    if isinstance(value, dict):
+        return {k: encode_snapshot_value(v) for k, v in value.items()}
+
+    if type(value).__name__ in SNAPSHOT_CLASSES:
+        data = {'$c': type(value).__name__}
+        for cls in type(value).__mro__:
+            for field in getattr(cls, '__slots__', ()):
+                if hasattr(value, field):
+                    data[field] = encode_snapshot_value(getattr(value, field))
+        return data
+
+    return value
+
+
+def decode_snapshot_value(value):
+    if isinstance(value, list):
+        return [decode_snapshot_value(x) for x in value]
+
+    if not isinstance(value, dict):
+        return value
+
+    if '$t' in value:
+        return datetime.datetime.fromtimestamp(value['$t'], utc)
+
+    if '$c' in value:
+        cls = SNAPSHOT_CLASSES[value['$c']]
+        # конструкторы строк разбирают ячейки Wialon, поэтому поля задаем напрямую
+        obj = cls.__new__(cls)
+        for field, field_value in value.items():
+            if field != '$c':
+                setattr(obj, field, decode_snapshot_value(field_value))
+        return obj
+
+    return {k: decode_snapshot_value(v) for k, v in value.items()}
+
+
+def set_visit_aggregates(visit):
+    """Пересчет агрегатов визита по его периодам и моментам (так же, как в MovingService)"""
+    for field in ('motohours', 'trips', 'parkings', 'angle_sensor'):
+        if hasattr(visit, field):
+            setattr(visit, '%s_delta' % field, sum(
+                (x.dt_to - x.dt_from).total_seconds() for x in getattr(visit, field)
+            ))
+
+    for field in ('refillings', 'discharges'):
+        if hasattr(visit, field):
+            setattr(visit, '%s_volume' % field, sum(x.volume for x in getattr(visit, field)))
+
+    if hasattr(visit, 'idle_times'):
+        visit.idle_delta = sum((x.dt_to - x.dt_from).total_seconds() for x in visit.idle_times)
+
+    if hasattr(visit, 'fuel_levels'):
+        visit.start_fuel_level, visit.end_fuel_level = None, None
+        if visit.fuel_levels:
+            visit.start_fuel_level = visit.fuel_levels[0].volume
+            visit.end_fuel_level = visit.fuel_levels[-1].volume
+
+    if hasattr(visit, 'odometers'):
+        visit.start_odometer, visit.end_odometer, visit.total_distance = None, None, .0
+        if visit.odometers:
+            visit.start_odometer = visit.odometers[0].volume
+            visit.end_odometer = visit.odometers[-1].volume
+            visit.total_distance = visit.end_odometer - visit.start_odometer
+
+
+def clip_period(period, dt_from, dt_to):
+    start, end = max(period.dt_from, dt_from), min(period.dt_to, dt_to)
+    if start == period.dt_from and end == period.dt_to:
+        return period
+
+    period = copy.copy(period)
+    period.dt_from, period.dt_to = start, end
+    return period
+
+
+def clip_visit(visit, dt_from, dt_to):
+    """
+    Часть визита в пределах суток [dt_from, dt_to) с пересчитанными агрегатами.
+    :return: визит (тот же, если он целиком внутри суток) или None
+    """
+    if visit.dt_from >= dt_to or visit.dt_to < dt_from \
+            or (visit.dt_to == dt_from and visit.dt_from < dt_from):
+        return None
+
+    if visit.dt_from >= dt_from and visit.dt_to <= dt_to:
+        return visit
+
+    part = Visit(
+        visit.geozone, max(visit.dt_from, dt_from), min(visit.dt_to, dt_to), visit.geozone_full
+    )
+    for field in VISIT_PERIOD_FIELDS:
+        if hasattr(visit, field):
+            setattr(part, field, [
+                clip_period(x, dt_from, dt_to) for x in getattr(visit, field)
+                if x.dt_from < dt_to and x.dt_to > dt_from
+            ])
+
+    for field in VISIT_MOMENT_FIELDS:
+        if hasattr(visit, field):
+            setattr(part, field, [
+                x for x in getattr(visit, field) if dt_from <= x.dt < dt_to
+            ])
+
+    set_visit_aggregates(part)
+    return part
+
+
+def join_periods(first, second):
+    """Периоды двух частей визита; период, разрезанный границей суток, склеивается"""
+    if first and second and first[-1].dt_to == second[0].dt_from:
+        period = copy.copy(first[-1])
+        period.dt_to = second[0].dt_to
+        return first[:-1] + [period] + second[1:]
+    return first + second
+
+
+def merge_visits(first, second):
+    """Визит, разрезанный границей суток, собирается из двух частей"""
+    visit = Visit(first.geozone, first.dt_from, second.dt_to, first.geozone_full)
+
+    for field in VISIT_PERIOD_FIELDS:
+        if hasattr(first, field) or hasattr(second, field):
+            setattr(visit, field, join_periods(
+                getattr(first, field, []), getattr(second, field, [])
+            ))
+
+    for field in VISIT_MOMENT_FIELDS:
+        if hasattr(first, field) or hasattr(second, field):
+            setattr(visit, field, getattr(first, field, []) + getattr(second, field, []))
+
+    set_visit_aggregates(visit)
+    return visit
+
+
+def shift_odometer(visit, offset):
+    if not offset or not getattr(visit, 'odometers', None):
+        return
+
+    visit.odometers = [
+        IntersectionMoment(x.row, x.dt, x.volume + offset) for x in visit.odometers
+    ]
+    visit.start_odometer += offset
+    visit.end_odometer += offset
+
+
+def join_segments(segments):
+    """
+    Визиты объекта из последовательных частей периода: [(начало расчета, визиты)].
+    Части одного расчета (снимки суток, посчитанных вместе) стыкуются точно,
+    а пробег продолжается без сдвига; на стыке разных расчетов визит одной геозоны
+    склеивается, а пробег следующего расчета сдвигается, чтобы продолжить предыдущий
+    """
+    visits, run, offset, last_odometer, pending = [], None, .0, None, False
+    for segment_run, segment_visits in segments:
+        if segment_run != run:
+            run, offset, pending = segment_run, .0, True
+
+        for i, visit in enumerate(segment_visits):
+            if pending and getattr(visit, 'odometers', None):
+                offset = last_odometer - visit.start_odometer \
+                    if last_odometer is not None else .0
+                pending = False
+
+            shift_odometer(visit, offset)
+            if getattr(visit, 'end_odometer', None) is not None:
+                last_odometer = visit.end_odometer
+
+            if i == 0 and visits and visits[-1].geozone == visit.geozone \
+                    and 0 <= (visit.dt_from - visits[-1].dt_to).total_seconds() <= VISIT_JOIN_GAP:
+                visits[-1] = merge_visits(visits[-1], visit)
+            else:
+                visits.append(visit)
+    return visits
+
+
+class DailyMovingService(object):
+    """
+    MovingService со снимками по суткам.
+    Визиты объектов (с периодами и моментами) за закрытые местные сутки хранятся в кэше
+    сжатыми снимками по объекту и дню. При следующих запусках любых отчетов недостающие
+    сутки (подряд идущие - одним расчетом) считаются MovingService, остальные берутся
+    из снимков. Ключ снимка включает ПЛ объекта за сутки и точки их маршрутов,
+    поэтому изменение ПЛ или маршрута приводит к пересчету суток.
+
+    Если снимков за период нет, результат совпадает с расчетом одним MovingService.
+    Иначе на стыке снимков из разных расчетов возможны отличия: визит одной геозоны
+    склеивается, но на границе каждого расчета уже применены допущения первого и последнего
+    визита (в т.ч. SPACE и разбивка последней стоянки по моточасам), сглаживание коротких
+    визитов и выбор ПЛ выполнены в пределах того расчета, а пробег между расчетами
+    не учитывается.
+    Поэтому снимки включаются настройкой MOVING_SERVICE_SNAPSHOTS (по умолчанию выключены),
+    а без нее и для периода, не выровненного по суткам, отчет считается одним MovingService
+    """
+
+    def __init__(self, user, local_dt_from, local_dt_to, sess_id, object_id=None,
+                 units_dict=None, **kwargs):
+        self.user = user
+        self.local_dt_from = local_dt_from
+        self.local_dt_to = local_dt_to
+        self.sess_id = sess_id
+        self.object_id = object_id
+        self.units_dict = units_dict
+        self.kwargs = kwargs
+        self.profiler = kwargs.get('profiler') or get_profiler()
+
+        self.report_data = OrderedDict()
+        # расчеты недостающих суток: [(сутки, MovingService)]
+        self.runs = []
+        # снимки: {(день, имя объекта): (начало расчета, визиты)}
+        self.snapshots = {}
+        # отпечатки ПЛ и маршрутов: {(день, ID объекта): (строка, ПЛ за сутки)}
+        self.fingerprints = {}
+        self.service = None
+
+        self.days = self.get_days()
+        if self.days is None:
+            self.service = MovingService(
+                user, local_dt_from, local_dt_to, sess_id, object_id=object_id,
+                units_dict=units_dict, **kwargs
+            )
+            self.report_data = self.service.report_data
+        elif self.units_dict is None:
+            self.units_dict = {u['name']: u for u in get_units(sess_id, user=user)}
+
+    def get_days(self):
+        """Список суток периода или None, если период не выровнен по суткам"""
+        if not settings.MOVING_SERVICE_SNAPSHOTS \
+                or self.local_dt_from.time() != datetime.time(0, 0, 0) \
+                or self.local_dt_to.time() != datetime.time(23, 59, 59):
+            return None
+
+        days, day = [], self.local_dt_from.date()
+        while day <= self.local_dt_to.date():
+            days.append(day)
+            day += datetime.timedelta(days=1)
+        return days
+
+    def get_day_bounds(self, day):
+        """Сутки в UTC: [начало, начало следующих суток)"""
+        return tuple(
+            local_to_utc_time(datetime.datetime.combine(x, datetime.time(0, 0, 0)),
+                              self.user.timezone)
+            for x in (day, day + datetime.timedelta(days=1))
+        )
+
+    def is_day_closed(self, day):
+        dt_to = self.get_day_bounds(day)[1]
+        return dt_to.timestamp() < time.time() - settings.MOVING_SERVICE_SNAPSHOTS_MIN_AGE
+
+    def init_fingerprints(self, days):
+        """ПЛ объектов, пересекающиеся с сутками, и точки их маршрутов (как в get_visits)"""
+        if not days:
+            return
+
+        routes = {
+            x['id']: x for x in get_routes(self.sess_id, with_points=True, user=self.user)
+        }
+
+        def get_points(route):
+            return sorted(x['name'] for x in route['points']) if route else None
+
+        fixed_points = sorted(
+            (x['name'], get_points(x)) for x in routes.values()
+            if 'фиксир' in x['name'].lower()
+        )
+
+        ura_user = self.user.ura_user if self.user.ura_user_id else self.user
+        dt_from, dt_to = self.get_day_bounds(days[0])[0], self.get_day_bounds(days[-1])[1]
+        jobs = list(Job.objects.filter(
+            user=ura_user,
+            date_begin__lt=dt_to,
+            date_end__gt=dt_from,
+            unit_id__in=[str(x['id']) for x in self.units_dict.values()]
+        ).order_by('pk'))
+
+        for day in days:
+            day_from, day_to = self.get_day_bounds(day)
+            for unit in self.units_dict.values():
+                day_jobs = [
+                    x for x in jobs if x.unit_id == str(unit['id'])
+                    and x.date_begin < day_to and x.date_end > day_from
+                ]
+                fingerprint = json.dumps([
+                    [
+                        (x.pk, x.route_id, x.date_begin, x.date_end, x.updated,
+                         get_points(routes.get(int(x.route_id)))
+                         if x.route_id.isdigit() else None)
+                        for x in day_jobs
+                    ],
+                    fixed_points
+                ], default=str)
+                self.fingerprints[(day, unit['id'])] = (fingerprint, {x.pk for x in day_jobs})
+
+    def get_snapshot_key(self, unit, day):
+        params = json.dumps(
+            [(k, v) for k, v in sorted(self.kwargs.items()) if k != 'profiler'],
+            default=str
+        )
+        key = '%s:%s:%s:%s:%s:%s:%s' % (
+            SNAPSHOT_VERSION, self.user.pk, self.user.timezone, unit['id'], day, params,
+            self.fingerprints[(day, unit['id'])][0]
+        )
+        return 'moving_snapshot:%s' % hashlib.md5(key.encode()).hexdigest()
+
+    def load_snapshots(self, days):
+        keys = {
+            self.get_snapshot_key(unit, day): (day, unit['name'])
+            for day in days for unit in self.units_dict.values()
+        }
+        if not keys:
+            return
+
+        with self.profiler.span('load_snapshots') as span:
+            cached = cache.get_many(list(keys.keys()))
+            span.add(snapshots=len(cached), bytes=sum(len(x) for x in cached.values()))
+            for key, data in cached.items():
+                data = json.loads(zlib.decompress(data).decode())
+                self.snapshots[keys[key]] = (data['run'], decode_snapshot_value(data['visits']))
+
+    @staticmethod
+    def get_run_id(service):
+        return '%s-%s' % (service.utc_timestamp_from, service.utc_timestamp_to)
+
+    def save_snapshots(self, days, service):
+        """Снимки закрытых суток расчета: визиты объектов, обрезанные по границам суток"""
+        with self.profiler.span('save_snapshots') as span:
+            data = {}
+            for day in days:
+                if not self.is_day_closed(day):
+                    continue
+
+                day_from, day_to = self.get_day_bounds(day)
+                for unit_name, report_unit in service.report_data.items():
+                    unit = self.units_dict[unit_name]
+                    job = service.jobs_cache.get(unit['id'])
+                    day_jobs = self.fingerprints[(day, unit['id'])][1]
+                    # сутки сохраняем, только если расчет взял ПЛ из тех, что в ключе снимка
+                    if not report_unit.geozones.target_analyzed \
+                            or (job.pk not in day_jobs if job else day_jobs):
+                        continue
+
+                    visits = [clip_visit(x, day_from, day_to) for x in report_unit.geozones.target]
+                    value = zlib.compress(json.dumps({
+                        'run': self.get_run_id(service),
+                        'visits': encode_snapshot_value([x for x in visits if x is not None])
+                    }).encode())
+                    if len(value) <= settings.MOVING_SERVICE_SNAPSHOTS_MAX_SIZE:
+                        data[self.get_snapshot_key(unit, day)] = value
+
+            cache.set_many(data, settings.MOVING_SERVICE_SNAPSHOTS_TIMEOUT)
+            span.add(snapshots=len(data), bytes=sum(len(x) for x in data.values()))
+
+    def exec_report(self):
+        if self.service is not None:
+            return self.service.exec_report()
+
+        closed_days = [x for x in self.days if self.is_day_closed(x)]
+        self.init_fingerprints(closed_days)
+        self.load_snapshots(closed_days)
+
+        # подряд идущие сутки, по которым есть недостающие объекты, считаем одним расчетом
+        groups = []
+        for day in self.days:
+            missing = [
+                name for name in self.units_dict if (day, name) not in self.snapshots
+            ]
+            if not missing:
+                continue
+
+            if groups and groups[-1][0][-1] == day - datetime.timedelta(days=1):
+                groups[-1][0].append(day)
+                groups[-1][1].update(missing)
+            else:
+                groups.append(([day], set(missing)))
+
+        for days, missing in groups:
+            units_dict = OrderedDict(
+                (name, unit) for name, unit in self.units_dict.items() if name in missing
+            )
+            service = MovingService(
+                self.user,
+                datetime.datetime.combine(days[0], datetime.time(0, 0, 0)),
+                datetime.datetime.combine(days[-1], datetime.time(23, 59, 59)),
+                self.sess_id, object_id=self.object_id, units_dict=units_dict, **self.kwargs
+            )
+            service.exec_report()
+            self.runs.append((days, service))
+
+    def analyze(self):
+        if self.service is not None:
+            return self.service.analyze()
+
+        for days, service in self.runs:
+            service.analyze()
+            self.save_snapshots(days, service)
+
+        self.report_data = OrderedDict()
+        for unit_name, unit in self.units_dict.items():
+            segments, used_runs = [], set()
+            for day in self.days:
+                run = next((
+                    (days, service) for days, service in self.runs
+                    if day in days and unit_name in service.report_data
+                ), None)
+                if run is None:
+                    segments.append(self.snapshots[(day, unit_name)])
+                elif id(run[1]) not in used_runs:
+                    used_runs.add(id(run[1]))
+                    segments.append((
+                        self.get_run_id(run[1]), run[1].report_data[unit_name].geozones.target
+                    ))
+
+            report_unit = ReportUnit(unit)
+            report_unit.geozones.target = join_segments(segments)
+            report_unit.geozones.target_analyzed = True
+            self.report_data[unit_name] = report_unit
@@ -0,0 +1,179 @@
+from collections import OrderedDict
+import datetime
+import pickle
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils.timezone import utc
+
+from base.timing import DISABLED_PROFILER
+from moving import service as moving_service
+from moving.casting import IntersectionMoment, IntersectionPeriod
+from moving.casting.motohours import Motohours
+from moving.casting.visits import Visit
+from moving.report_mapping import ReportUnit
+from moving.service import MovingService, WORKER_FIELDS
+from moving.snapshots import (
+    clip_visit, decode_snapshot_value, encode_snapshot_value, join_segments, merge_visits,
+    set_visit_aggregates
+)
+
+
+def dt(hour, minute=0):
+    """Момент от начала 01.01.2019 UTC (часы больше 23 - следующие сутки)"""
+    return datetime.datetime(2019, 1, 1, tzinfo=utc) \
+        + datetime.timedelta(hours=hour, minutes=minute)
+
+
+def make_visit(geozone, dt_from, dt_to, motohours=(), odometers=()):
+    visit = Visit(geozone, dt_from, dt_to, geozone)
+    visit.motohours = [IntersectionPeriod(None, x, y) for x, y in motohours]
+    visit.refillings, visit.discharges, visit.fuel_levels = [], [], []
+    visit.idle_times = [Motohours(x, y) for x, y in motohours]
+    visit.odometers = [IntersectionMoment(None, x, y) for x, y in odometers]
+    set_visit_aggregates(visit)
+    return visit
+
+
+class SnapshotsTestCase(SimpleTestCase):
+    """Снимки визитов: сериализация, разрезание по суткам и обратная склейка"""
+
+    def setUp(self):
+        self.visit = make_visit(
+            'База', dt(20), dt(28),
+            motohours=[(dt(21), dt(27))],
+            odometers=[(dt(21), 1.0), (dt(23), 3.0), (dt(26), 5.0)]
+        )
+
+    def test_encode_decode(self):
+        decoded = decode_snapshot_value(encode_snapshot_value([self.visit]))[0]
+
+        self.assertIsInstance(decoded, Visit)
+        self.assertEqual(decoded.dt_from, self.visit.dt_from)
+        self.assertEqual(decoded.geozone, 'База')
+        self.assertIsInstance(decoded.motohours[0], IntersectionPeriod)
+        self.assertEqual(decoded.motohours[0].dt_to, dt(27))
+        self.assertIsInstance(decoded.idle_times[0], Motohours)
+        self.assertEqual(decoded.motohours_delta, 6 * 3600)
+        self.assertEqual([x.volume for x in decoded.odometers], [1.0, 3.0, 5.0])
+        self.assertEqual(decoded.total_distance, 4.0)
+
+    def test_clip_visit(self):
+        first = clip_visit(self.visit, dt(0), dt(24))
+        second = clip_visit(self.visit, dt(24), dt(48))
+
+        self.assertEqual((first.dt_from, first.dt_to), (dt(20), dt(24)))
+        self.assertEqual(first.motohours_delta, 3 * 3600)
+        self.assertEqual(first.idle_delta, 3 * 3600)
+        self.assertEqual(first.total_distance, 2.0)
+        self.assertEqual((second.dt_from, second.dt_to), (dt(24), dt(28)))
+        self.assertEqual(second.motohours_delta, 3 * 3600)
+        self.assertEqual(second.start_odometer, 5.0)
+        self.assertEqual(second.total_distance, .0)
+
+        # визит внутри суток не копируется, визит вне суток отбрасывается
+        self.assertIs(clip_visit(first, dt(0), dt(24)), first)
+        self.assertIsNone(clip_visit(self.visit, dt(48), dt(72)))
+        self.assertIsNone(clip_visit(make_visit('База', dt(1), dt(24)), dt(24), dt(48)))
+
+    def test_merge_visits(self):
+        visit = merge_visits(
+            clip_visit(self.visit, dt(0), dt(24)), clip_visit(self.visit, dt(24), dt(48))
+        )
+
+        self.assertEqual((visit.dt_from, visit.dt_to), (dt(20), dt(28)))
+        self.assertEqual(len(visit.motohours), 1)
+        self.assertEqual(visit.motohours[0].dt_to, dt(27))
+        self.assertEqual(visit.motohours_delta, self.visit.motohours_delta)
+        self.assertEqual(visit.idle_delta, self.visit.idle_delta)
+        self.assertEqual(visit.total_distance, self.visit.total_distance)
+
+    def test_join_segments(self):
+        other = make_visit('Карьер', dt(30), dt(31), odometers=[(dt(30), .5), (dt(31), 2.5)])
+        visits = join_segments([
+            ('run1', [clip_visit(self.visit, dt(0), dt(24))]),
+            ('run1', [clip_visit(self.visit, dt(24), dt(48))]),
+            ('run2', [other])
+        ])
+
+        self.assertEqual([x.geozone for x in visits], ['База', 'Карьер'])
+        self.assertEqual((visits[0].dt_from, visits[0].dt_to), (dt(20), dt(28)))
+        self.assertEqual(visits[0].total_distance, 4.0)
+        # пробег следующего расчета продолжает предыдущий
+        self.assertEqual((visits[1].start_odometer, visits[1].end_odometer), (5.0, 7.0))
+        self.assertEqual(visits[1].total_distance, 2.0)
+
+    def test_join_segments_gap(self):
+        first = make_visit('База', dt(20), dt(23, 59) + datetime.timedelta(seconds=59))
+        second = make_visit('База', dt(24), dt(26))
+        far = make_visit('База', dt(30), dt(31))
+
+        visits = join_segments([('run1', [first]), ('run2', [second]), ('run3', [far])])
+        self.assertEqual([(x.dt_from, x.dt_to) for x in visits], [
+            (dt(20), dt(26)), (dt(30), dt(31))
+        ])
+
+
+class AnalyzeParallelTestCase(SimpleTestCase):
+    """Параллельный расчет объектов MovingService без обращения к Wialon"""
+
+    def make_service(self, units_count):
+        service = MovingService.__new__(MovingService)
+        service.user = mock.Mock()
+        service.profiler = DISABLED_PROFILER
+        service.units_dict = OrderedDict(
+            ('unit %s' % i, {'id': i, 'name': 'unit %s' % i}) for i in range(units_count)
+        )
+        service.report_data = OrderedDict(
+            (name, ReportUnit(unit)) for name, unit in service.units_dict.items()
+        )
+        service.tables, service.jobs_cache, service.routes_cache = [], {}, {}
+        service.utc_dt_from, service.utc_dt_to = dt(0), dt(24)
+        service.calc_odometer, service.calc_idle = True, True
+        service.first_visit_allowance = service.last_visit_allowance = 180
+        service.devide_last_parking_by_motohours = False
+        return service
+
+    @mock.patch.object(moving_service, 'logout_session')
+    @mock.patch.object(moving_service, 'get_wialon_session_key')
+    def test_threads(self, get_session_key, logout_session):
+        get_session_key.side_effect = ('sid %s' % i for i in range(100))
+        service = self.make_service(7)
+
+        analyzed = []
+        with mock.patch.object(
+            service, 'get_object_messages', side_effect=lambda unit, sess_id: [unit['id']]
+        ), mock.patch.object(
+            service, 'analyze_unit',
+            side_effect=lambda unit, messages: analyzed.append((unit['id'], messages))
+        ):
+            service.analyze(threads=3, processes=0)
+
+        # объекты считаются по порядку, каждый со своими сообщениями
+        self.assertEqual(analyzed, [(i, [i]) for i in range(7)])
+        # каждая сессия потоков загрузки возвращается в пул
+        self.assertLessEqual(get_session_key.call_count, 3)
+        self.assertEqual(
+            sorted(x[0][1] for x in logout_session.call_args_list),
+            sorted('sid %s' % i for i in range(get_session_key.call_count))
+        )
+
+    def test_worker(self):
+        service = self.make_service(1)
+        state = service.get_worker_state()
+
+        # в процессы передаются только справочные данные
+        self.assertEqual(set(state), set(WORKER_FIELDS))
+        state = pickle.loads(pickle.dumps(state))
+
+        def analyze_unit(worker, unit, messages=None):
+            worker.report_data[unit['name']].geozones.target = messages
+
+        moving_service.init_worker(state)
+        with mock.patch.object(MovingService, 'analyze_unit', analyze_unit):
+            report_unit = moving_service.analyze_unit(
+                service.units_dict['unit 0'], service.report_data['unit 0'], ['message']
+            )
+
+        self.assertEqual(report_unit.geozones.target, ['message'])
+        self.assertEqual(moving_service._worker_service.report_data, {})
@@ -0,0 +1,87 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from base.exceptions import APIProcessError
+from notifications.queue import notification_queue
+from snippets.utils.email import send_trigger_email
+from ura.models import Job
+from ura.utils import register_jobs_notifications
+from wialon.api import get_routes
+from wialon.auth import get_wialon_session_key, logout_session
+from wialon.exceptions import WialonException
+
+
+def retry_jobs(job_ids, error):
+    for job_id in job_ids:
+        if not notification_queue.retry(job_id):
+            print('Notifications of job %s were not registered: %s' % (job_id, error))
+            send_trigger_email(
+                'Не удалось зарегистрировать уведомления ПЛ', extra_data={
+                    'ID ПЛ': job_id,
+                    'Ошибка': error
+                }
+            )
+
+
+def register_notifications(timeout=0):
+    """Регистрирует уведомления очередной пачки ПЛ из очереди"""
+    job_ids = notification_queue.take(settings.NOTIFICATIONS_QUEUE_TAKE_LIMIT, timeout=timeout)
+    if not job_ids:
+        return 0
+
+    jobs_by_user = defaultdict(list)
+    for job in Job.objects.filter(pk__in=job_ids).select_related('user'):
+        jobs_by_user[job.user].append(job)
+
+    # ПЛ, удаленные до регистрации уведомлений, просто снимаем с очереди
+    found_ids = {j.pk for jobs in jobs_by_user.values() for j in jobs}
+    for job_id in set(job_ids) - found_ids:
+        notification_queue.ack(job_id)
+
+    for user, jobs in jobs_by_user.items():
+        sess_id = None
+        try:
+            sess_id = get_wialon_session_key(user)
+            routes = get_routes(sess_id, with_points=True, user=user)
+            failed_jobs = register_jobs_notifications(
+                jobs, sess_id, routes_cache={r['id']: r for r in routes}
+            )
+        except (APIProcessError, WialonException) as e:
+            print('User %s: notifications registration failed: %s' % (user, e))
+            retry_jobs([j.pk for j in jobs], str(e))
+            continue
+        finally:
+            if sess_id:
+                logout_session(user, sess_id)
+
+        failed_ids = {j.pk for j in failed_jobs}
+        for job in jobs:
+            if job.pk not in failed_ids:
+                notification_queue.ack(job.pk)
+        retry_jobs(failed_ids, 'Ошибка Wialon при сохранении шаблона уведомления')
+
+    print('%s jobs processed' % len(job_ids))
+    return len(job_ids)
+
+
+class Command(BaseCommand):
+    help = 'Регистрирует в Wialon уведомления ПЛ из очереди (разово либо в цикле с --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true', default=False,
+            help='Работать в цикле, ожидая появления ПЛ в очереди'
+        )
+
+    def handle(self, *args, **options):
+        notification_queue.recover()
+
+        if not options['loop']:
+            while register_notifications():
+                pass
+            return
+
+        while True:
+            register_notifications(timeout=settings.NOTIFICATIONS_QUEUE_POLL_TIMEOUT)
@@ -6,7 +6,6 @@ from reports.utils import get_wialon_report_resource_id
 from ura.models import StandardPoint
 from wialon.api import get_routes
 from notifications.exceptions import NotificationError
-from wialon.api.notifications import update_notification
 from wialon.utils import get_wialon_timezone_integer
 
 
@@ -110,8 +109,7 @@ def route_coming_off_notification(job, sess_id, routes_cache=None, **kwargs):
         ]
     }
 
-    result = update_notification(data, sess_id)
-    yield result[0], result[1], data
+    yield data
 
 
 def space_overstatements_notification(job, sess_id, routes_cache=None, **kwargs):
@@ -214,8 +212,7 @@ def space_overstatements_notification(job, sess_id, routes_cache=None, **kwargs)
         ]
     }
 
-    result = update_notification(data, sess_id)
-    yield result[0], result[1], data
+    yield data
 
 
 def route_overparking_notification(job, sess_id, routes_cache=None, job_template=None):
@@ -333,8 +330,7 @@ def route_overparking_notification(job, sess_id, routes_cache=None, job_template
             ]
         }
 
-        result = update_notification(data, sess_id)
-        yield result[0], result[1], data
+        yield data
 
 
 def load_overtime_notification(job, sess_id, routes_cache=None, job_template=None):
@@ -458,8 +454,7 @@ def load_overtime_notification(job, sess_id, routes_cache=None, job_template=Non
             ]
         }
 
-        result = update_notification(data, sess_id)
-        yield result[0], result[1], data
+        yield data
 
 
 def unload_overtime_notification(job, sess_id, routes_cache=None, job_template=None):
@@ -578,8 +573,7 @@ def unload_overtime_notification(job, sess_id, routes_cache=None, job_template=N
             ]
         }
 
-        result = update_notification(data, sess_id)
-        yield result[0], result[1], data
+        yield data
 
 
 def space_notification(job, sess_id, routes_cache=None, job_template=None):
@@ -686,8 +680,7 @@ def space_notification(job, sess_id, routes_cache=None, job_template=None):
         ]
     }
 
-    result = update_notification(data, sess_id)
-    yield result[0], result[1], data
+    yield data
 
 
 def route_overstatement_notification(job, sess_id, routes_cache=None, job_template=None):
@@ -803,5 +796,4 @@ def route_overstatement_notification(job, sess_id, routes_cache=None, job_templa
             ]
         }
 
-        result = update_notification(data, sess_id)
-        yield result[0], result[1], data
+        yield data
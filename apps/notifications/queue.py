@@ -0,0 +1,132 @@
+import time
+
+from django.conf import settings
+
+import redis
+
+
+# Атомарная постановка ПЛ в очередь: ПЛ, стоящие в очереди, в обработке или ожидающие повтора,
+# повторно не ставятся. KEYS[1] - множество поставленных, KEYS[2] - очередь,
+# KEYS[3] - zset ожидающих повтора, KEYS[4] - список обработки; ARGV - ID путевых листов
+ENQUEUE_SCRIPT = '''
+local processing = {}
+for _, job_id in ipairs(redis.call('LRANGE', KEYS[4], 0, -1)) do
+    processing[job_id] = true
+end
+local added = 0
+for _, job_id in ipairs(ARGV) do
+    if redis.call('SADD', KEYS[1], job_id) == 1 and not processing[job_id]
+            and not redis.call('ZSCORE', KEYS[3], job_id) then
+        redis.call('LPUSH', KEYS[2], job_id)
+        added = added + 1
+    end
+end
+return added
+'''
+
+
+class NotificationQueue(object):
+    """
+    Очередь регистрации уведомлений путевых листов в Wialon (хранится в Redis).
+    В очереди лежат ID путевых листов, каждый ПЛ ставится в очередь не более одного раза:
+    ПЛ числится поставленным, пока его обработка не подтверждена (в т.ч. в обработке
+    и в ожидании повтора). Взятые в работу ПЛ перекладываются в список обработки
+    и возвращаются в очередь, если обработчик упал, не подтвердив их.
+    Неудачные попытки повторяются с паузой
+    """
+    prefix = 'notifications'
+
+    def __init__(self, max_attempts=None, retry_delay=None):
+        self.max_attempts = max_attempts or settings.NOTIFICATIONS_QUEUE_MAX_ATTEMPTS
+        self.retry_delay = retry_delay or settings.NOTIFICATIONS_QUEUE_RETRY_DELAY
+
+        self.connection_pool = redis.BlockingConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB
+        )
+        self.cache = redis.Redis(connection_pool=self.connection_pool)
+        self.enqueue_script = self.cache.register_script(ENQUEUE_SCRIPT)
+
+    def get_key(self, name):
+        return '%s:%s' % (self.prefix, name)
+
+    def enqueue(self, job_ids):
+        """Ставит ПЛ в очередь (стоящие в очереди, в обработке и ожидающие повтора пропускаются)"""
+        job_ids = [str(x) for x in job_ids]
+        if not job_ids:
+            return 0
+
+        return self.enqueue_script(
+            keys=[
+                self.get_key('queued'), self.get_key('queue'), self.get_key('delayed'),
+                self.get_key('processing')
+            ],
+            args=job_ids
+        )
+
+    def promote_delayed(self):
+        """Возвращает в очередь ПЛ, пауза перед повтором которых истекла"""
+        delayed_key = self.get_key('delayed')
+        for job_id in self.cache.zrangebyscore(delayed_key, '-inf', time.time()):
+            if self.cache.zrem(delayed_key, job_id):
+                self.cache.lpush(self.get_key('queue'), job_id)
+
+    def recover(self):
+        """Возвращает в очередь ПЛ, оставшиеся в обработке после падения обработчика"""
+        while self.cache.rpoplpush(self.get_key('processing'), self.get_key('queue')):
+            pass
+
+    def take(self, limit, timeout=0):
+        """Забирает в обработку до limit ПЛ, ожидая первый не дольше timeout сек (0 - не ждать)"""
+        self.promote_delayed()
+
+        queue_key, processing_key = self.get_key('queue'), self.get_key('processing')
+        if timeout:
+            job_id = self.cache.brpoplpush(queue_key, processing_key, timeout=timeout)
+        else:
+            job_id = self.cache.rpoplpush(queue_key, processing_key)
+        job_ids = []
+        while job_id is not None:
+            job_ids.append(job_id.decode())
+            if len(job_ids) >= limit:
+                break
+            job_id = self.cache.rpoplpush(queue_key, processing_key)
+
+        # ПЛ числятся поставленными до подтверждения (ack)
+        return [int(x) for x in job_ids]
+
+    def ack(self, job_id):
+        """Регистрация уведомлений ПЛ завершена (или попытки закончились)"""
+        pipe = self.cache.pipeline()
+        pipe.lrem(self.get_key('processing'), 0, str(job_id))
+        pipe.hdel(self.get_key('attempts'), str(job_id))
+        pipe.srem(self.get_key('queued'), str(job_id))
+        pipe.execute()
+
+    def retry(self, job_id):
+        """
+        Откладывает повторную регистрацию уведомлений ПЛ.
+        :return: False, если попытки закончились
+        """
+        job_id = str(job_id)
+        attempts = self.cache.hincrby(self.get_key('attempts'), job_id, 1)
+        if attempts >= self.max_attempts:
+            self.ack(job_id)
+            return False
+
+        pipe = self.cache.pipeline()
+        pipe.zadd(self.get_key('delayed'), {job_id: time.time() + self.retry_delay * attempts})
+        pipe.lrem(self.get_key('processing'), 0, job_id)
+        pipe.execute()
+        return True
+
+    def get_size(self):
+        """Количество ПЛ, ожидающих регистрации уведомлений"""
+        pipe = self.cache.pipeline()
+        pipe.llen(self.get_key('queue'))
+        pipe.zcard(self.get_key('delayed'))
+        return sum(pipe.execute())
+
+
+notification_queue = NotificationQueue()
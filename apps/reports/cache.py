@@ -0,0 +1,97 @@
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class CachedReport(object):
+    """
+    Отчет Wialon за закрытый период, результат которого и строки таблиц хранятся в кэше.
+    Если результат взят из кэша, отчет в Wialon не выполняется, пока не понадобятся
+    строки, которых в кэше нет
+    """
+
+    def __init__(self, key, execute, executed=False):
+        self.key = key
+        self._execute = execute
+        self.executed = executed
+
+    def ensure_executed(self):
+        if not self.executed:
+            self._execute()
+            self.executed = True
+
+    def get_rows_key(self, table_index, rows, offset, level):
+        return '%s:rows:%s:%s:%s:%s' % (self.key, table_index, offset, rows, level)
+
+    def get_rows(self, table_index, rows, offset=0, level=0):
+        return get_cached(self.get_rows_key(table_index, rows, offset, level))
+
+    def set_rows(self, table_index, rows, offset, level, data):
+        set_cached(self.get_rows_key(table_index, rows, offset, level), data)
+
+
+# отчеты, выполненные (или взятые из кэша) в сессиях этого процесса:
+# {sess_id: (CachedReport, время привязки)}; запросы обслуживаются в нескольких потоках
+_session_reports = OrderedDict()
+_session_reports_lock = threading.Lock()
+SESSION_REPORTS_LIMIT = 100
+# привязка отчета к сессии нужна только на время запроса строк его таблиц, сек
+SESSION_REPORTS_TIMEOUT = 60 * 10
+
+
+def is_report_cacheable(dt_to):
+    """Кэшировать можно только отчеты за период, закончившийся достаточно давно"""
+    return bool(settings.WIALON_REPORT_CACHE_TIMEOUT) \
+        and dt_to < time.time() - settings.WIALON_REPORT_CACHE_MIN_AGE
+
+
+def get_report_cache_key(user, template_id, report_resource_id, object_id, dt_from, dt_to):
+    """Ячейки отчета содержат местное время, поэтому ключ включает пользователя и его пояс"""
+    key = '%s:%s:%s:%s:%s:%s:%s' % (
+        user.pk, user.timezone, template_id, report_resource_id, object_id, dt_from, dt_to
+    )
+    return 'report_result:%s' % hashlib.md5(key.encode()).hexdigest()
+
+
+def get_cached(key):
+    data = cache.get(key)
+    if data is None:
+        return None
+    return json.loads(zlib.decompress(data).decode())
+
+
+def set_cached(key, data):
+    data = zlib.compress(json.dumps(data).encode())
+    # слишком большие результаты не кэшируем, чтобы не вытеснять ими остальной кэш
+    if len(data) <= settings.WIALON_REPORT_CACHE_MAX_SIZE:
+        cache.set(key, data, settings.WIALON_REPORT_CACHE_TIMEOUT)
+
+
+def bind_session_report(sess_id, report):
+    """Привязывает отчет к сессии, в которой будут запрашиваться строки его таблиц"""
+    now = time.time()
+    with _session_reports_lock:
+        _session_reports.pop(sess_id, None)
+        if report is not None:
+            _session_reports[sess_id] = (report, now)
+
+        # старые привязки в начале словаря: сессии давно вернулись в пул
+        while _session_reports and (
+            len(_session_reports) > SESSION_REPORTS_LIMIT
+            or next(iter(_session_reports.values()))[1] < now - SESSION_REPORTS_TIMEOUT
+        ):
+            _session_reports.popitem(last=False)
+
+
+def get_session_report(sess_id):
+    with _session_reports_lock:
+        report, bound = _session_reports.get(sess_id, (None, None))
+    if report is None or bound < time.time() - SESSION_REPORTS_TIMEOUT:
+        return None
+    return report
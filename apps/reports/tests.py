@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from reports import cache as report_cache
+
+
+class ReportCacheTestCase(SimpleTestCase):
+    """Кэш результатов отчетов за закрытые периоды"""
+
+    def test_cache_key(self):
+        moscow = mock.Mock(pk=1, timezone='Europe/Moscow')
+        samara = mock.Mock(pk=1, timezone='Europe/Samara')
+        args = (10, 20, 30, 1546300800, 1546387199)
+
+        self.assertEqual(
+            report_cache.get_report_cache_key(moscow, *args),
+            report_cache.get_report_cache_key(moscow, *args)
+        )
+        # ячейки содержат местное время - пояс пользователя различает результаты
+        self.assertNotEqual(
+            report_cache.get_report_cache_key(moscow, *args),
+            report_cache.get_report_cache_key(samara, *args)
+        )
+        self.assertNotEqual(
+            report_cache.get_report_cache_key(moscow, *args),
+            report_cache.get_report_cache_key(mock.Mock(pk=2, timezone='Europe/Moscow'), *args)
+        )
+
+    @mock.patch.object(report_cache, '_session_reports', report_cache.OrderedDict())
+    def test_session_reports(self):
+        report = report_cache.CachedReport('key', lambda: None)
+
+        with mock.patch.object(report_cache.time, 'time', return_value=1000):
+            report_cache.bind_session_report('sid', report)
+            self.assertIs(report_cache.get_session_report('sid'), report)
+            self.assertIsNone(report_cache.get_session_report('other'))
+
+        # устаревшая привязка не отдается и удаляется при следующей привязке
+        later = 1000 + report_cache.SESSION_REPORTS_TIMEOUT + 1
+        with mock.patch.object(report_cache.time, 'time', return_value=later):
+            self.assertIsNone(report_cache.get_session_report('sid'))
+            report_cache.bind_session_report('other', report)
+            self.assertNotIn('sid', report_cache._session_reports)
+
+        report_cache.bind_session_report('other', None)
+        self.assertIsNone(report_cache.get_session_report('other'))
@@ -1,40 +1,46 @@
+from collections import OrderedDict
 import datetime
-import json
+from functools import lru_cache
 import math
 import time
 
 from django.conf import settings
 from django.utils.timezone import utc
 
-import requests
-
 from base.exceptions import ReportException
+from reports.cache import CachedReport, bind_session_report, get_cached, get_report_cache_key, \
+    get_session_report, is_report_cacheable, set_cached
 from reports.models import WialonReportLog
 from reports.views.base import WIALON_INTERNAL_EXCEPTION, WIALON_SESSION_EXPIRED
 from simplejson import JSONDecodeError
-from snippets.utils.datetime import utcnow
 from wialon.api import get_group_object_id, get_resource_id, get_report_template_id
 from wialon.auth import get_wialon_session_key, logout_session
+from wialon.batch import BatchCall, WialonBatch
+from wialon.client import wialon_client
 from wialon.exceptions import WialonException
+from wialon.ratelimit import report_rate_limiter
 from wialon.utils import load_requests_json
 
+# разобранных ячеек отчетов, хранимых в кэше процесса
+CELLS_CACHE_SIZE = 1024 * 64
+
 
-def get_wialon_report_object_id(user, sess_id):
+def get_wialon_report_object_id(user, sess_id, batch=None):
     name = settings.WIALON_DEFAULT_GROUP_OBJECT_NAME
     users_name = user.wialon_group_object_name.strip() if user.wialon_group_object_name else None
 
     if users_name:
         name = users_name
 
-    return get_group_object_id(name, user, sess_id)
+    return get_group_object_id(name, user, sess_id, batch=batch)
 
 
-def get_wialon_report_resource_id(user, sess_id):
+def get_wialon_report_resource_id(user, sess_id, batch=None):
     name = user.wialon_resource_name.strip() if user.wialon_resource_name else None
-    return get_resource_id(name, user, sess_id)
+    return get_resource_id(name, user, sess_id, batch=batch)
 
 
-def get_wialon_report_template_id(template_name, user, sess_id):
+def get_wialon_report_template_id(template_name, user, sess_id, batch=None):
     name = settings.WIALON_DEFAULT_TEMPLATE_NAMES.get(template_name)
     users_name = getattr(user, 'wialon_%s_report_template_name' % template_name)
     users_name = users_name.strip() if users_name else None
@@ -42,10 +48,29 @@ def get_wialon_report_template_id(template_name, user, sess_id):
     if users_name:
         name = users_name
 
-    return get_report_template_id(name, user, sess_id)
+    return get_report_template_id(name, user, sess_id, batch=batch)
+
+
+def get_wialon_report_ids(template_name, user, sess_id):
+    """Получает одним пакетным запросом ID шаблона отчета и ID ресурса пользователя"""
+    with WialonBatch(sess_id) as batch:
+        template_call = get_wialon_report_template_id(template_name, user, sess_id, batch=batch)
+        resource_call = get_wialon_report_resource_id(user, sess_id, batch=batch)
+
+    # если ресурс не найден, exec_report повторит запрос и сформирует понятную ошибку
+    return template_call.result, resource_call.get()
 
 
 def parse_timedelta(delta_string):
+    """Продолжительность из ячейки отчета Wialon (строка вида '1 days 02:03:04')"""
+    if isinstance(delta_string, dict):
+        delta_string = delta_string.get('t', '')
+    return _parse_timedelta(delta_string)
+
+
+@lru_cache(maxsize=CELLS_CACHE_SIZE)
+def _parse_timedelta(delta_string):
+    # timedelta неизменяем, поэтому разобранные значения можно переиспользовать
     delta = datetime.timedelta(seconds=0)
 
     if '-' in delta_string or not delta_string:
@@ -123,15 +148,46 @@ def parse_wialon_report_datetime(str_date):
     if isinstance(str_date, dict):
         str_date = str_date['t']
 
+    return _parse_wialon_report_datetime(str_date)
+
+
+@lru_cache(maxsize=CELLS_CACHE_SIZE)
+def _parse_wialon_report_datetime(str_date):
     str_date = str_date.lower().strip()
     if any([(str_date in x) for x in ('-----', 'неизвестно', 'unknown')]):
         return None
 
+    # основной формат Wialon разбираем без strptime
+    if len(str_date) == 19 and str_date[4] == str_date[7] == '-' and str_date[10] == ' ' \
+            and str_date[13] == str_date[16] == ':':
+        try:
+            return datetime.datetime(
+                int(str_date[0:4]), int(str_date[5:7]), int(str_date[8:10]),
+                int(str_date[11:13]), int(str_date[14:16]), int(str_date[17:19])
+            )
+        except ValueError:
+            pass
+
     pattern = '%Y-%m-%d %H:%M:%S' if str_date.count(':') >= 2 else '%Y-%m-%d %H:%M'
     local_dt = datetime.datetime.strptime(str_date, pattern)
     return local_dt
 
 
+def parse_wialon_cell_datetime(cell, timezone):
+    """
+    Момент из ячейки отчета Wialon в UTC.
+    Если в ячейке есть timestamp ('v'), берется он, иначе разбирается местное время из строки
+    """
+    if isinstance(cell, dict):
+        timestamp = cell.get('v')
+        if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool) \
+                and timestamp > 0:
+            return datetime.datetime.fromtimestamp(timestamp, utc)
+        cell = cell.get('t')
+
+    return local_to_utc_time(parse_wialon_report_datetime(cell), timezone)
+
+
 def utc_to_local_time(dt, timezone):
     if dt is None:
         return None
@@ -169,59 +225,38 @@ def cleanup_and_request_report(user, template_id, sess_id, item_id=None):
     if item_id is None:
         item_id = get_wialon_report_resource_id(user, sess_id)
 
-    requests.post(
-        settings.WIALON_BASE_URL + '?svc=core/batch&sid=' + sess_id, {
-            'params': json.dumps({
-                'params': [
-                    {
-                        'svc': 'report/cleanup_result',
-                        'params': {}
-                    },
-                    {
-                        'svc': 'report/get_report_data',
-                        'params': {
-                            'itemId': item_id,
-                            'col': [str(template_id)],
-                            'flags': 0
-                        }
-                    }
-                ],
-                'flags': 0
-            }),
-            'sid': sess_id
-        }
-    )
+    wialon_client.post('core/batch', {
+        'params': [
+            {
+                'svc': 'report/cleanup_result',
+                'params': {}
+            },
+            {
+                'svc': 'report/get_report_data',
+                'params': {
+                    'itemId': item_id,
+                    'col': [str(template_id)],
+                    'flags': 0
+                }
+            }
+        ],
+        'flags': 0
+    }, sess_id)
 
 
 def throttle_report(user):
     """
-    Замедление выполнения отчета для прохождения лимита
-    Ждем пока высвободится лимит отчетов, либо через 1 минуту выполняем в любом случае
+    Замедление выполнения отчета для прохождения лимита Wialon.
+    Ждем, пока в корзине токенов аккаунта появится свободный токен,
+    либо по истечении WIALON_REPORTS_EXECUTE_ANYWAY_AFTER выполняем в любом случае
     """
-    attempts = int(
-        settings.WIALON_REPORTS_EXECUTE_ANYWAY_AFTER / settings.WIALON_REPORTS_THROTTLE_TIME
-    )
-    throttle_delta_cumulatime = 0
-
-    def get_executed_reports_count(for_user):
-        """
-        Изучаем сколько запросов сделано за минуту
-        (и на всякий случай добавим еще 5 минут)
-        """
-        since_dt = utcnow() - datetime.timedelta(seconds=settings.WIALON_REPORTS_LIMIT_PERIOD)
-        count = WialonReportLog.objects.filter(user=for_user, created__gte=since_dt).count()
-        return count
-
-    while attempts > 0 \
-            and get_executed_reports_count(user) >= settings.WIALON_REPORTS_PER_PERIOD_LIMIT:
-        throttle_delta_cumulatime += settings.WIALON_REPORTS_THROTTLE_TIME
-        print('Report of user %s was throttled for %s sec (attempts: %s)' % (
-            user.username, throttle_delta_cumulatime, attempts
+    if not report_rate_limiter.acquire(user):
+        print('Report of user %s is executed anyway after %s sec of throttling' % (
+            user.username, settings.WIALON_REPORTS_EXECUTE_ANYWAY_AFTER
         ))
-        time.sleep(settings.WIALON_REPORTS_THROTTLE_TIME)
-        attempts -= 1
 
-    WialonReportLog.objects.create(user=user)
+    if settings.WIALON_REPORTS_LOG_ENABLED:
+        WialonReportLog.objects.create(user=user)
     return True
 
 
@@ -262,26 +297,52 @@ def exec_report(user, template_id, sess_id, dt_from, dt_to, report_resource_id=N
                 )
             )
 
+    if not is_report_cacheable(dt_to):
+        bind_session_report(sess_id, None)
+        return execute_report(
+            user, template_id, sess_id, dt_from, dt_to, report_resource_id, object_id,
+            attempts=attempts
+        )
+
+    # отчет за закрытый период неизменен - берем результат из кэша,
+    # а в Wialon выполняем, только если понадобятся отсутствующие в кэше строки
+    def execute():
+        return execute_report(
+            user, template_id, sess_id, dt_from, dt_to, report_resource_id, object_id,
+            attempts=attempts
+        )
+
+    cache_key = get_report_cache_key(
+        user, template_id, report_resource_id, object_id, dt_from, dt_to
+    )
+    result = get_cached(cache_key)
+    if result is not None:
+        bind_session_report(sess_id, CachedReport(cache_key, execute))
+        return result
+
+    result = execute()
+    set_cached(cache_key, result)
+    bind_session_report(sess_id, CachedReport(cache_key, execute, executed=True))
+    return result
+
+
+def execute_report(user, template_id, sess_id, dt_from, dt_to, report_resource_id, object_id,
+                   attempts=3):
     # замедляем в случае чего, для прохождения лимита
     throttle_report(user)
 
-    r = requests.post(
-        settings.WIALON_BASE_URL + '?svc=report/exec_report&sid=' + sess_id, {
-            'params': json.dumps({
-                'reportResourceId': report_resource_id,
-                'reportTemplateId': template_id,
-                'reportTemplate': None,
-                'reportObjectId': object_id,
-                'reportObjectSecId': 0,
-                'interval': {
-                    'flags': 0,
-                    'from': dt_from,
-                    'to': dt_to
-                }
-            }),
-            'sid': sess_id
+    r = wialon_client.post('report/exec_report', {
+        'reportResourceId': report_resource_id,
+        'reportTemplateId': template_id,
+        'reportTemplate': None,
+        'reportObjectId': object_id,
+        'reportObjectSecId': 0,
+        'interval': {
+            'flags': 0,
+            'from': dt_from,
+            'to': dt_to
         }
-    )
+    }, sess_id)
 
     result = load_requests_json(r)
 
@@ -291,10 +352,8 @@ def exec_report(user, template_id, sess_id, dt_from, dt_to, report_resource_id=N
             if attempts > 1:
                 # генерируем новую сессию
                 sess_id = get_wialon_session_key(user, invalidate=True)
-                result = exec_report(
-                    user, template_id, sess_id, dt_from, dt_to,
-                    report_resource_id=report_resource_id,
-                    object_id=object_id,
+                result = execute_report(
+                    user, template_id, sess_id, dt_from, dt_to, report_resource_id, object_id,
                     attempts=attempts - 1
                 )
                 logout_session(user, sess_id)
@@ -306,34 +365,121 @@ def exec_report(user, template_id, sess_id, dt_from, dt_to, report_resource_id=N
     return result
 
 
-def get_report_rows(sess_id, table_index, rows, offset=0, level=0):
-
-    result = requests.post(
-        settings.WIALON_BASE_URL + '?svc=report/select_result_rows&sid=' +
-        sess_id, {
-            'params': json.dumps({
-                'tableIndex': table_index,
-                'config': {
-                    'type': 'range',
-                    'data': {
-                        'from': offset,
-                        'to': rows - 1,
-                        'level': level
-                    }
-                }
-            }),
-            'sid': sess_id
+def get_report_rows_params(table_index, rows, offset=0, level=0):
+    return {
+        'tableIndex': table_index,
+        'config': {
+            'type': 'range',
+            'data': {
+                'from': offset,
+                'to': rows - 1,
+                'level': level
+            }
         }
-    )
+    }
 
-    try:
-        rows = load_requests_json(result)
-    except JSONDecodeError:
-        raise ReportException('Ошибка раскодирования ответа Wialon: %s' % result.text)
 
+def check_report_rows(rows):
     if 'error' in rows:
         if rows['error'] == 1:
             raise ReportException(WIALON_SESSION_EXPIRED)
         raise ReportException(WIALON_INTERNAL_EXCEPTION % rows)
 
     return rows
+
+
+def get_report_rows(sess_id, table_index, rows, offset=0, level=0):
+    rows_to = rows
+    report = get_session_report(sess_id)
+    if report is not None:
+        cached = report.get_rows(table_index, rows_to, offset=offset, level=level)
+        if cached is not None:
+            return cached
+        report.ensure_executed()
+
+    result = wialon_client.post(
+        'report/select_result_rows',
+        get_report_rows_params(table_index, rows, offset=offset, level=level),
+        sess_id
+    )
+
+    try:
+        rows = load_requests_json(result)
+    except JSONDecodeError:
+        raise ReportException('Ошибка раскодирования ответа Wialon: %s' % result.text)
+
+    rows = check_report_rows(rows)
+    if report is not None:
+        report.set_rows(table_index, rows_to, offset, level, rows)
+    return rows
+
+
+def iter_report_rows(sess_id, table_index, rows, offset=0, level=0, page_size=None):
+    """
+    Постранично получает строки таблицы результата отчета и отдает их по мере получения,
+    не раскодируя всю таблицу в памяти целиком
+    """
+    page_size = page_size or settings.WIALON_REPORT_ROWS_PAGE_SIZE
+
+    while offset < rows:
+        page_to = min(offset + page_size, rows)
+        page = get_report_rows(sess_id, table_index, page_to, offset=offset, level=level)
+
+        for row in page:
+            yield row
+
+        del page
+        offset = page_to
+
+
+def iter_report_tables(sess_id, tables, page_size=None):
+    """
+    Получает строки сразу нескольких таблиц результата отчета.
+    Очередные страницы всех таблиц запрашиваются одним пакетным запросом core/batch,
+    поэтому на отчет из N таблиц уходит один запрос вместо N.
+    :param tables: словарь {ключ: (индекс таблицы, количество строк, уровень)}
+    :return: генератор пар (ключ, страница строк)
+    """
+    page_size = page_size or settings.WIALON_REPORT_ROWS_PAGE_SIZE
+    offsets = {key: 0 for key, (_, rows, _) in tables.items() if rows > 0}
+    report = get_session_report(sess_id)
+
+    while offsets:
+        calls = OrderedDict()
+        batch = WialonBatch(sess_id)
+        for key, offset in offsets.items():
+            table_index, rows, level = tables[key]
+            page_to = min(offset + page_size, rows)
+
+            cached = report.get_rows(table_index, page_to, offset=offset, level=level) \
+                if report is not None else None
+            if cached is not None:
+                calls[key] = (page_to, BatchCall.resolved(cached))
+                continue
+
+            calls[key] = (page_to, batch.add(
+                'report/select_result_rows',
+                get_report_rows_params(table_index, page_to, offset=offset, level=level),
+                parser=check_report_rows
+            ))
+
+        if batch.calls:
+            if report is not None:
+                report.ensure_executed()
+            batch.execute()
+
+        for key, (page_to, call) in calls.items():
+            table_index, rows, level = tables[key]
+            offset = offsets[key]
+            if page_to >= rows:
+                del offsets[key]
+            else:
+                offsets[key] = page_to
+
+            page = call.result
+            # у взятых из кэша страниц svc нет - повторно их не сохраняем
+            if report is not None and call.svc:
+                report.set_rows(table_index, page_to, offset, level, page)
+            yield key, page
+
+        del calls
@@ -5,6 +5,7 @@ from django.http import HttpResponse
 import xlwt
 
 from base.exceptions import ReportException
+from base.timing import DISABLED_PROFILER, get_request_profiler
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from snippets.utils.datetime import utcnow
@@ -34,10 +35,17 @@ class BaseReportView(BaseTemplateView):
         super(BaseReportView, self).__init__(*args, **kwargs)
         self.styles = {}
         self.workbook = None
+        self.profiler = DISABLED_PROFILER
 
     @method_decorator(csrf_exempt)
     def dispatch(self, request, *args, **kwargs):
-        return super(BaseReportView, self).dispatch(request, *args, **kwargs)
+        # замеры фаз отчета, если они включены для запроса
+        self.profiler = get_request_profiler(request, self.__class__.__name__)
+        with self.profiler.activate():
+            try:
+                return super(BaseReportView, self).dispatch(request, *args, **kwargs)
+            finally:
+                self.profiler.finish()
 
     def get_default_form(self):
         data = self.request.POST if self.request.method == 'POST' else {}
@@ -122,14 +130,16 @@ class BaseReportView(BaseTemplateView):
 
         filename = 'report_%s.xls' % dt.strftime('%Y%m%d_%H%M%S')
 
-        self.workbook = xlwt.Workbook()
-        worksheet = self.workbook.add_sheet('Отчет')
+        with self.profiler.span('write_xls') as span:
+            self.workbook = xlwt.Workbook()
+            worksheet = self.workbook.add_sheet('Отчет')
 
-        self.write_xls_data(worksheet, context)
+            self.write_xls_data(worksheet, context)
 
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = 'attachment; filename="%s"' % filename
-        self.workbook.save(response)
+            response = HttpResponse(content_type='application/vnd.ms-excel')
+            response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+            self.workbook.save(response)
+            span.add(bytes=len(response.content))
         return response
 
     def write_xls_data(self, worksheet, context):
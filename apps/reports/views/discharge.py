@@ -1,16 +1,18 @@
 from collections import OrderedDict, defaultdict
 import datetime
+from operator import itemgetter
 import time
 
 from django.utils.timezone import utc
 
 from base.exceptions import ReportException
+from base.intervals import IntervalIndex, MAX_DATETIME
 from base.utils import parse_float
 from reports import forms, DEFAULT_OVERSPANDING_NORMAL_PERCENTAGE
 from reports.jinjaglobals import date, render_timedelta
 from reports.utils import parse_timedelta, parse_wialon_report_datetime, \
-    get_wialon_report_template_id, cleanup_and_request_report, exec_report, \
-    get_report_rows, local_to_utc_time, utc_to_local_time
+    get_wialon_report_ids, cleanup_and_request_report, exec_report, \
+    iter_report_tables, local_to_utc_time, parse_wialon_cell_datetime, utc_to_local_time
 from reports.views.base import BaseReportView, WIALON_NOT_LOGINED, WIALON_USER_NOT_FOUND, \
     REPORT_ROW_HEIGHT
 from snippets.jinjaglobals import date as date_format, floatformat
@@ -25,6 +27,8 @@ class DischargeView(BaseReportView):
     form_class = forms.FuelDischargeForm
     template_name = 'reports/discharge.html'
     report_name = 'Отчет по перерасходу топлива'
+    # таблицы результата отчета Wialon, которые загружаются для обработки
+    report_tables = ('unit_trips', 'unit_digital_sensors', 'unit_thefts', 'unit_engine_hours')
 
     def __init__(self, *args, **kwargs):
         super(DischargeView, self).__init__(*args, **kwargs)
@@ -142,7 +146,7 @@ class DischargeView(BaseReportView):
                     except ValueError:
                         pass
 
-                template_id = get_wialon_report_template_id(
+                template_id, report_resource_id = get_wialon_report_ids(
                     'discharge_individual', self.user, sess_id
                 )
                 device_fields = defaultdict(lambda: {'extras': .0, 'idle': .0})
@@ -218,29 +222,44 @@ class DischargeView(BaseReportView):
                     dt_from = int(time.mktime(report_row['periods'][0]['dt_from'].timetuple()))
                     dt_to = int(time.mktime(report_row['periods'][-1]['dt_to'].timetuple()))
 
-                    cleanup_and_request_report(self.user, template_id, sess_id)
+                    cleanup_and_request_report(
+                        self.user, template_id, sess_id, item_id=report_resource_id
+                    )
 
                     r = exec_report(
-                        self.user, template_id, sess_id, dt_from, dt_to, object_id=unit_id
+                        self.user, template_id, sess_id, dt_from, dt_to,
+                        report_resource_id=report_resource_id, object_id=unit_id
                     )
 
-                    wialon_report_rows = {}
-                    for table_index, table_info in enumerate(r['reportResult']['tables']):
-                        rows = get_report_rows(
-                            sess_id,
+                    tables = {
+                        table_info['name']: (
                             table_index,
                             table_info['rows'],
-                            level=2 if table_info['name'] == 'unit_thefts' else 1
+                            2 if table_info['name'] == 'unit_thefts' else 1
                         )
-
-                        wialon_report_rows[table_info['name']] = [row['c'] for row in rows]
+                        for table_index, table_info in enumerate(r['reportResult']['tables'])
+                        if table_info['name'] in self.report_tables
+                    }
+                    # строки разбираем по мере получения страниц (сырые строки не копим)
+                    # и один раз, а для каждого периода берем из индекса только
+                    # пересекающиеся с ним (незаконченные строки в периоды не входят)
+                    index_rows = {name: [] for name in self.report_tables}
+                    for name, page in iter_report_tables(sess_id, tables):
+                        parse_row = self.get_moment_entry if name == 'unit_thefts' \
+                            else self.get_period_entry
+                        index_rows[name].extend(parse_row(row['c']) for row in page)
+
+                    trips_index = self.get_periods_index(index_rows['unit_trips'])
+                    sensors_index = self.get_periods_index(index_rows['unit_digital_sensors'])
+                    engine_hours_index = self.get_periods_index(
+                        index_rows['unit_engine_hours']
+                    )
+                    thefts_index = self.get_moments_index(index_rows['unit_thefts'])
+                    del index_rows
 
                     for period in report_row['periods']:
-                        for row in wialon_report_rows.get('unit_trips', []):
-                            row_dt_from, row_dt_to = self.parse_wialon_report_datetime(row)
-                            if row_dt_to is None:
-                                row_dt_to = period['dt_to']
-
+                        for (row_dt_from, row_dt_to, row), _, _ in trips_index.overlaps(
+                                period['dt_from'], period['dt_to']):
                             if period['dt_from'] < row_dt_from and period['dt_to'] > row_dt_to:
                                 delta = (
                                     min(row_dt_to, period['dt_to']) -
@@ -258,21 +277,15 @@ class DischargeView(BaseReportView):
                                 period['move_hours'] += parse_timedelta(row[4]).total_seconds()\
                                     * trip_ratio
 
-                        for row in wialon_report_rows.get('unit_digital_sensors', []):
-                            row_dt_from, row_dt_to = self.parse_wialon_report_datetime(row)
-                            if row_dt_to is None:
-                                row_dt_to = period['dt_to']
-
+                        for (row_dt_from, row_dt_to, row), _, _ in sensors_index.overlaps(
+                                period['dt_from'], period['dt_to']):
                             if period['dt_from'] < row_dt_from and period['dt_to'] > row_dt_to:
                                 delta = min(row_dt_to, period['dt_to']) - \
                                         max(row_dt_from, period['dt_from'])
                                 period['extra_device_hours'] += delta.total_seconds()
 
-                        for row in wialon_report_rows.get('unit_thefts', []):
-                            dt = parse_wialon_report_datetime(
-                                row[1]['t'] if isinstance(row[1], dict) else row[1]
-                            )
-                            utc_dt = local_to_utc_time(dt, self.user.timezone)
+                        for (dt, utc_dt, row), _, _ in thefts_index.overlaps(
+                                period['dt_from'], period['dt_to']):
                             if period['dt_from'] <= utc_dt <= period['dt_to']:
 
                                 place = row[0]['t'] if isinstance(row[0], dict) else (row[0] or '')
@@ -300,11 +313,8 @@ class DischargeView(BaseReportView):
                         extras_value = device_fields.get(unit_name, {}).get('extras', .0)
                         idle_value = device_fields.get(unit_name, {}).get('idle', .0)
 
-                        for row in wialon_report_rows.get('unit_engine_hours', []):
-                            row_dt_from, row_dt_to = self.parse_wialon_report_datetime(row)
-                            if row_dt_to is None:
-                                row_dt_to = period['dt_to']
-
+                        for (row_dt_from, row_dt_to, row), _, _ in engine_hours_index.overlaps(
+                                period['dt_from'], period['dt_to']):
                             if period['dt_from'] < row_dt_from and period['dt_to'] > row_dt_to:
                                 delta = (
                                     min(row_dt_to, period['dt_to']) -
@@ -397,18 +407,27 @@ class DischargeView(BaseReportView):
 
         return kwargs
 
-    def parse_wialon_report_datetime(self, row):
-        row_dt_from = local_to_utc_time(
-            parse_wialon_report_datetime(
-                row[0]['t'] if isinstance(row[0], dict) else row[0]
-            ), self.user.timezone
-        )
-        row_dt_to = local_to_utc_time(
-            parse_wialon_report_datetime(
-                row[1]['t'] if isinstance(row[1], dict) else row[1]
-            ), self.user.timezone
-        )
+    def get_period_entry(self, row):
+        """Строка-период таблицы для индекса: (начало, конец, строка)"""
+        row_dt_from, row_dt_to = self.parse_wialon_report_datetime(row)
+        return row_dt_from, row_dt_to or MAX_DATETIME, row
+
+    def get_moment_entry(self, row):
+        """Строка-момент таблицы для индекса: (местное время, UTC, строка)"""
+        dt = parse_wialon_report_datetime(row[1]['t'] if isinstance(row[1], dict) else row[1])
+        return dt, local_to_utc_time(dt, self.user.timezone), row
+
+    @staticmethod
+    def get_periods_index(rows):
+        return IntervalIndex(rows, start=itemgetter(0), end=itemgetter(1))
+
+    @staticmethod
+    def get_moments_index(rows):
+        return IntervalIndex(rows, start=itemgetter(1), end=itemgetter(1))
 
+    def parse_wialon_report_datetime(self, row):
+        row_dt_from = parse_wialon_cell_datetime(row[0], self.user.timezone)
+        row_dt_to = parse_wialon_cell_datetime(row[1], self.user.timezone)
         return row_dt_from, row_dt_to
 
     def write_xls_data(self, worksheet, context):
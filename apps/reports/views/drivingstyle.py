@@ -1,5 +1,6 @@
 from collections import OrderedDict, defaultdict
 import datetime
+from operator import itemgetter
 import time
 
 from django.contrib import messages
@@ -9,10 +10,12 @@ from django.contrib.messages import get_messages
 import xlwt
 
 from base.exceptions import ReportException
+from base.intervals import IntervalIndex, MAX_DATETIME
 from reports import forms
 from reports.jinjaglobals import date, render_timedelta
-from reports.utils import parse_wialon_report_datetime, get_wialon_report_template_id, \
-    cleanup_and_request_report, exec_report, get_report_rows, local_to_utc_time, utc_to_local_time
+from reports.utils import parse_wialon_report_datetime, get_wialon_report_ids, \
+    cleanup_and_request_report, exec_report, iter_report_tables, local_to_utc_time, \
+    parse_wialon_cell_datetime, utc_to_local_time
 from reports.views.base import BaseReportView, WIALON_NOT_LOGINED, WIALON_USER_NOT_FOUND, \
     REPORT_ROW_HEIGHT
 from snippets.jinjaglobals import date as date_format, floatcomma
@@ -28,6 +31,8 @@ class DrivingStyleView(BaseReportView):
     template_name = 'reports/driving_style.html'
     report_name = 'Отчет нарушений ПДД и инструкции по эксплуатации техники'
     xls_heading_merge = 4
+    # таблицы результата отчета Wialon, которые загружаются для обработки
+    report_tables = ('unit_trips', 'unit_ecodriving')
 
     def __init__(self, *args, **kwargs):
         super(DrivingStyleView, self).__init__(*args, **kwargs)
@@ -175,7 +180,7 @@ class DrivingStyleView(BaseReportView):
                     except ValueError:
                         pass
 
-                template_id = get_wialon_report_template_id(
+                template_id, report_resource_id = get_wialon_report_ids(
                     'driving_style_individual', self.user, sess_id
                 )
 
@@ -248,20 +253,31 @@ class DrivingStyleView(BaseReportView):
                     dt_from = int(time.mktime(report_row['periods'][0]['dt_from'].timetuple()))
                     dt_to = int(time.mktime(report_row['periods'][-1]['dt_to'].timetuple()))
 
-                    cleanup_and_request_report(self.user, template_id, sess_id)
+                    cleanup_and_request_report(
+                        self.user, template_id, sess_id, item_id=report_resource_id
+                    )
                     r = exec_report(
-                        self.user, template_id, sess_id, dt_from, dt_to, object_id=unit_id
+                        self.user, template_id, sess_id, dt_from, dt_to,
+                        report_resource_id=report_resource_id, object_id=unit_id
                     )
 
+                    # строки разбираем по мере получения страниц, не копя сырые строки:
+                    # поездки - в периоды (незаконченная поездка длится до конца периода),
+                    # нарушения - в (начало, конец, ячейки)
+                    trips, violations = [], []
                     try:
-                        wialon_report_rows = {}
-                        for table_index, table_info in enumerate(r['reportResult']['tables']):
-                                wialon_report_rows[table_info['name']] = get_report_rows(
-                                    sess_id,
-                                    table_index,
-                                    table_info['rows'],
-                                    level=1
+                        pages = iter_report_tables(sess_id, {
+                            table_info['name']: (table_index, table_info['rows'], 1)
+                            for table_index, table_info in enumerate(r['reportResult']['tables'])
+                            if table_info['name'] in self.report_tables
+                        })
+                        for name, page in pages:
+                            if name == 'unit_trips':
+                                trips.extend(
+                                    self.parse_wialon_report_datetime(row['c']) for row in page
                                 )
+                            else:
+                                violations.extend((row['t1'], row['t2'], row['c']) for row in page)
                     except ReportException as e:
                         print('%s) Skip vehicle %s due to error' % (i, unit_name))
                         errors.append((
@@ -273,34 +289,18 @@ class DrivingStyleView(BaseReportView):
                         ))
                         continue
 
-                    for period in report_row['periods']:
-                        for row in wialon_report_rows.get('unit_trips', []):
-                            row_dt_from, row_dt_to = self.parse_wialon_report_datetime(row['c'])
-                            if row_dt_to is None:
-                                row_dt_to = period['dt_to']
-
-                            # дальнейшие строки точно не совпадут (виалон все сортирует по дате):
-                            if row_dt_from > period['dt_to']:
-                                break
-
-                            # если конец поездки меньше даты начала периода, значит еще не дошли
-                            if row_dt_to < period['dt_from']:
-                                continue
-
-                            delta = (
-                                min(row_dt_to, period['dt_to'])
-                                - max(row_dt_from, period['dt_from'])
-                            ).total_seconds()
-
-                            if delta <= 0:
-                                print('empty trips period')
-                                continue
+                    trips_index = IntervalIndex(
+                        trips, start=itemgetter(0), end=lambda x: x[1] or MAX_DATETIME
+                    )
 
-                            period['total_time'] += delta
+                    for period in report_row['periods']:
+                        for trip, max_from, min_to in trips_index.overlaps(
+                                period['dt_from'], period['dt_to'], strict=True):
+                            period['total_time'] += (min_to - max_from).total_seconds()
 
                         if period['total_time']:
-                            for row in wialon_report_rows.get('unit_ecodriving', []):
-                                if period['t_from'] < row['t2'] and period['t_to'] > row['t1']:
+                            for row_t1, row_t2, cells in violations:
+                                if period['t_from'] < row_t2 and period['t_to'] > row_t1:
                                     detail_data = {
                                         'speed': {
                                             'count': 0,
@@ -321,7 +321,7 @@ class DrivingStyleView(BaseReportView):
                                         'dt_from': '',
                                         'dt_to': ''
                                     }
-                                    violation = row['c'][1].lower() if row['c'][1] else ''
+                                    violation = cells[1].lower() if cells[1] else ''
                                     if 'свет' in violation or 'фар' in violation:
                                         viol_key = 'lights'
                                     elif 'скорост' in violation or 'превышен' in violation:
@@ -335,18 +335,18 @@ class DrivingStyleView(BaseReportView):
 
                                     if viol_key:
                                         detail_data['dt_from'] = parse_wialon_report_datetime(
-                                            row['c'][2]['t']
-                                            if isinstance(row['c'][2], dict)
-                                            else row['c'][2]
+                                            cells[2]['t']
+                                            if isinstance(cells[2], dict)
+                                            else cells[2]
                                         )
                                         detail_data['dt_to'] = parse_wialon_report_datetime(
-                                            row['c'][3]['t']
-                                            if isinstance(row['c'][3], dict)
-                                            else row['c'][3]
+                                            cells[3]['t']
+                                            if isinstance(cells[3], dict)
+                                            else cells[3]
                                         )
 
-                                        delta = min(row['t2'], period['t_to']) - \
-                                            max(row['t1'], period['t_from'])
+                                        delta = min(row_t2, period['t_to']) - \
+                                            max(row_t1, period['t_from'])
                                         detail_data[viol_key]['seconds'] = delta
 
                                         if self.form.cleaned_data['include_details']:
@@ -416,18 +416,8 @@ class DrivingStyleView(BaseReportView):
         return '#FF4500'
 
     def parse_wialon_report_datetime(self, row):
-        row_dt_from = local_to_utc_time(
-            parse_wialon_report_datetime(
-                row[0]['t'] if isinstance(row[0], dict) else row[0]
-            ), self.user.timezone
-        )
-
-        row_dt_to = local_to_utc_time(
-            parse_wialon_report_datetime(
-                row[1]['t'] if isinstance(row[1], dict) else row[1]
-            ), self.user.timezone
-        )
-
+        row_dt_from = parse_wialon_cell_datetime(row[0], self.user.timezone)
+        row_dt_to = parse_wialon_cell_datetime(row[1], self.user.timezone)
         return row_dt_from, row_dt_to
 
     def write_xls_data(self, worksheet, context):
@@ -1,13 +1,15 @@
 import datetime
+from operator import attrgetter
 
 import ujson
 from django.utils.timezone import utc
 
 from base.exceptions import ReportException
+from base.intervals import IntervalSet
 from reports import forms
 from reports.utils import get_period, local_to_utc_time, cleanup_and_request_report, \
     get_wialon_report_template_id, exec_report, get_report_rows, utc_to_local_time, \
-    parse_wialon_report_datetime
+    parse_wialon_report_datetime, get_wialon_report_resource_id, get_wialon_report_object_id
 from reports.views.base import BaseReportView, WIALON_NOT_LOGINED, WIALON_USER_NOT_FOUND, \
     REPORT_ROW_HEIGHT
 from snippets.jinjaglobals import date as date_format
@@ -15,6 +17,7 @@ from snippets.utils.datetime import utcnow
 from ura.models import Job
 from users.models import User
 from wialon.api import get_units, get_unit_settings
+from wialon.batch import WialonBatch
 
 
 LAST_SIGNAL_STEP = 5  # дней для проверки сигнала в цикле
@@ -32,6 +35,7 @@ class FaultsView(BaseReportView):
         super(FaultsView, self).__init__(*args, **kwargs)
         self.last_data = {}
         self.report_data = None
+        self.report_resource_id = None
         self.sensors_template_id = None
         self.sess_id = None
         self.stats = {
@@ -97,7 +101,23 @@ class FaultsView(BaseReportView):
                     seconds=form.cleaned_data['job_extra_offset'] * 60 * 60
                 )
 
-                units_list = get_units(self.sess_id)
+                # справочные данные получаем одним пакетным запросом
+                with WialonBatch(self.sess_id) as batch:
+                    units_call = get_units(self.sess_id, batch=batch)
+                    sensors_template_call = get_wialon_report_template_id(
+                        'sensors', self.user, self.sess_id, batch=batch
+                    )
+                    last_data_template_call = get_wialon_report_template_id(
+                        'last_data', self.user, self.sess_id, batch=batch
+                    )
+                    resource_call = get_wialon_report_resource_id(
+                        self.user, self.sess_id, batch=batch
+                    )
+                    object_call = get_wialon_report_object_id(
+                        self.user, self.sess_id, batch=batch
+                    )
+
+                units_list = units_call.result
                 units_cache = {u['id']: u['name'] for u in units_list}
 
                 dt_from_local = datetime.datetime.combine(report_date, datetime.time(0, 0, 0))
@@ -105,12 +125,9 @@ class FaultsView(BaseReportView):
                 dt_from_utc = local_to_utc_time(dt_from_local, self.user.timezone)
                 dt_to_utc = local_to_utc_time(dt_to_local, self.user.timezone)
 
-                self.sensors_template_id = get_wialon_report_template_id(
-                    'sensors', self.user, self.sess_id
-                )
-                last_data_template_id = get_wialon_report_template_id(
-                    'last_data', self.user, self.sess_id
-                )
+                self.sensors_template_id = sensors_template_call.result
+                last_data_template_id = last_data_template_call.result
+                self.report_resource_id = resource_call.get()
 
                 ura_user = self.user.ura_user if self.user.ura_user_id else self.user
                 jobs = Job.objects.filter(
@@ -121,8 +138,14 @@ class FaultsView(BaseReportView):
                     dt_from, dt_to = get_period(
                         dt_from_local, dt_to_local, self.user.timezone
                     )
-                    cleanup_and_request_report(self.user, last_data_template_id, self.sess_id)
-                    r = exec_report(self.user, last_data_template_id, self.sess_id, dt_from, dt_to)
+                    cleanup_and_request_report(
+                        self.user, last_data_template_id, self.sess_id,
+                        item_id=self.report_resource_id
+                    )
+                    r = exec_report(
+                        self.user, last_data_template_id, self.sess_id, dt_from, dt_to,
+                        report_resource_id=self.report_resource_id, object_id=object_call.get()
+                    )
 
                     for table_index, table_info in enumerate(r['reportResult']['tables']):
                         rows = get_report_rows(
@@ -160,10 +183,13 @@ class FaultsView(BaseReportView):
                     dt_from, dt_to = get_period(
                         job_local_date_begin, job_local_date_to, self.user.timezone
                     )
-                    cleanup_and_request_report(self.user, self.sensors_template_id, self.sess_id)
+                    cleanup_and_request_report(
+                        self.user, self.sensors_template_id, self.sess_id,
+                        item_id=self.report_resource_id
+                    )
                     r = exec_report(
                         self.user, self.sensors_template_id, self.sess_id, dt_from, dt_to,
-                        object_id=int(job.unit_id)
+                        report_resource_id=self.report_resource_id, object_id=int(job.unit_id)
                     )
 
                     report_tables = {}
@@ -332,10 +358,12 @@ class FaultsView(BaseReportView):
                 local_date_from, local_date_to, attempt + 1
             )
         )
-        cleanup_and_request_report(self.user, self.sensors_template_id, self.sess_id)
+        cleanup_and_request_report(
+            self.user, self.sensors_template_id, self.sess_id, item_id=self.report_resource_id
+        )
         r = exec_report(
             self.user, self.sensors_template_id, self.sess_id, dt_from, dt_to,
-            object_id=report_row['unit_id']
+            report_resource_id=self.report_resource_id, object_id=report_row['unit_id']
         )
 
         for table_index, table_info in enumerate(r['reportResult']['tables']):
@@ -472,15 +500,15 @@ class FaultsView(BaseReportView):
         if not dt_from or not dt_to:
             return None
 
-        sum_broken_work_time = 0
         ura_user = self.user.ura_user if self.user.ura_user_id else self.user
         jobs = Job.objects.filter(
             user=ura_user, unit_id=unit_id, date_begin__lt=dt_to, date_end__gt=dt_from
         )
 
-        for job in jobs:
-            intersects_period = max(dt_from, job.date_begin), min(dt_to, job.date_end)
-            sum_broken_work_time += (intersects_period[1] - intersects_period[0]).total_seconds()
+        # пересекающиеся ПЛ не должны учитывать одно и то же время дважды
+        sum_broken_work_time = IntervalSet.from_objects(
+            jobs, start=attrgetter('date_begin'), end=attrgetter('date_end')
+        ).intersection(IntervalSet([(dt_from, dt_to)])).total_seconds()
 
         if sum_broken_work_time:
             return round(sum_broken_work_time / 3600.0, 2)
@@ -8,14 +8,15 @@ from base.exceptions import ReportException
 from base.utils import parse_float
 from reports import forms
 from reports.utils import local_to_utc_time, get_wialon_report_template_id, exec_report, \
-    cleanup_and_request_report, get_report_rows, parse_timedelta, parse_wialon_report_datetime, \
-    format_timedelta
+    cleanup_and_request_report, iter_report_rows, parse_timedelta, parse_wialon_cell_datetime, \
+    format_timedelta, get_wialon_report_resource_id, get_wialon_report_object_id
 from reports.views.base import BaseVchmReportView, WIALON_NOT_LOGINED, WIALON_USER_NOT_FOUND
 from snippets.jinjaglobals import date as date_format, floatcomma
 from ura.models import Job
 from users.models import User, UserTotalReportUser
 from wialon.api import get_units, get_drive_rank_settings
 from wialon.auth import get_wialon_session_key
+from wialon.batch import WialonBatch
 from wialon.exceptions import WialonException
 
 
@@ -43,6 +44,8 @@ class VchmDrivingStyleView(BaseVchmReportView):
     template_name = 'reports/vchm_driving_style.html'
     report_name = 'Отчет по БДД'
     xls_heading_merge = 19
+    # таблицы результата отчета Wialon, которые загружаются для обработки
+    report_tables = ('unit_group_trips', 'unit_group_ecodriving')
 
     def __init__(self, *args, **kwargs):
         super(VchmDrivingStyleView, self).__init__(*args, **kwargs)
@@ -202,6 +205,14 @@ class VchmDrivingStyleView(BaseVchmReportView):
 
         return rating
 
+    @staticmethod
+    def iter_table_rows(sess_id, tables, name):
+        """Строки таблицы результата отчета постранично (пусто, если таблицы нет)"""
+        if name not in tables:
+            return iter(())
+        table_index, rows, level = tables[name]
+        return iter_report_rows(sess_id, table_index, rows, level=level)
+
     def parse_report_row(self, row, user, total=False):
         return ReportRow(
             row[0],  # unit_name
@@ -211,16 +222,8 @@ class VchmDrivingStyleView(BaseVchmReportView):
             if total else parse_timedelta(row[3]).total_seconds(),  # duration
             parse_float(row[4], default=.0),  # fine
             parse_float(row[5], default=.0),  # rating
-            local_to_utc_time(
-                parse_wialon_report_datetime(
-                    row[6]['t'] if isinstance(row[6], dict) else row[6]
-                ), user.timezone
-            ),  # from_dt
-            local_to_utc_time(
-                parse_wialon_report_datetime(
-                    row[7]['t'] if isinstance(row[7], dict) else row[7]
-                ), user.timezone
-            ),  # to_dt
+            parse_wialon_cell_datetime(row[6], user.timezone),  # from_dt
+            parse_wialon_cell_datetime(row[7], user.timezone),  # to_dt
             self.mileage_cache.get(row[0], .0)
             if total else parse_float(row[9], default=.0)  # mileage_corrected
         )
@@ -321,7 +324,15 @@ class VchmDrivingStyleView(BaseVchmReportView):
                     if j.driver_fio.lower() != 'нет в.а.'
                 }
 
-                template_id = get_wialon_report_template_id('driving_style', user, sess_id)
+                with WialonBatch(sess_id) as batch:
+                    template_call = get_wialon_report_template_id(
+                        'driving_style', user, sess_id, batch=batch
+                    )
+                    resource_call = get_wialon_report_resource_id(user, sess_id, batch=batch)
+                    object_call = get_wialon_report_object_id(user, sess_id, batch=batch) \
+                        if not form.cleaned_data.get('unit') else None
+
+                template_id = template_call.result
 
                 mobile_vehicle_types = set()
                 if user.wialon_mobile_vehicle_types:
@@ -329,8 +340,12 @@ class VchmDrivingStyleView(BaseVchmReportView):
                         x.strip() for x in user.wialon_mobile_vehicle_types.lower().split(',')
                     )
 
-                cleanup_and_request_report(user, template_id, sess_id)
-                report_kwargs = {}
+                report_resource_id = resource_call.get()
+                cleanup_and_request_report(user, template_id, sess_id, item_id=report_resource_id)
+                report_kwargs = {
+                    'report_resource_id': report_resource_id,
+                    'object_id': object_call.get() if object_call else None
+                }
                 if form.cleaned_data.get('unit'):
                     report_kwargs['object_id'] = form.cleaned_data['unit']
 
@@ -344,26 +359,26 @@ class VchmDrivingStyleView(BaseVchmReportView):
                     **report_kwargs
                 )
 
-                wialon_report_rows = {}
-                for table_index, table_info in enumerate(r['reportResult']['tables']):
-                    wialon_report_rows[table_info['name']] = get_report_rows(
-                        sess_id,
+                tables = {
+                    table_info['name']: (
                         table_index,
                         table_info['rows'],
-                        level=2 if table_info['name'] == 'unit_group_ecodriving' else 1
+                        2 if table_info['name'] == 'unit_group_ecodriving' else 1
                     )
-
-                self.mileage_cache = {
-                    row['c'][0]: parse_float(row['c'][1], default=.0)
-                    for row in wialon_report_rows.get('unit_group_trips', [])
-                }
-                self.duration_cache = {
-                    row['c'][0]: parse_timedelta(row['c'][2]).total_seconds()
-                    for row in wialon_report_rows.get('unit_group_trips', [])
+                    for table_index, table_info in enumerate(r['reportResult']['tables'])
+                    if table_info['name'] in self.report_tables
                 }
 
+                # пробег и продолжительность поездок нужны для строк нарушений,
+                # поэтому таблица поездок читается первой; строки обеих таблиц
+                # разбираются по мере получения страниц, не копясь в памяти
+                self.mileage_cache, self.duration_cache = {}, {}
+                for row in self.iter_table_rows(sess_id, tables, 'unit_group_trips'):
+                    self.mileage_cache[row['c'][0]] = parse_float(row['c'][1], default=.0)
+                    self.duration_cache[row['c'][0]] = parse_timedelta(row['c'][2]).total_seconds()
+
                 i = 0
-                for row in wialon_report_rows.get('unit_group_ecodriving', []):
+                for row in self.iter_table_rows(sess_id, tables, 'unit_group_ecodriving'):
                     i += 1
                     violations = [
                         self.parse_report_row(x['c'], user, total=False)
@@ -7,7 +7,7 @@ from django.db.models import Prefetch, Q
 import xlwt
 
 from base.exceptions import ReportException
-from moving.service import MovingService
+from moving.snapshots import DailyMovingService
 from reports import forms, DEFAULT_OVERSTATEMENT_NORMAL_PERCENTAGE, \
     DEFAULT_SPACE_TOTAL_TIME_STANDARD_MINUTES
 from reports.utils import local_to_utc_time, format_timedelta
@@ -124,7 +124,7 @@ class VchmIdleTimesView(BaseVchmReportView):
                 )
 
                 routes = {
-                    x['id']: x for x in get_routes(sess_id, with_points=True)
+                    x['id']: x for x in get_routes(sess_id, with_points=True, user=user)
                 }
                 standard_job_templates = StandardJobTemplate.objects \
                     .filter(wialon_id__in=[str(x) for x in routes.keys()]) \
@@ -168,7 +168,7 @@ class VchmIdleTimesView(BaseVchmReportView):
                 if vehtypes:
                     mobile_vehicle_types = set(x.strip() for x in vehtypes.lower().split(','))
 
-                service = MovingService(
+                service = DailyMovingService(
                     user,
                     local_dt_from,
                     local_dt_to,
@@ -8,6 +8,7 @@ import xlwt
 
 from base.exceptions import ReportException
 from moving.service import MovingService
+from moving.snapshots import DailyMovingService
 from reports import forms, DEFAULT_OVERSTATEMENT_NORMAL_PERCENTAGE
 from snippets.jinjaglobals import date as date_format, floatcomma
 from reports.utils import local_to_utc_time, format_timedelta, utc_to_local_time
@@ -187,7 +188,7 @@ class VchmTaxiingView(BaseVchmReportView):
             ])
             unit = list(self.units_dict.values())[0]
 
-            routes = {x['id']: x for x in get_routes(sess_id, with_points=True)}
+            routes = {x['id']: x for x in get_routes(sess_id, with_points=True, user=self.user)}
             standard_job_templates = StandardJobTemplate.objects \
                 .filter(wialon_id__in=[str(x) for x in routes.keys()]) \
                 .prefetch_related(
@@ -217,7 +218,7 @@ class VchmTaxiingView(BaseVchmReportView):
                 if x.space_overstatements_standard is not None or x.points_cache
             }
 
-            service = MovingService(
+            service = DailyMovingService(
                 self.user,
                 local_dt_from,
                 local_dt_to,
@@ -0,0 +1,111 @@
+import atexit
+import os
+import queue
+import random
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from ura.models import JobLog
+
+
+class JobLogWriter(object):
+    """
+    Буферизованная запись журнала запросов УРА.
+    Записи копятся в очереди процесса и сохраняются фоновым потоком через bulk_create,
+    поэтому запрос не ждет INSERT в журнал
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, max_body_size=None,
+                 sample_rate=None):
+        self.batch_size = batch_size or settings.URA_JOB_LOG_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.URA_JOB_LOG_FLUSH_INTERVAL
+        self.max_body_size = settings.URA_JOB_LOG_MAX_BODY_SIZE \
+            if max_body_size is None else max_body_size
+        self.sample_rate = settings.URA_JOB_LOG_SAMPLE_RATE \
+            if sample_rate is None else sample_rate
+
+        self.queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def truncate(self, body):
+        if body and self.max_body_size and len(body) > self.max_body_size:
+            return '%s\n... (обрезано, всего символов: %s)' % (
+                body[:self.max_body_size], len(body)
+            )
+        return body
+
+    def is_sampled(self, response_status):
+        # ошибки пишем всегда, успешные ответы - выборочно
+        return response_status >= 400 or self.sample_rate >= 1 \
+            or random.random() < self.sample_rate
+
+    def write(self, job=None, url=None, request=None, user=None, response=None,
+              response_status=None):
+        if not self.is_sampled(response_status or 0):
+            return
+
+        self.queue.put(JobLog(
+            job=job,
+            url=url,
+            request=self.truncate(request),
+            user=user,
+            response=self.truncate(response),
+            response_status=response_status
+        ))
+        self.ensure_thread()
+
+    def ensure_thread(self):
+        # после fork у каждого воркера uwsgi должен быть свой поток записи
+        pid = os.getpid()
+        if self._thread is None or self._pid != pid or not self._thread.is_alive():
+            self._pid = pid
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def run(self):
+        while True:
+            items = []
+            try:
+                items.append(self.queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                continue
+
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.save(items)
+
+    def flush(self):
+        """Сохраняет все накопленные записи немедленно"""
+        items = []
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        for i in range(0, len(items), self.batch_size):
+            self.save(items[i:i + self.batch_size])
+
+    def save(self, items):
+        if not items:
+            return
+
+        close_old_connections()
+        try:
+            JobLog.objects.bulk_create(items, batch_size=self.batch_size)
+        except Exception as e:
+            print('Не удалось сохранить журнал запросов (%s записей): %s\n%s' % (
+                len(items), e, traceback.format_exc()
+            ))
+
+
+job_log_writer = JobLogWriter()
@@ -1,7 +1,7 @@
-import gc
 import traceback
-from time import sleep
+from time import sleep, time
 
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext_lazy as _
@@ -14,12 +14,13 @@ from six import BytesIO
 
 from base.exceptions import APIParseError, AuthenticationFailed, APIValidationError, \
     APIProcessError
+from base.timing import get_request_profiler
 from snippets.utils.email import send_trigger_email
 from ura.lib.response import error_response, validation_error_response
 from ura.lib.utils import extract_token_from_request, authenticate_credentials
-from ura.models import JobLog
+from ura.lib.joblog import job_log_writer
 from ura.utils import get_organization_user
-from wialon.exceptions import WialonException
+from wialon.exceptions import WialonException, WialonUnavailable
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -70,6 +71,8 @@ class URAResource(TemplateView):
 
         try:
             self.pre_view_trigger(request, **kwargs)
+        except WialonUnavailable as e:
+            return self.wialon_unavailable_response(e)
         except APIProcessError as e:
             return error_response(
                 str(e),
@@ -110,7 +113,8 @@ class URAResource(TemplateView):
             )
 
         attempts = 0
-        attempts_limit = 20
+        attempts_limit = settings.URA_WIALON_RETRY_ATTEMPTS
+        deadline = time() + settings.URA_WIALON_RETRY_BUDGET
         last_error = ''
         while attempts < attempts_limit:
             try:
@@ -126,14 +130,22 @@ class URAResource(TemplateView):
                     code=e.code
                 )
 
+            except WialonUnavailable as e:
+                # Wialon недоступен - не держим воркер, а сразу просим повторить позже
+                return self.wialon_unavailable_response(e)
+
             except WialonException as e:
                 last_error = str(e)
                 attempts += 1
+                # повторяем, только пока укладываемся в бюджет времени запроса
+                if attempts >= attempts_limit \
+                        or time() + settings.URA_WIALON_RETRY_DELAY > deadline:
+                    break
+
                 print(
                     'Инициирую новую попытку доступа к Wialon. Последняя ошибка: %s' % last_error
                 )
-                # после каждого падения Виалона ждет 5 секунд и повторяем попытку
-                sleep(5)
+                sleep(settings.URA_WIALON_RETRY_DELAY)
 
             except (ValueError, IndexError, KeyError, AttributeError, TypeError) as e:
                 send_trigger_email(
@@ -169,7 +181,7 @@ class URAResource(TemplateView):
                 )
 
         send_trigger_email(
-            'Лимит попыток обращения в Wialon (%s) закончился' % attempts_limit,
+            'Лимит попыток обращения в Wialon (%s) закончился' % attempts,
             extra_data={
                 'Последняя ошибка': last_error,
                 'user': request.user
@@ -177,7 +189,7 @@ class URAResource(TemplateView):
         )
         return error_response(
             'Лимит попыток обращения в Wialon (%s) закончился. %s' % (
-                attempts_limit, last_error
+                attempts, last_error
             ),
             status=400,
             code='attempts_limit'
@@ -185,18 +197,34 @@ class URAResource(TemplateView):
 
     @method_decorator(csrf_exempt)
     def dispatch(self, request, *args, **kwargs):
-        response = self.dispatch_method(request, *args, **kwargs)
-        user = request.user if request.user.is_authenticated else None
+        profiler = get_request_profiler(request, self.__class__.__name__)
+        with profiler.activate():
+            try:
+                response = self.dispatch_method(request, *args, **kwargs)
+                user = request.user if request.user.is_authenticated else None
+
+                # рендерим ответ один раз: он же уйдет клиенту и в журнал
+                with profiler.span('render') as span:
+                    response.render()
+                    span.add(bytes=len(response.content))
+            finally:
+                profiler.finish()
 
-        JobLog.objects.create(
+        job_log_writer.write(
             job=self.job,
             url=self.request.path_info,
             request=self.request.body.decode('cp1251'),
             user=user,
-            response=response.rendered_content,
+            response=response.content.decode(response.charset),
             response_status=response.status_code
         )
-        gc.collect()
+        return response
+
+    @staticmethod
+    def wialon_unavailable_response(e):
+        response = error_response(str(e), status=503, code='wialon_unavailable')
+        if e.retry_after:
+            response['Retry-After'] = e.retry_after
         return response
 
     def authenticate(self, request):
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ura', '0024_auto_20180704_1422'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='points_cache_date_begin',
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name='Начало периода кэша точек'
+            ),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='points_cache_date_end',
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name='Окончание периода кэша точек'
+            ),
+        ),
+        migrations.AddField(
+            model_name='jobpoint',
+            name='start_fuel_level',
+            field=models.FloatField(
+                blank=True, null=True, verbose_name='Уровень топлива на входе, л'
+            ),
+        ),
+        migrations.AddField(
+            model_name='jobpoint',
+            name='end_fuel_level',
+            field=models.FloatField(
+                blank=True, null=True, verbose_name='Уровень топлива на выходе, л'
+            ),
+        ),
+        migrations.AddField(
+            model_name='jobpoint',
+            name='fuel_refill',
+            field=models.FloatField(blank=True, null=True, verbose_name='Заправлено, л'),
+        ),
+        migrations.AddField(
+            model_name='jobpoint',
+            name='fuel_drain',
+            field=models.FloatField(blank=True, null=True, verbose_name='Слито, л'),
+        ),
+        migrations.AddField(
+            model_name='jobpoint',
+            name='odometer',
+            field=models.FloatField(blank=True, null=True, verbose_name='Пробег, км'),
+        ),
+    ]
@@ -31,6 +31,13 @@ class Job(BasicModel, LastModMixin):
         on_delete=models.CASCADE
     )
 
+    points_cache_date_begin = models.DateTimeField(
+        _('Начало периода кэша точек'), blank=True, null=True
+    )
+    points_cache_date_end = models.DateTimeField(
+        _('Окончание периода кэша точек'), blank=True, null=True
+    )
+
     class Meta:
         verbose_name = _('Путевой лист')
         verbose_name_plural = _('Путевые листы')
@@ -87,6 +94,12 @@ class JobPoint(BasicModel, LastModMixin):
     )
     gpm_time = models.FloatField(_('Время работы ГПМ, сек'), blank=True, null=True)
 
+    start_fuel_level = models.FloatField(_('Уровень топлива на входе, л'), blank=True, null=True)
+    end_fuel_level = models.FloatField(_('Уровень топлива на выходе, л'), blank=True, null=True)
+    fuel_refill = models.FloatField(_('Заправлено, л'), blank=True, null=True)
+    fuel_drain = models.FloatField(_('Слито, л'), blank=True, null=True)
+    odometer = models.FloatField(_('Пробег, км'), blank=True, null=True)
+
     lat = models.FloatField(_('Широта входа в геозону'), null=True, blank=True)
     lng = models.FloatField(_('Долгота входа в геозону'), null=True, blank=True)
 
@@ -0,0 +1,91 @@
+import datetime
+from collections import OrderedDict
+
+from django.test import RequestFactory, TestCase
+from django.utils.timezone import utc
+
+from snippets.utils.datetime import utcnow
+from ura.models import Job
+from ura.views.moving import URAMovingResource
+from users.models import User
+
+
+class JobPointsCacheTestCase(TestCase):
+    """Кэш точек ПЛ: запись по закрытому периоду и чтение его же при следующем запросе"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='test')
+
+    def get_view(self, job, date_begin, date_end):
+        view = URAMovingResource()
+        view.request = RequestFactory().post('/api/ura/moving/')
+        view.request.user = self.user
+        view.input_data = {'date_begin': date_begin, 'date_end': date_end, 'unit_id': 1}
+        view.unit_id = 1
+        view.job = job
+        return view
+
+    def make_job(self, date_begin, date_end):
+        return Job.objects.create(
+            name='test', unit_id='1', route_id='1', date_begin=date_begin, date_end=date_end,
+            user=self.user
+        )
+
+    @staticmethod
+    def make_ride_point(time_in, time_out):
+        return {
+            'name': 'Точка',
+            'time_in': time_in,
+            'time_out': time_out,
+            'params': OrderedDict((
+                ('startFuelLevel', 10.0),
+                ('endFuelLevel', 8.0),
+                ('fuelRefill', .0),
+                ('fuelDrain', .0),
+                ('stopMinutes', .0),
+                ('moveMinutes', 600.0),
+                ('motoHours', 1200.0),
+                ('GPMTime', .0),
+                ('odoMeter', 5.0)
+            )),
+            'coords': {'lat': 52.6, 'lng': 39.6}
+        }
+
+    def test_closed_period(self):
+        date_begin = datetime.datetime(2019, 1, 1, 8, 0, tzinfo=utc)
+        date_end = datetime.datetime(2019, 1, 1, 20, 0, tzinfo=utc)
+        job = self.make_job(date_begin, date_end)
+
+        view = self.get_view(job, date_begin, date_end)
+        view.ride_points = [self.make_ride_point(
+            datetime.datetime(2019, 1, 1, 9, 0), datetime.datetime(2019, 1, 1, 10, 0)
+        )]
+        view.update_job_points_cache()
+
+        view = self.get_view(Job.objects.get(pk=job.pk), date_begin, date_end)
+        points = view.get_cached_job_points()
+        self.assertIsNotNone(points)
+        self.assertEqual(len(points), 1)
+
+        ride_points = view.get_cached_ride_points(points)
+        self.assertEqual(ride_points[0]['time_in'], datetime.datetime(2019, 1, 1, 9, 0))
+        self.assertEqual(ride_points[0]['params']['motoHours'], 1200.0)
+        self.assertEqual(ride_points[0]['params']['odoMeter'], 5.0)
+
+        # другой период запроса - кэш не подходит
+        view = self.get_view(
+            Job.objects.get(pk=job.pk), date_begin, date_end + datetime.timedelta(hours=1)
+        )
+        self.assertIsNone(view.get_cached_job_points())
+
+    def test_open_period(self):
+        date_end = utcnow()
+        date_begin = date_end - datetime.timedelta(hours=2)
+        job = self.make_job(date_begin, date_end)
+
+        view = self.get_view(job, date_begin, date_end)
+        view.ride_points = []
+        view.update_job_points_cache()
+
+        view = self.get_view(Job.objects.get(pk=job.pk), date_begin, date_end)
+        self.assertIsNone(view.get_cached_job_points())
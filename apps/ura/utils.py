@@ -1,5 +1,6 @@
 import datetime
 
+from django.conf import settings
 from django.template.defaultfilters import floatformat
 
 from base.exceptions import APIProcessError, AuthenticationFailed
@@ -9,6 +10,9 @@ from notifications import notifications
 from reports.utils import local_to_utc_time
 from ura.models import StandardJobTemplate
 from users.models import User
+from wialon.api.notifications import update_notification
+from wialon.batch import WialonBatch
+from wialon.exceptions import WialonException
 
 
 def float_format(value, arg=0):
@@ -61,13 +65,17 @@ def is_fixed_route(route_title):
     return route_title and 'фиксирован' in route_title.lower()
 
 
-def register_job_notifications(job, sess_id, routes_cache=None):
-    """Регистрация всех шаблонов уведомлений при создании путевого листа"""
+def register_jobs_notifications(jobs, sess_id, routes_cache=None):
+    """
+    Регистрация шаблонов уведомлений для пакета путевых листов.
+    Запросы resource/update_notification отправляются пачками через core/batch,
+    уже зарегистрированные для ПЛ уведомления (по названию) повторно не создаются.
+    :return: список ПЛ, регистрацию уведомлений которых нужно повторить
+    """
     # Если название шаблона задания известно и он не фиксированный
-    if not job.route_title or is_fixed_route(job.route_title):
-        return False
-
-    results = []
+    jobs = [j for j in jobs if j.route_title and not is_fixed_route(j.route_title)]
+    if not jobs:
+        return []
 
     available_notification_backends = (
         # 1. Съезд с маршрута
@@ -86,22 +94,59 @@ def register_job_notifications(job, sess_id, routes_cache=None):
         notifications.route_overstatement_notification
     )
 
-    job_template = StandardJobTemplate.objects.filter(wialon_id=job.route_id).first()
+    job_templates = {
+        t.wialon_id: t for t in StandardJobTemplate.objects.filter(
+            wialon_id__in={str(j.route_id) for j in jobs}
+        )
+    }
+
+    registered = set(
+        Notification.objects.filter(job__in=jobs).values_list('job_id', 'sent_data__n')
+    )
 
-    for backend in available_notification_backends:
+    requests_list = []
+    for job in jobs:
+        job_template = job_templates.get(str(job.route_id))
+
+        for backend in available_notification_backends:
+            try:
+                for data in backend(
+                    job, sess_id, routes_cache=routes_cache, job_template=job_template
+                ):
+                    if (job.pk, data['n']) not in registered:
+                        requests_list.append((job, data))
+            except NotificationError as e:
+                print(str(e))
+
+    failed_jobs = {}
+    batch_size = settings.NOTIFICATIONS_BATCH_SIZE
+    for i in range(0, len(requests_list), batch_size):
+        chunk = requests_list[i:i + batch_size]
         try:
-            result = backend(job, sess_id, routes_cache=routes_cache, job_template=job_template)
-            results.extend(tuple(result))
-        except NotificationError as e:
+            with WialonBatch(sess_id) as batch:
+                calls = [update_notification(data, sess_id, batch=batch) for _, data in chunk]
+        except WialonException as e:
             print(str(e))
-
-    for wialon_id, received_data, sent_data in results:
-        Notification.objects.create(
-            job=job,
-            wialon_id=wialon_id,
-            sent_data=sent_data,
-            received_data=received_data,
-            expired_at=job.date_end + datetime.timedelta(seconds=60 * 10)
-        )
-
-    return True
+            failed_jobs.update((job.pk, job) for job, _ in chunk)
+            continue
+
+        notifications_list = []
+        for (job, data), call in zip(chunk, calls):
+            try:
+                result = call.result
+            except WialonException as e:
+                print(str(e))
+                failed_jobs[job.pk] = job
+                continue
+
+            notifications_list.append(Notification(
+                job=job,
+                wialon_id=result[0],
+                sent_data=data,
+                received_data=result[1],
+                expired_at=job.date_end + datetime.timedelta(seconds=60 * 10)
+            ))
+
+        Notification.objects.bulk_create(notifications_list)
+
+    return list(failed_jobs.values())
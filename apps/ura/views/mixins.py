@@ -1,17 +1,26 @@
+import datetime
 import traceback
 from collections import OrderedDict
 
 from base.exceptions import ReportException, APIProcessError
-from base.utils import get_distance, get_point_type, parse_float
+from base.intervals import IntervalIndex
+from base.series import TimeSeries
+from base.timing import get_profiler
+from base.track import Track
+from base.utils import get_point_type, parse_float
+from django.conf import settings
 from django.db import transaction
-from reports.utils import get_period, cleanup_and_request_report, exec_report, get_report_rows, \
-    get_wialon_report_template_id, parse_wialon_report_datetime, local_to_utc_time
+from reports.utils import get_period, cleanup_and_request_report, exec_report, \
+    get_wialon_report_template_id, parse_wialon_cell_datetime, local_to_utc_time, \
+    get_wialon_report_resource_id, iter_report_tables
+from snippets.utils.datetime import utcnow
 from snippets.utils.email import send_trigger_email
 from ura.lib.resources import URAResource
-from ura.models import JobPoint
+from ura.models import Job, JobPoint
 from ura.utils import parse_datetime, parse_xml_input_data
 from wialon.api import get_routes, get_messages
 from wialon.auth import get_wialon_session_key
+from wialon.batch import WialonBatch
 from wialon.exceptions import WialonException
 
 
@@ -25,14 +34,18 @@ class BaseUraRidesView(URAResource):
     def __init__(self, **kwargs):
         super(BaseUraRidesView, self).__init__(**kwargs)
         self.current_distance = .0
+        # индекс сообщения, от которого считается пробег текущего участка
+        self.distance_start = 0
         self.input_data = None
         self.job = None
         self.messages = []
+        self.report_resource_id = None
         self.report_template_id = None
         self.request_dt_from = None
         self.request_dt_to = None
         self.report_data = {}
         self.fuel_data = OrderedDict()
+        self.fuel_levels = TimeSeries()
         self.route = None
         self.route_point_names = []
         self.sess_id = None
@@ -52,9 +65,19 @@ class BaseUraRidesView(URAResource):
         raise NotImplementedError
 
     def get_geozones_report_template_id(self):
-        self.report_template_id = get_wialon_report_template_id(
-            'geozones', self.request.user, self.sess_id
-        )
+        # заодно одним пакетом получаем ID ресурса и прогреваем кэш маршрутов
+        with WialonBatch(self.sess_id) as batch:
+            template_call = get_wialon_report_template_id(
+                'geozones', self.request.user, self.sess_id, batch=batch
+            )
+            resource_call = get_wialon_report_resource_id(
+                self.request.user, self.sess_id, batch=batch
+            )
+            routes_call = get_routes(self.sess_id, with_points=True, batch=batch)
+
+        self.report_template_id = template_call.result
+        self.report_resource_id = resource_call.get()
+        routes_call.get()
         if self.report_template_id is None:
             raise APIProcessError(
                 'Не указан ID шаблона отчета по геозонам у текущего пользователя',
@@ -88,57 +111,61 @@ class BaseUraRidesView(URAResource):
             self.input_data['date_end']
         )
 
-        cleanup_and_request_report(
-            self.request.user, self.report_template_id, self.sess_id, item_id=self.unit_id)
-
-        try:
-            r = exec_report(
-                self.request.user,
-                self.report_template_id,
-                self.sess_id,
-                self.request_dt_from,
-                self.request_dt_to,
-                object_id=self.unit_id
-            )
-        except ReportException as e:
-            raise WialonException('Не удалось получить в Wialon отчет о поездках: %s' % e)
-
-        for table_index, table_info in enumerate(r['reportResult']['tables']):
-            if table_info['name'] not in self.report_data:
-                continue
+        profiler = get_profiler()
+        with profiler.span('exec_report', unit=self.unit_id):
+            cleanup_and_request_report(
+                self.request.user, self.report_template_id, self.sess_id, item_id=self.unit_id)
 
             try:
-                rows = get_report_rows(
+                r = exec_report(
+                    self.request.user,
+                    self.report_template_id,
                     self.sess_id,
-                    table_index,
-                    table_info['rows'],
-                    level=1
+                    self.request_dt_from,
+                    self.request_dt_to,
+                    report_resource_id=self.report_resource_id,
+                    object_id=self.unit_id
                 )
+            except ReportException as e:
+                raise WialonException('Не удалось получить в Wialon отчет о поездках: %s' % e)
 
-                if table_info['name'] != 'unit_sensors_tracing':
-                    self.report_data[table_info['name']] = rows
+        tables, names = {}, {}
+        for table_index, table_info in enumerate(r['reportResult']['tables']):
+            if table_info['name'] in self.report_data:
+                tables[table_index] = (table_index, table_info['rows'], 1)
+                names[table_index] = table_info['name']
+
+        try:
+            pages = profiler.iterate(
+                'fetch_tables', iter_report_tables(self.sess_id, tables), unit=self.unit_id
+            )
+            for table_index, rows in pages:
+                name = names[table_index]
+                if name != 'unit_sensors_tracing':
+                    self.report_data[name].extend(rows)
                 else:
                     for row in rows:
-                        if isinstance(row['c'][0], dict):
-                            key = row['c'][0]['v']
-                        else:
-                            key = parse_wialon_report_datetime(row['c'][0])
-                            key = int(
-                                local_to_utc_time(key, self.request.user.timezone).timestamp()
-                            )
+                        key = parse_wialon_cell_datetime(
+                            row['c'][0], self.request.user.timezone
+                        )
+                        key = int(key.timestamp()) if key else None
                         if key and row['c'][1]:
                             self.fuel_data[key] = parse_float(row['c'][1]) or .0
 
-            except ReportException as e:
-                raise WialonException('Не удалось получить в Wialon отчет о поездках: %s' % e)
+        except ReportException as e:
+            raise WialonException('Не удалось получить в Wialon отчет о поездках: %s' % e)
+
+        self.fuel_levels = TimeSeries(self.fuel_data.items())
 
     def get_object_messages(self):
-        self.messages = list(filter(
-            lambda x: x['pos'] is not None,
-            get_messages(
-                self.unit_id, self.request_dt_from, self.request_dt_to, self.sess_id
-            )['messages']
-        ))
+        with get_profiler().span('fetch_messages', unit=self.unit_id) as span:
+            self.messages = list(filter(
+                lambda x: x['pos'] is not None,
+                get_messages(
+                    self.unit_id, self.request_dt_from, self.request_dt_to, self.sess_id
+                )['messages']
+            ))
+            span.add(messages=len(self.messages))
 
         return self.messages
 
@@ -251,68 +278,51 @@ class BaseUraRidesView(URAResource):
                 self.unit_zones_visit[-1]['time_out'] = self.request_dt_to
 
     def get_fuel_level(self, message):
-        timestamp = message['t']
-        if timestamp in self.fuel_data:
-            return self.fuel_data[timestamp]
-
-        t = 0
-        for t in self.fuel_data.keys():
-            if t >= timestamp:
-                return self.fuel_data[t]
-
-        # берем последнее известное
-        if t:
-            return self.fuel_data[t]
-
-        return .0
+        return self.fuel_levels.get(
+            message['t'], interpolate=settings.URA_FUEL_LEVEL_INTERPOLATE
+        )
 
     def process_messages(self):
         prev_message = None
         current_geozone = None
         messages_length0 = len(self.messages) - 1
+        zones_visit_index = IntervalIndex(self.unit_zones_visit)
+
+        # накопленный пробег по сообщениям считаем за один проход
+        track = Track(self.messages)
+        self.distance_start = 0
 
         for i, message in enumerate(self.messages):
-            message['distance'] = .0
-
-            if prev_message:
-                try:
-                    # получаем пройденное расстояние для предыдущей точки
-                    # TODO: попробовать через geopy
-                    prev_message['distance'] = get_distance(
-                        prev_message['pos']['x'],
-                        prev_message['pos']['y'],
-                        message['pos']['x'],
-                        message['pos']['y']
-                    )
-                except (ValueError, IndexError, KeyError, AttributeError, TypeError) as e:
-                    send_trigger_email(
-                        'Ошибка в работе интеграции Wialon', extra_data={
-                            'POST': self.request.body,
-                            'prev_message': prev_message,
-                            'message': message,
-                            'Exception': str(e),
-                            'Traceback': traceback.format_exc(),
-                            'user': self.request.user
-                        }
-                    )
+            if i in track.errors:
+                e = track.errors[i]
+                send_trigger_email(
+                    'Ошибка в работе интеграции Wialon', extra_data={
+                        'POST': self.request.body,
+                        'prev_message': prev_message,
+                        'message': message,
+                        'Exception': str(e),
+                        'Traceback': ''.join(
+                            traceback.format_exception(type(e), e, e.__traceback__)
+                        ),
+                        'user': self.request.user
+                    }
+                )
 
             # находим по времени в сообщении наличие на момент времени в геозоне
-            found_geozone = False
-            for geozone in self.unit_zones_visit:
+            geozone = zones_visit_index.find(message['t'])
+            found_geozone = geozone is not None
 
-                # если точка входит по времени в геозону
-                if geozone['time_in'] <= message['t'] <= geozone['time_out']:
+            # если точка входит по времени в геозону
+            # и текущая геозона сменилась - закрываем предыдущую, открывая новую
+            if found_geozone \
+                    and (not current_geozone or geozone['name'] != current_geozone['name']):
+                self.add_new_point(message, prev_message, geozone)
+                current_geozone = geozone
+                # отрезок от предыдущей точки относится к новой геозоне
+                self.distance_start = max(i - 1, 0)
 
-                    # и текущая геозона сменилась - закрываем предыдущую, открывая новую
-                    if not current_geozone or geozone['name'] != current_geozone['name']:
-                        self.add_new_point(message, prev_message, geozone)
-                        current_geozone = geozone
-
-                    found_geozone = True
-                    break
-
-            if prev_message:
-                self.current_distance += prev_message['distance']
+            # пробег участка - от точки, с которой он начат, до текущей
+            self.current_distance = track.get_distance(self.distance_start, i)
 
             if not found_geozone:
                 if self.ride_points and self.ride_points[-1]['name'] == 'SPACE':
@@ -327,6 +337,7 @@ class BaseUraRidesView(URAResource):
                         'time_in': message['t'],
                         'time_out': message['t']
                     })
+                    self.distance_start = i
 
             # если сообщение последнее, то закрываем пробег последнего участка
             if i == messages_length0:
@@ -390,28 +401,110 @@ class BaseUraRidesView(URAResource):
 
         self.ride_points.append(new_point)
 
+    def get_cache_period(self):
+        """Период запроса в UTC (datetime с часовым поясом), за который посчитан кэш точек"""
+        return self.input_data['date_begin'], self.input_data['date_end']
+
+    def is_period_closed(self):
+        """Период запроса и ПЛ закончились достаточно давно, данные по ним больше не изменятся"""
+        border = utcnow() - datetime.timedelta(seconds=settings.URA_JOB_POINTS_CACHE_MIN_AGE)
+        return self.get_cache_period()[1] < border and self.job.date_end < border
+
     def update_job_points_cache(self):
         """Обновляем кэш пройденных точек"""
+        # переиспользовать кэш можно, только если он посчитан за закрытый период
+        cache_period = self.get_cache_period() if self.is_period_closed() else (None, None)
+
+        points = []
+        for point in self.ride_points:
+            time_in = point['time_in']
+            time_out = point['time_out']
+            total_time = (time_out - time_in).total_seconds()
+            move_time = point['params']['moveMinutes']
+
+            points.append(JobPoint(
+                job=self.job,
+                title=point['name'],
+                point_type=get_point_type(point['name']),
+                enter_date_time=time_in,
+                leave_date_time=time_out,
+                total_time=total_time,
+                parking_time=total_time - move_time,
+                move_time=move_time,
+                motohours_time=point['params']['motoHours'],
+                gpm_time=point['params']['GPMTime'],
+                start_fuel_level=point['params']['startFuelLevel'],
+                end_fuel_level=point['params']['endFuelLevel'],
+                fuel_refill=point['params']['fuelRefill'],
+                fuel_drain=point['params']['fuelDrain'],
+                odometer=point['params']['odoMeter'],
+                lat=point['coords']['lat'],
+                lng=point['coords']['lng']
+            ))
+
         with transaction.atomic():
             self.job.points.all().delete()
+            JobPoint.objects.bulk_create(points)
+            Job.objects.filter(pk=self.job.pk).update(
+                points_cache_date_begin=cache_period[0], points_cache_date_end=cache_period[1]
+            )
+        self.job.points_cache_date_begin, self.job.points_cache_date_end = cache_period
+
+    def get_cached_job_points(self):
+        """
+        Точки ПЛ из кэша, если он посчитан за тот же закрытый период, что и запрос.
+        :return: список JobPoint либо None, если кэш использовать нельзя
+        """
+        self.request_dt_from, self.request_dt_to = get_period(
+            self.input_data['date_begin'],
+            self.input_data['date_end']
+        )
 
-            for point in self.ride_points:
-                time_in = point['time_in']
-                time_out = point['time_out']
-                total_time = (time_out - time_in).total_seconds()
-                move_time = point['params']['moveMinutes']
-
-                JobPoint.objects.create(
-                    job=self.job,
-                    title=point['name'],
-                    point_type=get_point_type(point['name']),
-                    enter_date_time=time_in,
-                    leave_date_time=time_out,
-                    total_time=total_time,
-                    parking_time=total_time - move_time,
-                    move_time=move_time,
-                    motohours_time=point['params']['motoHours'],
-                    gpm_time=point['params']['GPMTime'],
-                    lat=point['coords']['lat'],
-                    lng=point['coords']['lng']
+        cache_dt_from, cache_dt_to = self.get_cache_period()
+        if str(self.job.unit_id) != str(self.unit_id) \
+                or self.job.points_cache_date_begin != cache_dt_from \
+                or self.job.points_cache_date_end != cache_dt_to \
+                or not self.is_period_closed():
+            return None
+
+        return list(self.job.points.order_by('id'))
+
+    def get_cached_ride_points(self, job_points, timestamps=False):
+        """
+        Восстанавливает точки пробега из кэша (время входа и выхода - местное).
+        :param timestamps: вернуть время как UTC timestamp, как после process_messages
+        """
+        ride_points = []
+        for point in job_points:
+            # в кэш пишется местное время без часового пояса
+            time_in = point.enter_date_time.replace(tzinfo=None)
+            time_out = point.leave_date_time.replace(tzinfo=None)
+            if timestamps:
+                time_in = int(local_to_utc_time(time_in, self.request.user.timezone).timestamp())
+                time_out = int(
+                    local_to_utc_time(time_out, self.request.user.timezone).timestamp()
                 )
+
+            ride_points.append({
+                'name': point.title,
+                'time_in': time_in,
+                'time_out': time_out,
+                'type': point.point_type,
+                'params': OrderedDict((
+                    ('startFuelLevel', point.start_fuel_level or .0),
+                    ('endFuelLevel', point.end_fuel_level or .0),
+                    ('fuelRefill', point.fuel_refill or .0),
+                    ('fuelDrain', point.fuel_drain or .0),
+                    ('stopMinutes', point.parking_time or .0),
+                    ('moveMinutes', point.move_time or .0),
+                    ('motoHours', point.motohours_time or .0),
+                    ('GPMTime', point.gpm_time or .0),
+                    ('odoMeter', point.odometer or .0)
+                )),
+                'coords': {
+                    'lat': point.lat,
+                    'lng': point.lng
+                }
+            })
+
+        return ride_points
@@ -2,6 +2,7 @@ import datetime
 from collections import OrderedDict
 
 from base.exceptions import APIProcessError
+from base.intervals import IntervalIndex
 from base.utils import parse_float
 from reports.utils import utc_to_local_time, parse_wialon_report_datetime
 from snippets.utils.datetime import utcnow
@@ -36,7 +37,8 @@ class URAMovingResource(BaseUraRidesView):
             'unit_zones_visit': []
         }
 
-    def report_post_processing(self, unit_info):
+    def set_points_job(self):
+        """Отмечаем точки, пройденные в рамках ПЛ"""
         job_date_begin = utc_to_local_time(
             self.job.date_begin.replace(tzinfo=None), self.request.user.timezone
         )
@@ -44,6 +46,11 @@ class URAMovingResource(BaseUraRidesView):
             self.job.date_end.replace(tzinfo=None), self.request.user.timezone
         )
 
+        for point in self.ride_points:
+            if point['time_in'] >= job_date_begin and point['time_out'] <= job_date_end:
+                point['job_id'] = self.job.pk
+
+    def report_post_processing(self, unit_info):
         for point in self.ride_points:
             point['time_in'] = utc_to_local_time(
                 datetime.datetime.utcfromtimestamp(point['time_in']),
@@ -54,8 +61,8 @@ class URAMovingResource(BaseUraRidesView):
                 self.request.user.timezone
             )
 
-            if point['time_in'] >= job_date_begin and point['time_out'] <= job_date_end:
-                point['job_id'] = self.job.pk
+        self.set_points_job()
+        points_index = IntervalIndex(self.ride_points)
 
         for row in self.report_data['unit_thefts']:
             volume = parse_float(row['c'][2])
@@ -70,10 +77,9 @@ class URAMovingResource(BaseUraRidesView):
                     self.request.user.timezone
                 )
 
-                for point in self.ride_points:
-                    if point['time_in'] <= dt <= point['time_out']:
-                        point['params']['fuelDrain'] += volume
-                        break
+                point = points_index.find(dt)
+                if point is not None:
+                    point['params']['fuelDrain'] += volume
 
         for row in self.report_data['unit_fillings']:
             volume = parse_float(row['c'][1])
@@ -88,10 +94,9 @@ class URAMovingResource(BaseUraRidesView):
                     self.request.user.timezone
                 )
 
-                for point in self.ride_points:
-                    if point['time_in'] <= dt <= point['time_out']:
-                        point['params']['fuelRefill'] += volume
-                        break
+                point = points_index.find(dt)
+                if point is not None:
+                    point['params']['fuelRefill'] += volume
 
         # рассчитываем моточасы пропорционально интервалам
         for row in self.report_data['unit_engine_hours']:
@@ -117,21 +122,9 @@ class URAMovingResource(BaseUraRidesView):
                     self.request.user.timezone
                 )
 
-            for point in self.ride_points:
-                if point['time_in'] > time_until:
-                    # дальнейшие строки точно не совпадут (виалон все сортирует по дате)
-                    break
-
-                # если интервал точки меньше даты начала моточасов, значит еще не дошли
-                if point['time_out'] < time_from:
-                    continue
-
-                delta = min(time_until, point['time_out']) - max(time_from, point['time_in'])
-                # не пересекаются:
-                if delta.total_seconds() <= 0:
-                    continue
-
-                point['params']['motoHours'] += delta.total_seconds()
+            for point, max_from, min_to in points_index.overlaps(
+                    time_from, time_until, strict=True):
+                point['params']['motoHours'] += (min_to - max_from).total_seconds()
 
         for row in self.report_data['unit_chronology']:
             row_data = row['c']
@@ -165,22 +158,9 @@ class URAMovingResource(BaseUraRidesView):
                     self.request.user.timezone
                 )
 
-            for point in self.ride_points:
-                if point['time_in'] > time_until:
-                    # дальнейшие строки точно не совпадут (виалон все сортирует по дате)
-                    break
-
-                # если интервал точки меньше даты начала хронологии, значит еще не дошли
-                if point['time_out'] < time_from:
-                    continue
-
-                delta = min(time_until, point['time_out']) - max(time_from, point['time_in'])
-                # не пересекаются:
-                if delta.total_seconds() < 0:
-                    continue
-
-                if row_data[0].lower() in ('поездка', 'trip'):
-                    point['params']['moveMinutes'] += delta.total_seconds()
+            if row_data[0].lower() in ('поездка', 'trip'):
+                for point, max_from, min_to in points_index.overlaps(time_from, time_until):
+                    point['params']['moveMinutes'] += (min_to - max_from).total_seconds()
 
         # рассчитываем время работы крановой установки пропорционально интервалам
         # (только лишь ради кэша, необходимости в расчетах нет)
@@ -207,21 +187,9 @@ class URAMovingResource(BaseUraRidesView):
                     self.request.user.timezone
                 )
 
-            for point in self.ride_points:
-                if point['time_in'] > time_until:
-                    # дальнейшие строки точно не совпадут (виалон все сортирует по дате)
-                    break
-
-                # если интервал точки меньше даты начала моточасов, значит еще не дошли
-                if point['time_out'] < time_from:
-                    continue
-
-                delta = min(time_until, point['time_out']) - max(time_from, point['time_in'])
-                # не пересекаются:
-                if delta.total_seconds() <= 0:
-                    continue
-
-                point['params']['GPMTime'] += delta.total_seconds()
+            for point, max_from, min_to in points_index.overlaps(
+                    time_from, time_until, strict=True):
+                point['params']['GPMTime'] += (min_to - max_from).total_seconds()
 
         for point in self.ride_points:
             point['params']['stopMinutes'] = (
@@ -277,11 +245,17 @@ class URAMovingResource(BaseUraRidesView):
             self.get_input_data(unit_el)
             self.unit_id = int(self.input_data.get('unit_id'))
             self.get_job()
-            self.get_route()
-            self.get_report_data()
-            self.get_object_messages()
 
-            self.ride_points = []
+            # по давно закончившимся ПЛ отвечаем из кэша точек, не запрашивая Wialon
+            cached_points = self.get_cached_job_points()
+            if cached_points is None:
+                self.get_route()
+                self.get_report_data()
+                self.get_object_messages()
+                self.ride_points = []
+            else:
+                self.ride_points = self.get_cached_ride_points(cached_points)
+
             unit_info = {
                 'id': self.unit_id,
                 'date_begin': utc_to_local_time(
@@ -291,10 +265,14 @@ class URAMovingResource(BaseUraRidesView):
                 'points': self.ride_points
             }
 
-            self.prepare_geozones_visits()
-            self.process_messages()
-            self.report_post_processing(unit_info)
-            self.update_job_points_cache()
+            if cached_points is None:
+                self.prepare_geozones_visits()
+                self.process_messages()
+                self.report_post_processing(unit_info)
+                self.update_job_points_cache()
+            else:
+                self.set_points_job()
+
             self.prepare_output_data()
 
             units.append(unit_info)
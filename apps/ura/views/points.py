@@ -28,7 +28,7 @@ class URAPointsResource(URAResource):
 
         sess_id = get_wialon_session_key(request.user)
         try:
-            points = get_points(request.user)
+            points = get_points(sess_id, user=request.user)
         except APIProcessError as e:
             return error_response(str(e), code=e.code)
         finally:
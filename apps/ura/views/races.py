@@ -3,6 +3,7 @@ from collections import OrderedDict
 import datetime
 
 from base.exceptions import APIProcessError
+from base.intervals import IntervalIndex
 from reports.utils import utc_to_local_time, parse_wialon_report_datetime
 from snippets.utils.datetime import utcnow
 from snippets.utils.email import send_trigger_email
@@ -152,8 +153,8 @@ class URARacesResource(BaseUraRidesView, URAResource):
                     point_info['params']['fuelLevelIn'] = row['params']['startFuelLevel']
                     point_info['params']['distanceIn'] = distance_delta
 
-                # время движения получим из хронологии
-                point_info['params']['moveTime'] = .0
+                # время движения получим из хронологии (для точек из кэша оно уже известно)
+                point_info['params']['moveTime'] = row['params']['moveMinutes']
 
                 race['points'].append(point_info)
 
@@ -213,6 +214,7 @@ class URARacesResource(BaseUraRidesView, URAResource):
                     self.request.user.timezone
                 )
 
+        races_indexes = [IntervalIndex(race['points']) for race in job_info['races']]
         for row in self.report_data['unit_chronology']:
             row_data = row['c']
 
@@ -251,22 +253,9 @@ class URARacesResource(BaseUraRidesView, URAResource):
                     self.request.user.timezone
                 )
 
-            for race in job_info['races']:
-                for point in race['points']:
-                    if point['time_in'] > time_until:
-                        # дальнейшие строки точно не совпадут (виалон все сортирует по дате)
-                        break
-
-                    # если интервал точки меньше даты начала моточасов, значит еще не дошли
-                    if point['time_out'] < time_from:
-                        continue
-
-                    delta = min(time_until, point['time_out']) - max(time_from, point['time_in'])
-                    # не пересекаются:
-                    if delta.total_seconds() < 0:
-                        continue
-
-                    point['params']['moveTime'] += delta.total_seconds()
+            for points_index in races_indexes:
+                for point, max_from, min_to in points_index.overlaps(time_from, time_until):
+                    point['params']['moveTime'] += (min_to - max_from).total_seconds()
 
     def post(self, request, **kwargs):
         jobs = []
@@ -293,12 +282,18 @@ class URARacesResource(BaseUraRidesView, URAResource):
             self.get_route()
             self.points_dict_by_name = {x['name']: x['id'] for x in self.route['points']}
 
-            self.get_report_data()
-            self.get_object_messages()
-            self.prepare_geozones_visits()
+            # по давно закончившимся ПЛ берем точки из кэша, не запрашивая Wialon
+            cached_points = self.get_cached_job_points()
+            if cached_points is None:
+                self.get_report_data()
+                self.get_object_messages()
+                self.prepare_geozones_visits()
 
-            self.ride_points = []
-            self.process_messages()
+                self.ride_points = []
+                self.process_messages()
+            else:
+                self.get_report_data_tables()
+                self.ride_points = self.get_cached_ride_points(cached_points, timestamps=True)
 
             races = []
             job_info = {
@@ -1,10 +1,14 @@
+from django.db import transaction
+
+from notifications.queue import notification_queue
 from snippets.utils.datetime import utcnow
 from ura import models
 from ura.lib.resources import URAResource
 from ura.lib.response import XMLResponse, error_response
-from ura.utils import parse_xml_input_data, parse_datetime, register_job_notifications
+from ura.utils import parse_xml_input_data, parse_datetime
 from wialon.api import get_routes, get_units
 from wialon.auth import get_wialon_session_key, logout_session
+from wialon.batch import WialonBatch
 
 
 class URASetJobsResource(URAResource):
@@ -26,53 +30,62 @@ class URASetJobsResource(URAResource):
         jobs_els = request.data.xpath('/setJobs/job')
         sess_id = get_wialon_session_key(request.user)
 
-        if jobs_els:
-
-            for j in jobs_els:
-                data = parse_xml_input_data(request, self.model_mapping, j)
-
-                name = data.get('name')
-                if not name:
-                    logout_session(request.user, sess_id)
-                    return error_response('Не указан параметр jobName', code='jobName_not_found')
-
-                routes = get_routes(sess_id, with_points=True)
-                units = get_units(sess_id)
-
-                routes_ids = [x['id'] for x in routes]
-                if data['route_id'] not in routes_ids:
-                    return error_response(
-                        'Шаблон задания idRoute неверный или не принадлежит текущей организации',
-                        code='route_permission'
+        try:
+            if jobs_els:
+                # маршруты и объекты получаем один раз на весь пакет ПЛ
+                with WialonBatch(sess_id) as batch:
+                    routes_call = get_routes(
+                        sess_id, with_points=True, user=request.user, batch=batch
                     )
+                    units_call = get_units(sess_id, user=request.user, batch=batch)
 
+                routes_cache = {r['id']: r for r in routes_call.result}
                 units_cache = {
                     u['id']: '%s (%s) [%s]' % (u['name'], u['number'], u['vin'])
-                    for u in units
+                    for u in units_call.result
                 }
 
-                try:
-                    data['unit_title'] = units_cache.get(int(data['unit_id']))
-                except (ValueError, TypeError, AttributeError):
-                    pass
+                # сначала проверяем все ПЛ, и только потом сохраняем их разом
+                for j in jobs_els:
+                    data = parse_xml_input_data(request, self.model_mapping, j)
 
-                if not data['unit_title']:
-                    return error_response(
-                        'Объект ID=%s не найден в текущем ресурсе организации' % data['unit_id'],
-                        code='unit_not_found_permission'
-                    )
+                    name = data.get('name')
+                    if not name:
+                        return error_response(
+                            'Не указан параметр jobName', code='jobName_not_found'
+                        )
+
+                    if data['route_id'] not in routes_cache:
+                        return error_response(
+                            'Шаблон задания idRoute неверный или не принадлежит текущей '
+                            'организации',
+                            code='route_permission'
+                        )
+
+                    try:
+                        data['unit_title'] = units_cache.get(int(data['unit_id']))
+                    except (ValueError, TypeError, AttributeError):
+                        pass
+
+                    if not data['unit_title']:
+                        return error_response(
+                            'Объект ID=%s не найден в текущем ресурсе организации' %
+                            data['unit_id'],
+                            code='unit_not_found_permission'
+                        )
+
+                    data['route_title'] = routes_cache[data['route_id']].get('name')
+                    data['user'] = request.user
+                    jobs.append(self.model(**data))
+
+                with transaction.atomic():
+                    jobs = self.model.objects.bulk_create(jobs)
 
-                routes_cache = {r['id']: r for r in routes}
-                try:
-                    data['route_title'] = routes_cache.get(int(data['route_id']), {}).get('name')
-                except (ValueError, TypeError, AttributeError):
-                    pass
-
-                data['user'] = request.user
-                self.job = self.model.objects.create(**data)
-                register_job_notifications(self.job, sess_id, routes_cache=routes_cache)
-                logout_session(request.user, sess_id)
-                jobs.append(self.job)
+                self.job = jobs[-1]
+                # уведомления регистрируются в фоне, ответ отдаем сразу после сохранения ПЛ
+                notification_queue.enqueue([j.pk for j in jobs])
+        finally:
+            logout_session(request.user, sess_id)
 
         context = self.get_context_data(**kwargs)
         context.update({
@@ -5,6 +5,7 @@ from django.utils.translation import ugettext_lazy as _
 from snippets.admin import activate_action, deactivate_action
 from users.forms import UserAdminForm, UserCreationForm
 from users import models
+from wialon.api import invalidate_resolver_cache
 
 
 class UserTotalReportUserInline(admin.TabularInline):
@@ -79,6 +80,12 @@ class UserAdmin(UserAdmin):
         ('total_report', _('Сводные отчеты'))
     )
 
+    def save_model(self, request, obj, form, change):
+        super(UserAdmin, self).save_model(request, obj, form, change)
+        if change and any(x.startswith('wialon_') for x in form.changed_data):
+            # имена ресурса, группового объекта или шаблонов могли измениться
+            invalidate_resolver_cache(obj)
+
     def get_actions(self, request):
         actions = super(UserAdmin, self).get_actions(request)
         if 'delete_selected' in actions and not request.user.is_superuser:
@@ -0,0 +1,50 @@
+from time import sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from base.exceptions import APIProcessError
+from users.models import User
+from wialon.exceptions import WialonException
+from wialon.sessions import session_store
+
+
+def keep_wialon_sessions(size=settings.WIALON_SESSION_POOL_SIZE):
+    """Поддерживает пул заранее открытых сессий Wialon пользователей организаций"""
+    users = User.objects.filter(
+        is_active=True, supervisor__isnull=False, wialon_username__isnull=False
+    ).exclude(wialon_username='')
+
+    for user in users:
+        try:
+            refreshed, dropped = session_store.keepalive_pool(user)
+            created = session_store.fill_pool(user, size=size)
+        except (APIProcessError, WialonException) as e:
+            print('User %s: session pool error: %s' % (user, e))
+            continue
+
+        if refreshed or dropped or created:
+            print('User %s: %s sessions refreshed, %s dropped, %s created' % (
+                user, refreshed, dropped, created
+            ))
+
+
+class Command(BaseCommand):
+    help = 'Поддерживает пул открытых сессий Wialon (разово либо в цикле с ключом --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true', default=False,
+            help='Работать в цикле, с паузой WIALON_SESSION_KEEPALIVE_INTERVAL сек'
+        )
+        parser.add_argument(
+            '--size', type=int, default=settings.WIALON_SESSION_POOL_SIZE,
+            help='Количество открытых сессий на пользователя'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            keep_wialon_sessions(size=options['size'])
+            if not options['loop']:
+                break
+            sleep(settings.WIALON_SESSION_KEEPALIVE_INTERVAL)
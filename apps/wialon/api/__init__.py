@@ -1,26 +1,185 @@
 import json
+import threading
+import time
 
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.db import connection
 
-import requests
 from snippets.utils.email import send_trigger_email
 
 from wialon import DEFAULT_CACHE_TIMEOUT
-from wialon.exceptions import WialonException
-from wialon.utils import process_error, load_requests_json
+from wialon.client import wialon_client
+from wialon.exceptions import WialonException, WialonNotFound
+from wialon.sessions import session_store
+from wialon.batch import BatchCall
+from wialon.utils import process_error
+
+
+def search_items(request_params, sess_id, parser, batch=None):
+    """
+    Выполняет поиск core/search_items и разбирает ответ parser-ом.
+    Если передан пакет batch, вызов откладывается до его отправки и возвращается BatchCall
+    """
+    if batch is not None:
+        return batch.add('core/search_items', request_params, parser=parser)
+
+    return parser(wialon_client.call('core/search_items', request_params, sess_id))
+
+
+def get_cache_key(name, sess_id, user=None, suffix=None):
+    """
+    Ключ кэша данных Wialon. Данные привязываются к пользователю (учетной записи Wialon),
+    а не к сессии, поэтому переживают смену сессии. Если пользователь неизвестен -
+    ключ строится по сессии
+    """
+    user_id = user.pk if user is not None else session_store.get_session_user_id(sess_id)
+    scope = ('user:%s' % user_id) if user_id else ('sid:%s' % sess_id)
+    key = '%s:%s' % (name, scope)
+    return key if suffix is None else '%s:%s' % (key, suffix)
+
+
+def get_session_owner(sess_id, user=None):
+    """Пользователь, из пула которого выдана сессия (None, если сессия открыта не через пул)"""
+    if user is not None:
+        return user
+
+    user_id = session_store.get_session_user_id(sess_id)
+    if user_id is None:
+        return None
+    return get_user_model().objects.filter(pk=user_id).first()
+
+
+def refresh_cache_in_background(cache_key, refresh, owner):
+    """
+    Обновляет устаревший кэш в фоновом потоке (не более одного обновления на ключ).
+    Сессия вызывающего к этому времени может быть возвращена в пул и выдана другому запросу,
+    поэтому поток берет свою сессию из пула владельца и возвращает ее после обновления
+    """
+    if not cache.add('refresh:%s' % cache_key, 1, settings.WIALON_CACHE_REFRESH_LOCK_TIMEOUT):
+        return
+
+    def run():
+        sess_id = None
+        try:
+            sess_id = session_store.get_session_key(owner)
+            refresh(sess_id)
+        except Exception as e:
+            print('Cache refresh of %s failed: %s' % (cache_key, e))
+        finally:
+            if sess_id:
+                session_store.return_session_key(sess_id, owner)
+            cache.delete('refresh:%s' % cache_key)
+            # открытие новой сессии обращается к БД, соединение потока не переиспользуется
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def from_cache(cache_key, sess_id, user=None, batch=None, refresh=None):
+    """
+    Извлекает список из кэша (в случае пакета - сразу в виде готового результата).
+    Устаревшие (старше DEFAULT_CACHE_TIMEOUT) данные отдаются сразу, а кэш обновляется
+    в фоне вызовом refresh(sess_id) в своей сессии владельца (stale-while-revalidate).
+    Если владелец сессии неизвестен, данные обновятся при истечении кэша
+    """
+    cached = cache.get(cache_key)
+    if not cached:
+        return None
+
+    cached = json.loads(cached)
+    if refresh is not None and time.time() - cached['ts'] > DEFAULT_CACHE_TIMEOUT:
+        owner = get_session_owner(sess_id, user)
+        if owner is not None:
+            refresh_cache_in_background(cache_key, refresh, owner)
+
+    data = cached['data']
+    return BatchCall.resolved(data) if batch is not None else data
+
+
+def to_cache(cache_key, data):
+    if DEFAULT_CACHE_TIMEOUT:
+        cache.set(
+            cache_key,
+            json.dumps({'ts': time.time(), 'data': data}),
+            settings.WIALON_CACHE_STALE_TIMEOUT
+        )
+
+
+def get_resolver_cache_key(kind, name, user):
+    """
+    Ключ кэша ID объекта Wialon по имени. Включает версию настроек пользователя,
+    поэтому сброс кэша пользователя (invalidate_resolver_cache) не требует поиска ключей
+    """
+    version = cache.get_or_set('resolver:version:%s' % user.pk, 1, None)
+    return 'resolver:%s:%s:%s:%s' % (kind, user.pk, version, name)
+
+
+def invalidate_resolver_cache(user):
+    """Сбрасывает кэш ID ресурса, группового объекта и шаблонов отчетов пользователя"""
+    key = 'resolver:version:%s' % user.pk
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def resolve_cached(kind, name, user, sess_id, request_params, find, error=None, batch=None):
+    """
+    Поиск ID объекта Wialon по имени с долговременным кэшем.
+    find(res) возвращает ID, либо None, если объект не найден. Ненайденные объекты
+    (ошибочно настроенные имена) тоже кэшируются, но на более короткое время.
+    Если задан error, то вместо None выбрасывается WialonException.
+    find может выбросить WialonNotFound - такой результат тоже кэшируется и повторяется
+    """
+    cache_key = get_resolver_cache_key(kind, name, user)
+
+    def check(cached):
+        if cached.get('error'):
+            raise WialonNotFound(cached['error'])
+        if cached['id'] is None and error:
+            raise WialonException(error)
+        return cached['id']
+
+    cached = cache.get(cache_key)
+    if cached is not None:
+        if batch is None:
+            return check(cached)
+        # ошибка должна возникнуть при обращении к результату, как и у обычного вызова
+        call = BatchCall('core/search_items', request_params, parser=check)
+        call.set_response(cached)
+        return call
+
+    def parse(res):
+        try:
+            cached_value = {'id': find(res)}
+        except WialonNotFound as e:
+            cached_value = {'id': None, 'error': str(e)}
+        cache.set(
+            cache_key,
+            cached_value,
+            settings.WIALON_RESOLVER_CACHE_TIMEOUT if cached_value['id'] is not None
+            else settings.WIALON_RESOLVER_NEGATIVE_CACHE_TIMEOUT
+        )
+        return check(cached_value)
+
+    return search_items(request_params, sess_id, parse, batch=batch)
 
 
-def get_drivers(sess_id):
+def get_drivers(sess_id, user=None, batch=None, force=False):
     """Получает список водителей"""
 
-    cache_key = 'drivers:%s' % sess_id
-    drivers_list = cache.get(cache_key)
+    cache_key = get_cache_key('drivers', sess_id, user)
+    drivers_list = None if force else from_cache(
+        cache_key, sess_id, user=user, batch=batch,
+        refresh=lambda sid: get_drivers(sid, user=user, force=True)
+    )
 
-    if drivers_list:
-        return json.loads(drivers_list)
+    if drivers_list is not None:
+        return drivers_list
 
-    request_params = json.dumps({
+    request_params = {
         'spec': {
             'itemsType': 'avl_resource',
             'propName': 'drivers',
@@ -32,33 +191,29 @@ def get_drivers(sess_id):
         'flags': 1 + 256,
         'from': 0,
         'to': 0
-    })
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-                '?svc=core/search_items&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    res = load_requests_json(r)
+    }
 
-    process_error(res, 'Не удалось извлечь из Wialon список водителей.')
+    def parse(res):
+        process_error(res, 'Не удалось извлечь из Wialon список водителей.')
 
-    drivers = []
-    for item in res['items']:
-        if item and item['drvrs']:
-            drivers.extend([{
-                'id': '%s-%s' % (item['id'], x['id']),
-                'name': x['n']
-            } for x in item['drvrs'].values()])
+        drivers = []
+        for item in res['items']:
+            if item and item['drvrs']:
+                drivers.extend([{
+                    'id': '%s-%s' % (item['id'], x['id']),
+                    'name': x['n']
+                } for x in item['drvrs'].values()])
 
-    if DEFAULT_CACHE_TIMEOUT:
-        cache.set(cache_key, json.dumps(drivers), DEFAULT_CACHE_TIMEOUT)
+        to_cache(cache_key, drivers)
+
+        return drivers
 
-    return drivers
+    return search_items(request_params, sess_id, parse, batch=batch)
 
 
-def get_group_object_id(name, user, sess_id):
+def get_group_object_id(name, user, sess_id, batch=None):
     """Получает ID группового объекта"""
-    request_params = json.dumps({
+    request_params = {
         'spec': {
             'itemsType': 'avl_unit_group',
             'propName': 'sys_name',
@@ -70,32 +225,28 @@ def get_group_object_id(name, user, sess_id):
         'flags': 1,
         'from': 0,
         'to': 0
-    })
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-                '?svc=core/search_items&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    res = load_requests_json(r)
+    }
 
     error = 'Не найден ID группового объекта. ' \
             'Проверьте правильность имени группового объекта в настройках интеграции ' \
             'у пользователя "%s".' % user
-    process_error(res, error)
 
-    if 'items' not in res or len(res['items']) == 0:
-        raise WialonException(error)
+    def find(res):
+        process_error(res, error)
+
+        if 'items' not in res or len(res['items']) == 0:
+            return None
 
-    return res['items'][0]['id']
+        return res['items'][0]['id']
+
+    return resolve_cached(
+        'group_object', name, user, sess_id, request_params, find, error=error, batch=batch
+    )
 
 
 def get_messages(item_id, time_from, time_to, sess_id):
     """Получение сообщений"""
-    requests.get(
-        settings.WIALON_BASE_URL + (
-                '?svc=messages/unload&params={}&sid=%s' % sess_id
-        )
-    )
+    wialon_client.get('messages/unload', '{}', sess_id)
 
     request_params = json.dumps({
         'itemId': item_id,
@@ -105,26 +256,24 @@ def get_messages(item_id, time_from, time_to, sess_id):
         'flagsMask': 65280,
         'loadCount': 4294967295
     })
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-                '?svc=messages/load_interval&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    res = load_requests_json(r)
+    res = wialon_client.call('messages/load_interval', request_params, sess_id)
     process_error(res, 'Не удалось извлечь список сообщений из Wialon. ID объекта: %s.' % item_id)
 
     return res
 
 
-def get_points(sess_id):
+def get_points(sess_id, user=None, batch=None, force=False):
     """Получает список геозон (точек)"""
-    cache_key = 'points:%s' % sess_id
-    points_list = cache.get(cache_key)
+    cache_key = get_cache_key('points', sess_id, user)
+    points_list = None if force else from_cache(
+        cache_key, sess_id, user=user, batch=batch,
+        refresh=lambda sid: get_points(sid, user=user, force=True)
+    )
 
-    if points_list:
-        return json.loads(points_list)
+    if points_list is not None:
+        return points_list
 
-    request_params = json.dumps({
+    request_params = {
         'spec': {
             'itemsType': 'avl_resource',
             'propName': 'zones_library',
@@ -136,38 +285,38 @@ def get_points(sess_id):
         'flags': 1 + 4096,
         'from': 0,
         'to': 0
-    })
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-            '?svc=core/search_items&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    res = load_requests_json(r)
-    process_error(res, 'Не удалось извлечь из Wialon список геозон.')
+    }
 
-    points = []
-    for item in res['items']:
-        if item and item.get('zl'):
-            points.extend([{
-                'id': '%s-%s' % (item['id'], x['id']),
-                'name': x['n'].strip()
-            } for x in item['zl'].values()])
+    def parse(res):
+        process_error(res, 'Не удалось извлечь из Wialon список геозон.')
 
-    if DEFAULT_CACHE_TIMEOUT:
-        cache.set(cache_key, json.dumps(points), DEFAULT_CACHE_TIMEOUT)
+        points = []
+        for item in res['items']:
+            if item and item.get('zl'):
+                points.extend([{
+                    'id': '%s-%s' % (item['id'], x['id']),
+                    'name': x['n'].strip()
+                } for x in item['zl'].values()])
+
+        to_cache(cache_key, points)
 
-    return points
+        return points
 
+    return search_items(request_params, sess_id, parse, batch=batch)
 
-def get_resources(sess_id):
+
+def get_resources(sess_id, user=None, batch=None, force=False):
     """Получает список ресурсов (организаций в рамках Виалона)"""
-    cache_key = 'resources:%s' % sess_id
-    resources_list = cache.get(cache_key)
+    cache_key = get_cache_key('resources', sess_id, user)
+    resources_list = None if force else from_cache(
+        cache_key, sess_id, user=user, batch=batch,
+        refresh=lambda sid: get_resources(sid, user=user, force=True)
+    )
 
-    if resources_list:
-        return json.loads(resources_list)
+    if resources_list is not None:
+        return resources_list
 
-    request_params = json.dumps({
+    request_params = {
         'spec': {
             'itemsType': 'avl_resource',
             'propName': 'sys_name',
@@ -179,32 +328,28 @@ def get_resources(sess_id):
         'flags': 1,
         'from': 0,
         'to': 0
-    })
+    }
 
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-                '?svc=core/search_items&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    res = load_requests_json(r)
-    process_error(res, 'Не удалось извлечь из Wialon список ресурсов.')
+    def parse(res):
+        process_error(res, 'Не удалось извлечь из Wialon список ресурсов.')
 
-    resources = []
-    for item in res['items']:
-        resources.append({
-            'id': item['id'],
-            'name': item['nm']
-        })
+        resources = []
+        for item in res['items']:
+            resources.append({
+                'id': item['id'],
+                'name': item['nm']
+            })
 
-    if DEFAULT_CACHE_TIMEOUT:
-        cache.set(cache_key, json.dumps(resources), DEFAULT_CACHE_TIMEOUT)
+        to_cache(cache_key, resources)
+
+        return resources
 
-    return resources
+    return search_items(request_params, sess_id, parse, batch=batch)
 
 
-def get_resource_id(name, user, sess_id):
+def get_resource_id(name, user, sess_id, batch=None):
     """Получает ID ресурса пользователя"""
-    request_params = json.dumps({
+    request_params = {
         'spec': {
             'itemsType': 'avl_resource',
             'propName': 'sys_name',
@@ -216,27 +361,28 @@ def get_resource_id(name, user, sess_id):
         'flags': 1,
         'from': 0,
         'to': 0
-    })
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-                '?svc=core/search_items&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    res = load_requests_json(r)
+    }
+
     error = 'Не найден ID ресурса. ' \
             'Проверьте правильность имени ресурса пользователя в настройках интеграции ' \
             'у пользователя "%s".' % user
-    process_error(res, error)
 
-    if 'items' not in res or len(res['items']) == 0:
-        raise WialonException(error)
+    def find(res):
+        process_error(res, error)
+
+        if 'items' not in res or len(res['items']) == 0:
+            return None
+
+        return res['items'][0]['id']
 
-    return res['items'][0]['id']
+    return resolve_cached(
+        'resource', name, user, sess_id, request_params, find, error=error, batch=batch
+    )
 
 
-def get_report_template_id(name, user, sess_id):
+def get_report_template_id(name, user, sess_id, batch=None):
     """Получает групповой объект"""
-    request_params = json.dumps({
+    request_params = {
         'spec': {
             'itemsType': 'avl_resource',
             'propName': 'reporttemplates',
@@ -248,52 +394,53 @@ def get_report_template_id(name, user, sess_id):
         'flags': 1 + 8192,
         'from': 0,
         'to': 0
-    })
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-            '?svc=core/search_items&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    res = load_requests_json(r)
+    }
+
     error = 'Не найден ID шаблона отчета "%s". ' \
             'Проверьте правильность имени шаблона отчета в настройках интеграции ' \
             'у пользователя "%s".' % (name, user)
 
-    if 'error' in res and res['error'] != 1:
-        send_trigger_email(
-            'Шаблон отчета не найден', extra_data={
-                'Учетная запись': user,
-                'Шаблон отчета': name,
-                'Result': res
-            }
-        )
+    def find(res):
+        if 'error' in res and res['error'] != 1:
+            send_trigger_email(
+                'Шаблон отчета не найден', extra_data={
+                    'Учетная запись': user,
+                    'Шаблон отчета': name,
+                    'Result': res
+                }
+            )
 
-    process_error(res, error)
+        process_error(res, error)
 
-    if 'items' not in res or len(res['items']) == 0 \
-            or 'rep' not in res['items'][0] or len(res['items'][0]['rep']) == 0:
-        raise WialonException(error)
+        if 'items' not in res or len(res['items']) == 0 \
+                or 'rep' not in res['items'][0] or len(res['items'][0]['rep']) == 0:
+            raise WialonNotFound(error)
+
+        reports = list(
+            filter(lambda x: x['n'].strip() == name, res['items'][0]['rep'].values())
+        )
+        if reports:
+            return reports[0]['id']
 
-    reports = list(filter(lambda x: x['n'].strip() == name, res['items'][0]['rep'].values()))
-    if reports:
-        return reports[0]['id']
+        return None
 
-    return None
+    return resolve_cached('template', name, user, sess_id, request_params, find, batch=batch)
 
 
-def get_routes(sess_id, with_points=False):
+def get_routes(sess_id, with_points=False, user=None, batch=None, force=False):
     """Получает список маршрутов"""
-    cache_key = 'routes:%s:%s' % (sess_id, '1' if with_points else '0')
-    routes_list = cache.get(cache_key)
+    cache_key = get_cache_key('routes', sess_id, user, suffix=int(with_points))
+    routes_list = None if force else from_cache(
+        cache_key, sess_id, user=user, batch=batch,
+        refresh=lambda sid: get_routes(sid, with_points=with_points, user=user, force=True)
+    )
 
-    if routes_list:
-        return json.loads(routes_list)
+    if routes_list is not None:
+        return routes_list
 
-    points_dict_by_name = {}
-    if with_points:
-        points_dict_by_name = {x['name']: x for x in get_points(sess_id)}
+    points = get_points(sess_id, user=user, batch=batch, force=force) if with_points else []
 
-    request_params = json.dumps({
+    request_params = {
         'spec': {
             'itemsType': 'avl_route',
             'propName': 'sys_name',
@@ -305,50 +452,53 @@ def get_routes(sess_id, with_points=False):
         'flags': 1 if not with_points else 1 + 512,
         'from': 0,
         'to': 0
-    })
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-                '?svc=core/search_items&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    res = load_requests_json(r)
-    process_error(res, 'Не удалось извлечь из Wialon список маршрутов.')
-
-    routes = []
-    for r in res['items']:
-        route = {
-            'id': r['id'],
-            'name': r['nm'].strip()
-        }
-        if with_points:
-            point_names = [x['n'] for x in r.get('rpts', [])]
-            route['points'] = [
-                points_dict_by_name[n]
-                for n in point_names
-                if n in points_dict_by_name
-            ]
-
-        routes.append(route)
+    }
 
-    if DEFAULT_CACHE_TIMEOUT:
-        cache.set(cache_key, json.dumps(routes), DEFAULT_CACHE_TIMEOUT)
+    def parse(res):
+        process_error(res, 'Не удалось извлечь из Wialon список маршрутов.')
+
+        points_list = points.result if isinstance(points, BatchCall) else points
+        points_dict_by_name = {x['name']: x for x in points_list}
+
+        routes = []
+        for r in res['items']:
+            route = {
+                'id': r['id'],
+                'name': r['nm'].strip()
+            }
+            if with_points:
+                point_names = [x['n'] for x in r.get('rpts', [])]
+                route['points'] = [
+                    points_dict_by_name[n]
+                    for n in point_names
+                    if n in points_dict_by_name
+                ]
+
+            routes.append(route)
 
-    return routes
+        to_cache(cache_key, routes)
 
+        return routes
 
-def get_units(sess_id, extra_fields=False):
+    return search_items(request_params, sess_id, parse, batch=batch)
+
+
+def get_units(sess_id, extra_fields=False, user=None, batch=None, force=False):
     """Получает список элементов"""
-    cache_key = 'units:%s' % sess_id
-    units_list = cache.get(cache_key)
+    cache_key = get_cache_key('units', sess_id, user, suffix=int(extra_fields))
+    units_list = None if force else from_cache(
+        cache_key, sess_id, user=user, batch=batch,
+        refresh=lambda sid: get_units(sid, extra_fields=extra_fields, user=user, force=True)
+    )
 
-    if units_list:
-        return json.loads(units_list)
+    if units_list is not None:
+        return units_list
 
     flags = 1 + 8388608
     if extra_fields:
         flags += 8
 
-    request_params = json.dumps({
+    request_params = {
         'spec': {
             'itemsType': 'avl_unit',
             'propName': 'sys_name',
@@ -360,51 +510,48 @@ def get_units(sess_id, extra_fields=False):
         'flags': flags,
         'from': 0,
         'to': 0
-    })
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-                '?svc=core/search_items&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    res = load_requests_json(r)
-    process_error(res, 'Не удалось извлечь из Wialon список объектов (ТС).')
+    }
 
-    units = []
-    for item in res['items']:
-        number, vin, vehicle_type = '', '', ''
+    def parse(res):
+        process_error(res, 'Не удалось извлечь из Wialon список объектов (ТС).')
 
-        if 'pflds' in item:
+        units = []
+        for item in res['items']:
+            number, vin, vehicle_type = '', '', ''
 
-            for f in item['pflds'].values():
-                if f['n'] == 'vin':
-                    vin = f['v']
+            if 'pflds' in item:
 
-                elif f['n'] == 'vehicle_type':
-                    vehicle_type = f.get('v', '').strip()
+                for f in item['pflds'].values():
+                    if f['n'] == 'vin':
+                        vin = f['v']
 
-                elif f['n'] == 'registration_plate':
-                    number = f['v']
+                    elif f['n'] == 'vehicle_type':
+                        vehicle_type = f.get('v', '').strip()
 
-                if number and vin and vehicle_type:
-                    break
+                    elif f['n'] == 'registration_plate':
+                        number = f['v']
 
-        data = {
-            'id': item['id'],
-            'name': item['nm'].strip(),
-            'number': number,
-            'vehicle_type': vehicle_type,
-            'vin': vin
-        }
+                    if number and vin and vehicle_type:
+                        break
 
-        if extra_fields:
-            data['fields'] = list(item.get('flds', {}).values())
+            data = {
+                'id': item['id'],
+                'name': item['nm'].strip(),
+                'number': number,
+                'vehicle_type': vehicle_type,
+                'vin': vin
+            }
 
-        units.append(data)
+            if extra_fields:
+                data['fields'] = list(item.get('flds', {}).values())
 
-    if DEFAULT_CACHE_TIMEOUT:
-        cache.set(cache_key, json.dumps(units), DEFAULT_CACHE_TIMEOUT)
+            units.append(data)
+
+        to_cache(cache_key, units)
 
-    return units
+        return units
+
+    return search_items(request_params, sess_id, parse, batch=batch)
 
 
 def get_drive_rank_settings(item_id, sess_id):
@@ -413,12 +560,7 @@ def get_drive_rank_settings(item_id, sess_id):
         'itemId': item_id,
         'sid': sess_id
     })
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-                '?svc=unit/get_drive_rank_settings&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    res = load_requests_json(r)
+    res = wialon_client.call('unit/get_drive_rank_settings', request_params, sess_id)
     if 'error' in res:
         return {}
     result = {}
@@ -442,9 +584,4 @@ def get_unit_settings(item_id, sess_id, get_sensors=True):
         'id': item_id,
         'flags': flags
     })
-    r = requests.get(
-        settings.WIALON_BASE_URL + (
-                '?svc=core/search_item&params=%s&sid=%s' % (request_params, sess_id)
-        )
-    )
-    return load_requests_json(r)['item']
+    return wialon_client.call('core/search_item', request_params, sess_id)['item']
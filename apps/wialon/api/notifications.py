@@ -1,25 +1,14 @@
-import json
-
-from django.conf import settings
-
-import requests
-
 from reports.utils import get_wialon_report_resource_id
-from wialon.utils import process_error, load_requests_json
+from wialon.client import wialon_client
+from wialon.utils import process_error
 
 
 def remove_notification(notification, user, sess_id):
-    r = requests.post(
-        settings.WIALON_BASE_URL + '?svc=resource/update_notification&sid=%s' % sess_id, {
-            'params': json.dumps({
-                'itemId': get_wialon_report_resource_id(user, sess_id),
-                'id': notification.wialon_id,
-                'callMode': 'delete',
-            }),
-            'sid': sess_id
-        }
-    )
-    res = load_requests_json(r)
+    res = wialon_client.call('resource/update_notification', {
+        'itemId': get_wialon_report_resource_id(user, sess_id),
+        'id': notification.wialon_id,
+        'callMode': 'delete',
+    }, sess_id, method='post')
     process_error(
         res, 'Не удалось удалить шаблон уведомлений ID="%s"' % notification.pk
     )
@@ -27,22 +16,22 @@ def remove_notification(notification, user, sess_id):
     return res
 
 
-def update_notification(request_params, sess_id):
-    r = requests.post(
-        settings.WIALON_BASE_URL + '?svc=resource/update_notification&sid=%s' % sess_id, {
-            'params': json.dumps(request_params),
-            'sid': sess_id
-        }
-    )
-    res = load_requests_json(r)
+def update_notification(request_params, sess_id, batch=None):
     action = 'сохранить'
     if request_params.get('callMode', '') == 'delete':
         action = 'удалить'
 
-    process_error(
-        res, ('Не удалось %s шаблон уведомлений "%s". Данные: %s' % (
-            action, request_params.get('n', ''), request_params
-        ))
-    )
+    def parse(res):
+        process_error(
+            res, ('Не удалось %s шаблон уведомлений "%s". Данные: %s' % (
+                action, request_params.get('n', ''), request_params
+            ))
+        )
+        return res
 
-    return res
+    if batch is not None:
+        return batch.add('resource/update_notification', request_params, parser=parse)
+
+    return parse(wialon_client.call(
+        'resource/update_notification', request_params, sess_id, method='post'
+    ))
@@ -1,17 +1,13 @@
-import json
 import os
 import subprocess
-import urllib.request
 from time import sleep
 
 from django.conf import settings
 
-import requests
-
 from base.exceptions import APIProcessError
 from snippets.utils.email import send_trigger_email
+from wialon.client import wialon_client
 from wialon.sessions import session_store
-from wialon.utils import load_requests_json
 
 
 def get_session_cache_key(user):
@@ -42,11 +38,7 @@ def login_wialon_via_token(user, token, attempt=0):
             code='password_invalid'
         )
 
-    params = urllib.request.quote(json.dumps({'token': token if token else ''}))
-    r = requests.get(
-        settings.WIALON_BASE_URL + ('?svc=token/login&params=%s' % params)
-    )
-    res = load_requests_json(r)
+    res = wialon_client.call('token/login', {'token': token if token else ''})
 
     # какие-то проблемы с лимитами
     if res.get('error', 0) == 1:
@@ -0,0 +1,105 @@
+from wialon.client import wialon_client
+from wialon.exceptions import WialonException
+from wialon.utils import process_error
+
+
+class BatchCall(object):
+    """Отложенный результат одного вызова в составе core/batch"""
+    _empty = object()
+
+    def __init__(self, svc, params, parser=None, value=_empty):
+        self.svc = svc
+        self.params = params
+        self.parser = parser
+        self.response = None
+        self.executed = value is not self._empty
+        self._value = value
+
+    @classmethod
+    def resolved(cls, value):
+        """Вызов, результат которого уже известен (например, взят из кэша)"""
+        return cls(None, None, value=value)
+
+    def set_response(self, response):
+        self.response = response
+        self.executed = True
+
+    @property
+    def result(self):
+        if not self.executed:
+            raise WialonException(
+                'Пакетный запрос к Wialon (%s) еще не выполнен' % self.svc
+            )
+
+        if self._value is self._empty:
+            # разбор ответа откладываем до обращения, чтобы ошибка
+            # возникла у вызывающего кода, а не при отправке пакета
+            self._value = self.parser(self.response) if self.parser else self.response
+
+        return self._value
+
+    def get(self, default=None):
+        """Результат вызова, либо default, если Wialon вернул ошибку"""
+        try:
+            return self.result
+        except WialonException:
+            return default
+
+
+class WialonBatch(object):
+    """
+    Пакет независимых вызовов API, отправляемых одним запросом core/batch.
+    Использование:
+
+        with WialonBatch(sess_id) as batch:
+            units = get_units(sess_id, batch=batch)
+            routes = get_routes(sess_id, batch=batch)
+
+        units.result, routes.result
+    """
+
+    def __init__(self, sess_id, client=None):
+        self.sess_id = sess_id
+        self.client = client or wialon_client
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.execute()
+
+    def add(self, svc, params, parser=None):
+        call = BatchCall(svc, params, parser=parser)
+        self.calls.append(call)
+        return call
+
+    def execute(self):
+        calls, self.calls = [x for x in self.calls if not x.executed], []
+        if not calls:
+            return
+
+        if len(calls) == 1:
+            # один вызов нет смысла заворачивать в пакет
+            call = calls[0]
+            call.set_response(
+                self.client.call(call.svc, call.params, self.sess_id, method='post')
+            )
+            return
+
+        res = self.client.call('core/batch', {
+            'params': [{'svc': x.svc, 'params': x.params} for x in calls],
+            'flags': 0
+        }, self.sess_id, method='post')
+
+        if isinstance(res, dict):
+            process_error(res, 'Не удалось выполнить пакетный запрос к Wialon.')
+
+        if not isinstance(res, list) or len(res) != len(calls):
+            raise WialonException(
+                'Некорректный ответ на пакетный запрос к Wialon. Ответ: %s' % res
+            )
+
+        for call, response in zip(calls, res):
+            call.set_response(response)
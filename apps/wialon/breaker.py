@@ -0,0 +1,101 @@
+import time
+import uuid
+
+from django.conf import settings
+
+import redis
+
+from wialon.exceptions import WialonUnavailable
+
+
+class CircuitBreaker(object):
+    """
+    Предохранитель обращений к Wialon, общий для всех воркеров (состояние в Redis).
+    Сбои считаются отдельно по каждому методу API (svc) в скользящем окне.
+    При превышении порога предохранитель размыкается, и обращения сразу завершаются
+    WialonUnavailable. По истечении паузы пропускается один пробный запрос:
+    удачный замыкает предохранитель, неудачный - снова размыкает
+    """
+    prefix = 'wialon:breaker'
+
+    def __init__(self, failure_threshold=None, failure_window=None, open_timeout=None):
+        self.failure_threshold = failure_threshold or settings.WIALON_BREAKER_FAILURE_THRESHOLD
+        self.failure_window = failure_window or settings.WIALON_BREAKER_FAILURE_WINDOW
+        self.open_timeout = open_timeout or settings.WIALON_BREAKER_OPEN_TIMEOUT
+
+        self.connection_pool = redis.BlockingConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB
+        )
+        self.cache = redis.Redis(connection_pool=self.connection_pool)
+
+    def get_key(self, svc, name):
+        return '%s:%s:%s' % (self.prefix, svc, name)
+
+    def before(self, svc):
+        """
+        Проверка перед обращением к Wialon.
+        :return: True, если это пробный запрос в полуоткрытом состоянии
+        """
+        if not self.failure_threshold:
+            return False
+
+        opened_until, tripped = self.cache.mget(
+            self.get_key(svc, 'open'), self.get_key(svc, 'tripped')
+        )
+        if opened_until is not None:
+            raise self.unavailable(svc, float(opened_until) - time.time())
+
+        if tripped is None:
+            return False
+
+        # полуоткрытое состояние: пропускаем только один пробный запрос
+        if self.cache.set(self.get_key(svc, 'probe'), 1, nx=True, ex=self.open_timeout):
+            return True
+        raise self.unavailable(svc, self.open_timeout)
+
+    def success(self, svc, probe=False):
+        if probe:
+            self.cache.delete(
+                self.get_key(svc, 'tripped'),
+                self.get_key(svc, 'probe'),
+                self.get_key(svc, 'failure_times')
+            )
+
+    def failure(self, svc, probe=False):
+        if not self.failure_threshold:
+            return
+
+        # сбои хранятся моментами в zset: в окно попадают только сбои последних
+        # failure_window сек, а редкие сбои не накапливаются до порога
+        now = time.time()
+        failures_key = self.get_key(svc, 'failure_times')
+        pipe = self.cache.pipeline()
+        pipe.zremrangebyscore(failures_key, '-inf', now - self.failure_window)
+        pipe.zadd(failures_key, {'%s:%s' % (now, uuid.uuid4().hex): now})
+        pipe.zcard(failures_key)
+        pipe.expire(failures_key, self.failure_window)
+        failures = pipe.execute()[2]
+
+        if probe or failures >= self.failure_threshold:
+            self.trip(svc)
+
+    def trip(self, svc):
+        print('Wialon circuit breaker opened for %s sec (%s)' % (self.open_timeout, svc))
+        pipe = self.cache.pipeline()
+        pipe.setex(self.get_key(svc, 'open'), self.open_timeout, time.time() + self.open_timeout)
+        pipe.setex(self.get_key(svc, 'tripped'), self.open_timeout * 10, 1)
+        pipe.delete(self.get_key(svc, 'probe'), self.get_key(svc, 'failure_times'))
+        pipe.execute()
+
+    @staticmethod
+    def unavailable(svc, retry_after):
+        retry_after = max(1, int(retry_after))
+        return WialonUnavailable(
+            'Wialon временно недоступен (%s). Повторите запрос через %s сек.' % (svc, retry_after),
+            retry_after=retry_after
+        )
+
+
+circuit_breaker = CircuitBreaker()
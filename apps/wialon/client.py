@@ -0,0 +1,142 @@
+import json
+import os
+
+from django.conf import settings
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from base import timing
+from wialon.breaker import circuit_breaker
+from wialon.exceptions import WialonException
+from wialon.utils import load_requests_json
+
+
+class WialonClient(object):
+    """
+    HTTP-клиент Wialon.
+    Держит пул постоянных (keep-alive) соединений, чтобы не тратить время
+    на TCP + TLS рукопожатие при каждом обращении к API
+    """
+
+    def __init__(self, base_url=None, pool_size=None, connect_timeout=None, read_timeout=None,
+                 retries=None, backoff_factor=None):
+        self.base_url = base_url or settings.WIALON_BASE_URL
+        self.pool_size = pool_size or settings.WIALON_HTTP_POOL_SIZE
+        self.connect_timeout = connect_timeout or settings.WIALON_HTTP_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or settings.WIALON_HTTP_READ_TIMEOUT
+        self.retries = settings.WIALON_HTTP_RETRIES if retries is None else retries
+        self.backoff_factor = settings.WIALON_HTTP_BACKOFF_FACTOR \
+            if backoff_factor is None else backoff_factor
+
+        self._session = None
+        self._pid = None
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+    def make_session(self):
+        # POST (exec_report и пр.) повторяется только при ошибках соединения,
+        # повтор по статусу ответа и таймауту чтения - только для GET
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def session(self):
+        # после fork у каждого воркера uwsgi должен быть свой пул соединений
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            self._session = self.make_session()
+            self._pid = pid
+        return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+        self._session = None
+        self._pid = None
+
+    def request(self, svc, params=None, sess_id=None, method='get'):
+        """Выполняет запрос к API и возвращает объект ответа requests"""
+        query = {'svc': svc}
+        if params is not None and not isinstance(params, str):
+            params = json.dumps(params)
+
+        data = None
+        if method == 'get':
+            if params is not None:
+                query['params'] = params
+            if sess_id:
+                query['sid'] = sess_id
+        else:
+            if sess_id:
+                query['sid'] = sess_id
+            data = {'params': params if params is not None else '{}'}
+            if sess_id:
+                data['sid'] = sess_id
+
+        probe = circuit_breaker.before(svc)
+        try:
+            r = self.session.request(
+                method, self.base_url, params=query, data=data, timeout=self.timeout
+            )
+        except requests.exceptions.RequestException as e:
+            circuit_breaker.failure(svc, probe=probe)
+            raise WialonException('Нет связи с Wialon (%s). Ошибка: %s' % (svc, e))
+
+        if r.status_code >= 500:
+            circuit_breaker.failure(svc, probe=probe)
+        else:
+            circuit_breaker.success(svc, probe=probe)
+
+        timing.count(wialon_calls=1, wialon_bytes=len(r.content))
+        return r
+
+    def get(self, svc, params=None, sess_id=None):
+        return self.request(svc, params=params, sess_id=sess_id, method='get')
+
+    def post(self, svc, params=None, sess_id=None):
+        return self.request(svc, params=params, sess_id=sess_id, method='post')
+
+    def keepalive(self, sess_id):
+        """
+        Продлевает сессию запросом к avl_evts - самый дешевый запрос,
+        не выполняющий поиска. Возвращает False, если сессия уже недействительна
+        """
+        try:
+            r = self.session.get(
+                settings.WIALON_EVENTS_URL, params={'sid': sess_id}, timeout=self.timeout
+            )
+        except requests.exceptions.RequestException as e:
+            raise WialonException('Нет связи с Wialon (avl_evts). Ошибка: %s' % e)
+
+        res = load_requests_json(r)
+        return not (isinstance(res, dict) and res.get('error'))
+
+    def call(self, svc, params=None, sess_id=None, method='get'):
+        """Выполняет запрос к API и возвращает раскодированный JSON"""
+        return load_requests_json(
+            self.request(svc, params=params, sess_id=sess_id, method=method)
+        )
+
+
+wialon_client = WialonClient()
@@ -1,3 +1,15 @@
 class WialonException(Exception):
     """Ошибка Виалона. Побуждает заново запросить данные"""
     pass
+
+
+class WialonUnavailable(WialonException):
+    """Wialon недоступен: обращения к нему временно не выполняются (разомкнут предохранитель)"""
+    def __init__(self, message, retry_after=None):
+        super(WialonUnavailable, self).__init__(message)
+        self.retry_after = retry_after
+
+
+class WialonNotFound(WialonException):
+    """Объект Wialon не найден (результат поиска можно кэшировать как отрицательный)"""
+    pass
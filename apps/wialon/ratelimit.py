@@ -0,0 +1,144 @@
+import math
+import time
+
+from django.conf import settings
+
+import redis
+
+
+# Атомарное получение токена из корзины.
+# KEYS[1] - хэш корзины (tokens, ts), ARGV: емкость, скорость пополнения (токенов/сек), now
+# Возвращает {1, остаток токенов} при успехе, либо {0, мс до появления токена}
+TOKEN_BUCKET_ACQUIRE_SCRIPT = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local acquired = 0
+local result
+if tokens >= 1 then
+    tokens = tokens - 1
+    acquired = 1
+    result = math.floor(tokens)
+else
+    result = math.ceil((1 - tokens) / rate * 1000)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {acquired, result}
+'''
+
+
+class ReportRateLimiter(object):
+    """
+    Ограничитель частоты выполнения отчетов в Wialon (token bucket) на аккаунт.
+    Состояние корзины хранится в Redis и общее для всех воркеров, получение токена атомарно.
+    Ожидающие не опрашивают базу, а блокируются на BLPOP до появления токена
+    либо до пробуждения другим воркером
+    """
+    prefix = 'wialon:reports'
+
+    def __init__(self, capacity=None, period=None):
+        self.capacity = capacity or settings.WIALON_REPORTS_PER_PERIOD_LIMIT
+        self.period = period or settings.WIALON_REPORTS_LIMIT_PERIOD
+        self.rate = float(self.capacity) / self.period
+
+        self.connection_pool = redis.BlockingConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB
+        )
+        self.cache = redis.Redis(connection_pool=self.connection_pool)
+        self.acquire_script = self.cache.register_script(TOKEN_BUCKET_ACQUIRE_SCRIPT)
+
+    @staticmethod
+    def get_account(user):
+        return user.wialon_username or user.pk
+
+    def get_bucket_key(self, user):
+        return '%s:bucket:%s' % (self.prefix, self.get_account(user))
+
+    def get_notify_key(self, user):
+        return '%s:notify:%s' % (self.prefix, self.get_account(user))
+
+    def get_waiters_key(self, user):
+        return '%s:waiters:%s' % (self.prefix, self.get_account(user))
+
+    def try_acquire(self, user):
+        """
+        Пытается получить токен без ожидания.
+        :return: (получен ли токен, остаток токенов либо секунды до появления токена)
+        """
+        acquired, value = self.acquire_script(
+            keys=[self.get_bucket_key(user)],
+            args=[self.capacity, self.rate, time.time()]
+        )
+        if acquired:
+            return True, int(value)
+        return False, int(value) / 1000.0
+
+    def notify(self, user):
+        """Будит одного из ожидающих токен воркеров"""
+        key = self.get_notify_key(user)
+        pipe = self.cache.pipeline()
+        pipe.lpush(key, 1)
+        pipe.ltrim(key, 0, 0)
+        pipe.expire(key, int(self.period))
+        pipe.execute()
+
+    def get_waiters_count(self, user):
+        """Метрика: количество воркеров в очереди ожидания токена"""
+        return int(self.cache.get(self.get_waiters_key(user)) or 0)
+
+    def acquire(self, user, timeout=None):
+        """
+        Получает токен, ожидая его не дольше timeout секунд.
+        :return: True, если токен получен, False - если истекло время ожидания
+        """
+        acquired, value = self.try_acquire(user)
+        if acquired:
+            return True
+
+        if timeout is None:
+            timeout = settings.WIALON_REPORTS_EXECUTE_ANYWAY_AFTER
+
+        waiters_key = self.get_waiters_key(user)
+        waiters = self.cache.incr(waiters_key)
+        self.cache.expire(waiters_key, int(timeout) + 1)
+        deadline = time.time() + timeout
+        print('Report of user %s was throttled for %.1f sec (waiters: %s)' % (
+            user.username, value, waiters
+        ))
+
+        try:
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+
+                # BLPOP принимает только целые секунды
+                wait = max(1, int(math.ceil(min(value, remaining))))
+                self.cache.blpop(self.get_notify_key(user), timeout=wait)
+
+                acquired, value = self.try_acquire(user)
+                if acquired:
+                    if value > 0 and self.get_waiters_count(user) > 1:
+                        # токены еще остались - передаем эстафету следующему ожидающему
+                        self.notify(user)
+                    return True
+        finally:
+            self.cache.decr(waiters_key)
+
+
+report_rate_limiter = ReportRateLimiter()
@@ -4,11 +4,50 @@ from django.conf import settings
 
 import redis
 
-from snippets.utils.passwords import generate_random_string
+from wialon.client import wialon_client
+
+
+# Атомарная выдача свободного ключа сессии из пула пользователя.
+# KEYS[1] - zset пула (score - время устаревания ключа), KEYS[2] - префикс ключей срока годности,
+# KEYS[3] - префикс ключей владельца сессии
+# ARGV: now, expiraton_seconds, session_user_timeout, user_id
+CHECKOUT_SCRIPT = '''
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local sess_id = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+if not sess_id then
+    return false
+end
+redis.call('ZREM', KEYS[1], sess_id)
+redis.call('SETEX', KEYS[2] .. sess_id, ARGV[2], ARGV[1])
+redis.call('SETEX', KEYS[3] .. sess_id, ARGV[3], ARGV[4])
+return sess_id
+'''
+
+# Атомарный возврат ключа сессии в пул пользователя, если он еще не устарел.
+# KEYS[1] - zset пула, KEYS[2] - ключ срока годности сессии, ARGV: sess_id, now, expiraton_seconds
+RETURN_SCRIPT = '''
+local created_at = redis.call('GET', KEYS[2])
+if not created_at then
+    return 0
+end
+redis.call('DEL', KEYS[2])
+local expires_at = tonumber(created_at) + tonumber(ARGV[3])
+if expires_at > tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], expires_at, ARGV[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return 1
+'''
 
 
 class SessionStore(object):
+    """
+    Пул свободных ключей сессий Wialon.
+    Для каждого пользователя хранится zset {ключ сессии: время устаревания},
+    выдача и возврат ключа выполняются одним атомарным скриптом без сканирования KEYS
+    """
     expiraton_seconds = settings.WIALON_SESSION_TIMEOUT
+    session_user_timeout = 60 * 60 * 24
 
     def __init__(self):
         self.connection_pool = redis.BlockingConnectionPool(
@@ -17,73 +56,125 @@ class SessionStore(object):
             db=settings.REDIS_DB
         )
         self.cache = self.make_connection()
+        self.checkout_script = self.cache.register_script(CHECKOUT_SCRIPT)
+        self.return_script = self.cache.register_script(RETURN_SCRIPT)
 
     def make_connection(self):
         return redis.Redis(connection_pool=self.connection_pool)
 
     @staticmethod
-    def get_user_pattern(user):
-        return 'sessid:%s:*' % user.id
+    def get_pool_key(user):
+        return 'sessid:pool:%s' % user.id
 
     @staticmethod
-    def generate_cache_key(user):
-        return 'sessid:%s:%s' % (user.id, generate_random_string(8))
+    def get_expiry_key(sess_id=''):
+        return 'sessid:expiry:%s' % sess_id
 
     @staticmethod
-    def get_expiry_key(sess_id):
-        return 'sessid:expiry:%s' % sess_id
+    def get_user_key(sess_id):
+        return 'sessid:user:%s' % sess_id
 
     def set_session_key(self, sess_id, user, timeout=settings.WIALON_SESSION_TIMEOUT):
-        self.cache.setex(self.generate_cache_key(user), sess_id, timeout)
+        pool_key = self.get_pool_key(user)
+        pipe = self.cache.pipeline()
+        pipe.zadd(pool_key, {sess_id: int(time.time()) + timeout})
+        pipe.expire(pool_key, self.expiraton_seconds)
         # удаляем кэш срока годности
-        self.cache.delete(self.get_expiry_key(sess_id))
+        pipe.delete(self.get_expiry_key(sess_id))
+        pipe.execute()
 
     def acquire_session_key(self, sess_id):
         # оставляем метку когда начали пользоваться
-        self.cache.setex(self.get_expiry_key(sess_id), int(time.time()), self.expiraton_seconds)
+        self.cache.setex(self.get_expiry_key(sess_id), self.expiraton_seconds, int(time.time()))
 
     def get_new_session_key(self, user):
         from wialon.auth import get_user_wialon_token, login_wialon_via_token
         token = get_user_wialon_token(user)
         sess_id = login_wialon_via_token(user, token)
         self.acquire_session_key(sess_id)
+        # запоминаем владельца сессии: по нему строятся ключи кэша данных Wialon
+        self.touch_session_user(sess_id, user)
         return sess_id
 
+    def touch_session_user(self, sess_id, user):
+        """
+        Запоминает (продлевает) владельца сессии: пока сессия живет в пуле,
+        ключи кэша данных Wialon строятся по пользователю, а не по сессии
+        """
+        self.cache.setex(self.get_user_key(sess_id), self.session_user_timeout, user.id)
+
+    def get_session_user_id(self, sess_id):
+        """ID пользователя, для которого была открыта сессия (если она открыта через пул)"""
+        user_id = self.cache.get(self.get_user_key(sess_id))
+        return int(user_id) if user_id is not None else None
+
     def get_session_key(self, user, invalidate=False):
         if invalidate:
             return self.get_new_session_key(user)
 
-        keys = self.cache.keys(self.get_user_pattern(user))
-        if not keys:
-            return self.get_new_session_key(user)
-
-        sess_id = None
-        while keys:
-            # стараемся сначала переиспользовать более ранний ключ
-            key = keys.pop()
-            sess_id = self.cache.get(key)
-            self.cache.delete(key)
-            # уже успело устареть или быть занятым:
-            if sess_id is not None:
-                sess_id = sess_id.decode()
-                self.acquire_session_key(sess_id)
-                break
+        # стараемся сначала переиспользовать более ранний ключ
+        # владелец сессии запоминается заново (с новым сроком хранения) при каждой выдаче
+        sess_id = self.checkout_script(
+            keys=[self.get_pool_key(user), self.get_expiry_key(), self.get_user_key('')],
+            args=[
+                int(time.time()), self.expiraton_seconds, self.session_user_timeout, user.id
+            ]
+        )
 
         if not sess_id:
             return self.get_new_session_key(user)
 
-        return sess_id
+        return sess_id.decode()
 
     def return_session_key(self, sess_id, user):
-        created_at = self.cache.get(self.get_expiry_key(sess_id))
-        if created_at is not None:
-            # значит сессионный ключ еще актуален
-            delta = int(time.time()) - int(created_at)
-            # если осталось болье 1 секунды, то даем сохранить
-            if delta < self.expiraton_seconds:
-                self.set_session_key(sess_id, user, self.expiraton_seconds - delta)
-            return True
-        return False
+        # значит сессионный ключ еще актуален, если есть метка срока годности
+        return bool(self.return_script(
+            keys=[self.get_pool_key(user), self.get_expiry_key(sess_id)],
+            args=[sess_id, int(time.time()), self.expiraton_seconds]
+        ))
+
+    def get_pool_size(self, user):
+        """Количество свободных неустаревших ключей в пуле пользователя"""
+        return self.cache.zcount(self.get_pool_key(user), '(%s' % int(time.time()), '+inf')
+
+    def keepalive_pool(self, user, margin=settings.WIALON_SESSION_KEEPALIVE_MARGIN):
+        """
+        Продлевает свободные сессии пользователя, которым осталось жить меньше margin секунд,
+        недействительные сессии выбрасывает из пула.
+        :return: (продлено, удалено)
+        """
+        now = int(time.time())
+        pool_key = self.get_pool_key(user)
+        self.cache.zremrangebyscore(pool_key, '-inf', now)
+
+        refreshed = dropped = 0
+        for sess_id in self.cache.zrangebyscore(pool_key, now, now + margin):
+            # забираем ключ из пула, чтобы его не выдали, пока продлеваем;
+            # если ключ уже успели выдать - пропускаем
+            if not self.cache.zrem(pool_key, sess_id):
+                continue
+
+            sess_id = sess_id.decode()
+            if wialon_client.keepalive(sess_id):
+                self.set_session_key(sess_id, user)
+                self.touch_session_user(sess_id, user)
+                refreshed += 1
+            else:
+                dropped += 1
+
+        return refreshed, dropped
+
+    def fill_pool(self, user, size=settings.WIALON_SESSION_POOL_SIZE):
+        """
+        Дополняет пул пользователя новыми сессиями до size штук.
+        :return: количество открытых сессий
+        """
+        created = 0
+        for _ in range(size - self.get_pool_size(user)):
+            sess_id = self.get_new_session_key(user)
+            self.set_session_key(sess_id, user)
+            created += 1
+        return created
 
 
 session_store = SessionStore()
@@ -0,0 +1,56 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from wialon import api
+from wialon.exceptions import WialonNotFound
+
+
+class ReportTemplateResolverTestCase(SimpleTestCase):
+    """Кэш поиска ID шаблона отчета по имени"""
+
+    def setUp(self):
+        self.user = mock.Mock(pk=1)
+        self.storage = {}
+
+        cache = mock.patch.object(api, 'cache')
+        self.cache = cache.start()
+        self.addCleanup(cache.stop)
+        self.cache.get.side_effect = lambda key, default=None: self.storage.get(key, default)
+        self.cache.get_or_set.side_effect = lambda key, value, timeout: \
+            self.storage.setdefault(key, value)
+        self.cache.set.side_effect = lambda key, value, timeout: \
+            self.storage.__setitem__(key, value)
+
+    def resolve(self, response):
+        def search_items(params, sess_id, parser, batch=None):
+            return parser(response)
+
+        with mock.patch.object(api, 'search_items', side_effect=search_items) as search_items:
+            try:
+                return api.get_report_template_id('Отчет', self.user, 'sid')
+            finally:
+                self.search_calls = search_items.call_count
+
+    def test_found(self):
+        response = {'items': [{'rep': {'1': {'id': 5, 'n': 'Отчет '}, '2': {'id': 6, 'n': 'X'}}}]}
+        self.assertEqual(self.resolve(response), 5)
+        self.assertEqual(self.resolve(response), 5)
+        self.assertEqual(self.search_calls, 0)
+
+    def test_not_found(self):
+        # ресурс без шаблонов: ошибка кэшируется и повторяется без обращения к Wialon
+        with self.assertRaises(WialonNotFound):
+            self.resolve({'items': []})
+        self.assertEqual(self.search_calls, 1)
+
+        with self.assertRaises(WialonNotFound):
+            self.resolve({'items': []})
+        self.assertEqual(self.search_calls, 0)
+
+        # шаблон с другим именем - None, тоже из кэша
+        self.storage.clear()
+        response = {'items': [{'rep': {'1': {'id': 6, 'n': 'X'}}}]}
+        self.assertIsNone(self.resolve(response))
+        self.assertIsNone(self.resolve(response))
+        self.assertEqual(self.search_calls, 0)
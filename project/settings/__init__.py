@@ -260,6 +260,16 @@ CACHES = {
 }
 
 WIALON_BASE_URL = 'https://hst-api.wialon.com/wialon/ajax.html'
+WIALON_EVENTS_URL = 'https://hst-api.wialon.com/avl_evts'
+WIALON_HTTP_POOL_SIZE = 20  # размер пула keep-alive соединений с Wialon на воркер
+WIALON_HTTP_CONNECT_TIMEOUT = 10  # таймаут установки соединения, сек
+WIALON_HTTP_READ_TIMEOUT = 60 * 5  # таймаут ожидания ответа (exec_report бывает долгим), сек
+WIALON_HTTP_RETRIES = 3  # количество повторов при сетевых ошибках и ответах 502/503/504
+WIALON_HTTP_BACKOFF_FACTOR = .5  # множитель экспоненциальной паузы между повторами
+WIALON_REPORT_ROWS_PAGE_SIZE = 500  # строк результата отчета на один запрос select_result_rows
+WIALON_BREAKER_FAILURE_THRESHOLD = 10  # сбоев метода API за окно до размыкания (0 - отключено)
+WIALON_BREAKER_FAILURE_WINDOW = 60  # окно подсчета сбоев, сек
+WIALON_BREAKER_OPEN_TIMEOUT = 30  # пауза до пробного запроса при разомкнутом предохранителе, сек
 
 WIALON_DEFAULT_GROUP_OBJECT_NAME = 'Ресурс'
 WIALON_DEFAULT_TEMPLATE_NAMES = {
@@ -273,12 +283,72 @@ WIALON_DEFAULT_TEMPLATE_NAMES = {
 }
 
 WIALON_SESSION_TIMEOUT = 60 * 3  # таймаут кэширование ключа сессии
-WIALON_CACHE_TIMEOUT = 45  # время жизни кэша данных из Wialon, сек
+WIALON_SESSION_POOL_SIZE = 3  # количество заранее открытых сессий на пользователя организации
+WIALON_SESSION_KEEPALIVE_MARGIN = 60  # продлеваем сессии, которым осталось жить меньше, сек
+WIALON_SESSION_KEEPALIVE_INTERVAL = 30  # пауза между проходами поддержания пула сессий, сек
+WIALON_CACHE_TIMEOUT = 45  # время, после которого кэш данных из Wialon обновляется в фоне, сек
+WIALON_CACHE_STALE_TIMEOUT = 60 * 60  # сколько можно отдавать устаревший кэш данных из Wialon, сек
+WIALON_CACHE_REFRESH_LOCK_TIMEOUT = 60  # блокировка повторного фонового обновления кэша, сек
+WIALON_RESOLVER_CACHE_TIMEOUT = 60 * 60 * 24  # кэш ID ресурса, группы объектов и шаблонов, сек
+WIALON_RESOLVER_NEGATIVE_CACHE_TIMEOUT = 60 * 5  # кэш ненайденных по имени объектов, сек
 WIALON_REPORTS_LIMIT_PERIOD = 60 * 5 + 5  # время оценки лимита
 WIALON_REPORTS_PER_PERIOD_LIMIT = 192  # лимит запросов отчетов в минуту в Wialon (200 в докум-ции)
-WIALON_REPORTS_THROTTLE_TIME = 3  # время ожидания при переполнении лимита
+WIALON_REPORTS_LOG_ENABLED = False  # вести ли учет выполненных отчетов в WialonReportLog
 WIALON_REPORTS_EXECUTE_ANYWAY_AFTER = 60 * 10  # общее время ожидания, сек,
 # после которого запрос выполняем в любом случае
+WIALON_REPORT_CACHE_TIMEOUT = 60 * 60 * 24 * 7  # хранение результатов отчетов за закрытый период
+WIALON_REPORT_CACHE_MIN_AGE = 60 * 60 * 3  # закрытым считается период, закончившийся раньше, сек
+WIALON_REPORT_CACHE_MAX_SIZE = 1024 * 1024 * 5  # максимальный размер сжатого результата, байт
+
+URA_JOB_LOG_BATCH_SIZE = 100  # сколько записей журнала запросов УРА сохранять за раз
+URA_JOB_LOG_FLUSH_INTERVAL = 5  # как часто фоновый поток сохраняет журнал запросов УРА, сек
+URA_JOB_LOG_MAX_BODY_SIZE = 1024 * 512  # обрезка тела запроса и ответа в журнале (0 - без обрезки)
+URA_JOB_LOG_SAMPLE_RATE = 1  # доля успешных запросов, попадающих в журнал (ошибки пишутся всегда)
+URA_WIALON_RETRY_ATTEMPTS = 3  # попыток обработки запроса УРА при ошибках Wialon
+URA_WIALON_RETRY_DELAY = 1  # пауза между попытками, сек
+URA_WIALON_RETRY_BUDGET = 15  # общее время на повторы в рамках одного запроса УРА, сек
+URA_FUEL_LEVEL_INTERPOLATE = False  # интерполировать уровень топлива между замерами
+URA_JOB_POINTS_CACHE_MIN_AGE = 60 * 60 * 3  # кэш точек ПЛ отдается, если ПЛ закончился раньше, сек
+
+MOVING_SERVICE_THREADS = 1  # потоков загрузки сообщений объектов в MovingService (1 - по очереди)
+MOVING_SERVICE_PROCESSES = 0  # процессов для расчета объектов в MovingService (0 - в текущем)
+MOVING_SERVICE_COLUMNAR_TABLES = False  # хранить таблицы периодов и моментов по колонкам
+MOVING_SERVICE_SNAPSHOTS = False  # снимки визитов за закрытые сутки (итоги на стыках приближенные)
+MOVING_SERVICE_SNAPSHOTS_MIN_AGE = 60 * 60 * 3  # закрыты сутки, закончившиеся раньше, сек
+MOVING_SERVICE_SNAPSHOTS_TIMEOUT = 60 * 60 * 24 * 62  # хранение суточных снимков визитов, сек
+MOVING_SERVICE_SNAPSHOTS_MAX_SIZE = 1024 * 1024 * 5  # максимальный размер сжатого снимка, байт
+
+TIMING_ENABLED = False  # писать замеры фаз всех отчетов и запросов УРА в журнал timing
+TIMING_REQUEST_PARAM = 'timing'  # GET-параметр (или заголовок X-Timing), включающий замеры запроса
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {
+            'format': '%(message)s'
+        }
+    },
+    'handlers': {
+        'timing': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'plain'
+        }
+    },
+    'loggers': {
+        'timing': {
+            'handlers': ['timing'],
+            'level': 'INFO',
+            'propagate': False
+        }
+    }
+}
+
+NOTIFICATIONS_BATCH_SIZE = 50  # запросов update_notification в одном core/batch
+NOTIFICATIONS_QUEUE_TAKE_LIMIT = 50  # ПЛ, забираемых из очереди уведомлений за раз
+NOTIFICATIONS_QUEUE_POLL_TIMEOUT = 10  # ожидание ПЛ в очереди уведомлений, сек
+NOTIFICATIONS_QUEUE_MAX_ATTEMPTS = 5  # попыток регистрации уведомлений ПЛ
+NOTIFICATIONS_QUEUE_RETRY_DELAY = 60  # пауза перед повтором (растет с каждой попыткой), сек
 
 try:
     from project.settings.settings_local import *  # NOQA